@@ -1,27 +1,374 @@
 import numpy as np
-from scipy import stats
-import pandas as pd
+
+from .subsystems import scipy_fft, scipy_signal, scipy_stats
+
+# Oltre questo numero di bit la distribuzione resta sparsa (solo stati osservati)
+DENSE_MAX_BITS = 22
+
+# Parametri predefiniti dell'analisi di serie temporali
+TS_MAX_LAG = 256  # Ritardi dell'autocorrelazione
+TS_NPERSEG = 256  # Lunghezza dei segmenti dello spettro di Welch
+TS_CHUNK_SIZE = 65536  # Campioni per blocco letti da un file .npy
+
+
+def _bitstring_indices(keys):
+    """
+    Indici interi dei bitstring ("0101", "01 10", "0x5") in un'unica passata NumPy.
+    Restituisce (indici, n_bit); None se le chiavi non hanno una forma binaria uniforme.
+    """
+    if not keys:
+        return np.zeros(0, dtype=np.int64), 0
+    if keys[0].startswith('0x'):
+        try:
+            indices = np.array([int(k, 16) for k in keys], dtype=np.int64)
+        except (ValueError, OverflowError):
+            return None
+        return indices, int(indices.max()).bit_length()
+    width = len(keys[0])
+    try:
+        raw = np.frombuffer(''.join(keys).encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return None
+    if raw.size != width * len(keys):
+        return None
+    chars = raw.reshape(len(keys), width)
+    # I registri separati da spazio hanno gli spazi nelle stesse colonne
+    columns = np.flatnonzero(chars[0] != ord(' '))
+    bits = chars[:, columns].astype(np.int64) - ord('0')
+    if bits.size and (bits.min() < 0 or bits.max() > 1 or (chars[:, chars[0] == ord(' ')] != ord(' ')).any()):
+        return None
+    n_bits = len(columns)
+    if n_bits > 62:
+        return None
+    weights = np.left_shift(1, np.arange(n_bits - 1, -1, -1, dtype=np.int64))
+    return bits @ weights, n_bits
+
+
+def counts_to_array(counts, dense=None):
+    """
+    Converte un dizionario di conteggi in un array indicizzato dal bitstring intero.
+    Densa (lunghezza 2**n_bit) se n_bit <= DENSE_MAX_BITS, altrimenti sparsa.
+    Restituisce {'indices', 'values', 'n_bits', 'dense', 'order'}; in forma densa
+    'values' è l'intera distribuzione e 'indices' e 'order' sono None, in forma
+    sparsa 'order' è la posizione di ogni stato fra le chiavi del dizionario.
+    """
+    keys = list(counts)
+    values = np.fromiter(counts.values(), dtype=np.float64, count=len(keys))
+    parsed = _bitstring_indices(keys)
+    if parsed is None:
+        raise ValueError("Chiavi dei conteggi non riconosciute come bitstring")
+    indices, n_bits = parsed
+    if dense is None:
+        dense = n_bits <= DENSE_MAX_BITS
+    if dense:
+        return {'indices': None, 'values': np.bincount(indices, weights=values, minlength=1 << n_bits),
+                'n_bits': n_bits, 'dense': True, 'order': None}
+    order = np.argsort(indices, kind='stable')
+    return {'indices': indices[order], 'values': values[order], 'n_bits': n_bits, 'dense': False, 'order': order}
+
+
+def _counts_buffer(counts):
+    """
+    (valori, posizione delle chiavi) in ordine di bitstring intero, da counts_to_array.
+    Le chiavi che non sono bitstring restano nell'ordine del dizionario.
+    """
+    try:
+        array = counts_to_array(counts, dense=False)
+    except ValueError:
+        return np.fromiter(counts.values(), dtype=np.float64, count=len(counts)), np.arange(len(counts))
+    return array['values'], array['order']
+
+
+def _segment_first(mask, segment_ids, n_segments):
+    """Prima posizione di ogni segmento in cui mask è vera"""
+    positions = np.flatnonzero(mask)
+    first = np.full(n_segments, -1, dtype=np.int64)
+    segments, where = np.unique(segment_ids[positions], return_index=True)
+    first[segments] = positions[where]
+    return first
+
+
+def counts_statistics(batch):
+    """
+    Kernel condiviso: statistiche di uno o più dizionari di conteggi.
+    Ogni dizionario diventa con counts_to_array un segmento indicizzato dal
+    bitstring intero; i segmenti sono concatenati in un solo buffer e ogni
+    statistica è una riduzione per segmento (np.add.reduceat), senza cicli
+    Python sugli stati. A parità di conteggi domina il bitstring più basso.
+    """
+    keys = [list(counts) for counts in batch]
+    buffers = [_counts_buffer(counts) for counts in batch]
+    lengths = np.array([len(k) for k in keys], dtype=np.int64)
+    values = np.concatenate([buffer for buffer, _ in buffers]) if batch else np.zeros(0)
+    results = [{'entropy': 0.0, 'uniformity': None, 'dominant_state': None, 'dominance_ratio': None}
+               for _ in batch]
+    nonempty = np.flatnonzero(lengths)
+    if not nonempty.size:
+        return results
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[nonempty]
+    n_states = lengths[nonempty]
+    segment_ids = np.repeat(np.arange(len(nonempty)), n_states)
+
+    totals = np.add.reduceat(values, starts)
+    probs = values / totals[segment_ids]
+    plogp = np.where(probs > 0, probs * np.log2(np.where(probs > 0, probs, 1.0)), 0.0)
+    entropy = -np.add.reduceat(plogp, starts)
+    # Chi quadro rispetto alla distribuzione uniforme sugli stati osservati (come stats.chisquare)
+    expected = totals / n_states
+    chi2 = np.add.reduceat((values - expected[segment_ids]) ** 2 / expected[segment_ids], starts)
+    uniformity = scipy_stats.chi2.sf(chi2, n_states - 1)
+    maxima = np.maximum.reduceat(values, starts)
+    dominant = _segment_first(values == maxima[segment_ids], segment_ids, len(nonempty))
+
+    for j, i in enumerate(nonempty):
+        results[i] = {
+            'entropy': float(entropy[j]),
+            'uniformity': float(uniformity[j]),
+            'dominant_state': keys[i][buffers[i][1][dominant[j] - starts[j]]],
+            'dominance_ratio': float(maxima[j] / totals[j])
+        }
+    return results
+
+
+def entropy_bits(counts):
+    """Entropia di Shannon (bit) di un dizionario di conteggi"""
+    return counts_statistics([counts])[0]['entropy']
+
+
+def _as_columns(data, columns=None):
+    """
+    Normalizza un blocco di dati in (matrice (n, colonne), nomi, tempo o None).
+    Accetta dict di colonne (la colonna 'time' fa da asse dei tempi) o array 1D/2D.
+    """
+    if isinstance(data, dict):
+        time = data.get('time')
+        names = columns or [k for k in data if k != 'time']
+        matrix = np.column_stack([np.asarray(data[k], dtype=np.float64) for k in names])
+        return matrix, names, None if time is None else np.asarray(time, dtype=np.float64)
+    matrix = np.asarray(data, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    names = columns or (['value'] if matrix.shape[1] == 1 else [f'col_{i}' for i in range(matrix.shape[1])])
+    return matrix, names, None
+
+
+def _sampling_rate(time, fs):
+    if fs is not None:
+        return float(fs)
+    if time is not None and len(time) > 1:
+        return 1.0 / float(time[1] - time[0])
+    return 1.0
+
+
+def _moments(count, mean, m2, m3, m4, minimum, maximum):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'count': int(count),
+            'mean': mean,
+            'variance': m2 / (count - 1) if count > 1 else np.full_like(mean, np.nan),
+            'skewness': np.sqrt(count) * m3 / m2 ** 1.5,
+            'kurtosis': count * m4 / m2 ** 2 - 3.0,
+            'min': minimum,
+            'max': maximum
+        }
+
+
+def _per_column(names, moments, acf, frequency, spectrum):
+    return {
+        'columns': names,
+        'moments': {name: {k: (v if np.isscalar(v) else float(v[i])) for k, v in moments.items()}
+                    for i, name in enumerate(names)},
+        'autocorrelation': {name: acf[:, i] for i, name in enumerate(names)},
+        'spectrum': dict({'frequency': frequency}, **{name: spectrum[:, i] for i, name in enumerate(names)})
+    }
+
+
+def _segment_power(segment, window):
+    """|FFT|^2 di segmenti (..., nperseg, colonne) senza media e con finestra (termini della media di Welch)"""
+    detrended = (segment - segment.mean(axis=-2, keepdims=True)) * window[:, None]
+    return np.abs(scipy_fft.rfft(detrended, axis=-2)) ** 2
+
+
+class StreamingTimeSeries:
+    """
+    Analisi a blocchi di una serie temporale troppo grande per la memoria.
+    Momenti in forma incrementale (formule di Chan/Pébay), autocorrelazione via FFT
+    con un buffer dei campioni precedenti e spettro di Welch a segmenti sovrapposti:
+    la memoria dipende da max_lag, nperseg e dal blocco, non dalla lunghezza della serie.
+    """
+
+    def __init__(self, max_lag=None, nperseg=None, fs=None, columns=None):
+        self.max_lag = TS_MAX_LAG if max_lag is None else max_lag
+        self.nperseg = nperseg or TS_NPERSEG
+        self.step = self.nperseg - self.nperseg // 2
+        self.fs = fs
+        self.columns = columns
+        self.count = 0
+
+    def _start(self, matrix, names):
+        width = matrix.shape[1]
+        self.columns = names
+        self.times = np.empty(0)  # primi due istanti, per ricavare fs dalla colonna 'time'
+        self.mean = np.zeros(width)
+        self.m2, self.m3, self.m4 = np.zeros(width), np.zeros(width), np.zeros(width)
+        self.minimum = np.full(width, np.inf)
+        self.maximum = np.full(width, -np.inf)
+        self.lag_products = np.zeros((self.max_lag + 1, width))
+        self.head = np.empty((0, width))  # primi max_lag campioni
+        self.tail = np.empty((0, width))  # ultimi max_lag campioni
+        self.segment = np.empty((0, width))  # campioni dal prossimo segmento di Welch
+        self.window = scipy_signal.get_window('hann', self.nperseg)
+        self.power = np.zeros((self.nperseg // 2 + 1, width))
+        self.segments = 0
+
+    def update(self, chunk):
+        matrix, names, time = _as_columns(chunk, self.columns)
+        if not len(matrix):
+            return self
+        if self.count == 0:
+            self._start(matrix, names)
+        if time is not None and len(self.times) < 2:
+            self.times = np.concatenate([self.times, time[:2 - len(self.times)]])
+        self._update_moments(matrix)
+        self._update_lags(matrix)
+        self._update_spectrum(matrix)
+        self.count += len(matrix)
+        return self
+
+    def _update_moments(self, x):
+        nb = len(x)
+        mean_b = x.mean(axis=0)
+        centered = x - mean_b
+        sq = centered * centered
+        m2b, m3b, m4b = sq.sum(axis=0), (sq * centered).sum(axis=0), (sq * sq).sum(axis=0)
+        na, n = self.count, self.count + nb
+        delta = mean_b - self.mean
+        m2a, m3a = self.m2, self.m3
+        self.m4 = (self.m4 + m4b + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+                   + 6 * delta ** 2 * (na * na * m2b + nb * nb * m2a) / n ** 2
+                   + 4 * delta * (na * m3b - nb * m3a) / n)
+        self.m3 = m3a + m3b + delta ** 3 * na * nb * (na - nb) / n ** 2 + 3 * delta * (na * m2b - nb * m2a) / n
+        self.m2 = m2a + m2b + delta ** 2 * na * nb / n
+        self.mean = self.mean + delta * nb / n
+        self.minimum = np.minimum(self.minimum, x.min(axis=0))
+        self.maximum = np.maximum(self.maximum, x.max(axis=0))
+
+    def _update_lags(self, x):
+        """Somme sum_t x[t] x[t+k] per i campioni del blocco, usando la coda del blocco precedente"""
+        carry = len(self.tail)
+        joined = np.concatenate([self.tail, x])
+        target = np.zeros_like(joined)
+        target[carry:] = x
+        # Lo zero padding oltre max_lag evita che la correlazione circolare si ripieghi
+        size = scipy_fft.next_fast_len(len(joined) + self.max_lag + 1, real=True)
+        cross = scipy_fft.rfft(target, size, axis=0) * np.conj(scipy_fft.rfft(joined, size, axis=0))
+        products = scipy_fft.irfft(cross, size, axis=0)
+        self.lag_products += products[:self.max_lag + 1]
+        if len(self.head) < self.max_lag:
+            self.head = np.concatenate([self.head, x[:self.max_lag - len(self.head)]])
+        self.tail = joined[-self.max_lag:] if self.max_lag else joined[:0]
+
+    def _update_spectrum(self, x):
+        self.segment = np.concatenate([self.segment, x])
+        n_segments = (len(self.segment) - self.nperseg) // self.step + 1 if len(self.segment) >= self.nperseg else 0
+        if n_segments:
+            # Tutti i segmenti completi del blocco in un'unica FFT: (segmenti, nperseg, colonne)
+            windows = np.lib.stride_tricks.sliding_window_view(self.segment, self.nperseg, axis=0)[::self.step]
+            self.power += _segment_power(np.moveaxis(windows[:n_segments], -1, 1), self.window).sum(axis=0)
+            self.segments += n_segments
+            self.segment = self.segment[n_segments * self.step:]
+
+    def result(self):
+        if self.count == 0:
+            raise ValueError("Serie temporale vuota: nessun campione da analizzare")
+        n, lags = self.count, min(self.max_lag, self.count - 1)
+        mean = self.mean
+        # sum_t (x_t - m)(x_{t+k} - m) dalle somme grezze e dalle somme di testa e coda
+        total = mean * n
+        head_sums = np.vstack([np.zeros(len(mean)), np.cumsum(self.head, axis=0)])[:lags + 1]
+        tail_sums = np.vstack([np.zeros(len(mean)), np.cumsum(self.tail[::-1], axis=0)])[:lags + 1]
+        k = np.arange(lags + 1)[:, None]
+        covariance = (self.lag_products[:lags + 1]
+                      - mean * ((total - tail_sums) + (total - head_sums))
+                      + (n - k) * mean * mean)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acf = covariance / covariance[0]
+        frequency, spectrum = self._spectrum()
+        moments = _moments(n, mean, self.m2, self.m3, self.m4, self.minimum, self.maximum)
+        return _per_column(self.columns, moments, acf, frequency, spectrum)
+
+    def _spectrum(self):
+        if self.segments:
+            nperseg, window, power, segments = self.nperseg, self.window, self.power, self.segments
+        else:
+            # Serie più corta di un segmento: un unico segmento su tutti i campioni (come scipy.signal.welch)
+            nperseg = len(self.segment)
+            window = scipy_signal.get_window('hann', nperseg)
+            power, segments = _segment_power(self.segment, window), 1
+        fs = _sampling_rate(self.times, self.fs)
+        density = power / (segments * fs * (window * window).sum())
+        density[1:-1 if nperseg % 2 == 0 else None] *= 2
+        return np.fft.rfftfreq(nperseg, 1.0 / fs), density
+
+
+def iter_chunks(source, chunk_size=None):
+    """Blocchi da un iteratore, da un array o da un file .npy aperto in memory-map"""
+    chunk_size = chunk_size or TS_CHUNK_SIZE
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        source = np.load(source, mmap_mode='r')
+    if isinstance(source, np.ndarray):
+        for start in range(0, len(source), chunk_size):
+            # Copia del solo blocco corrente: il resto del file resta su disco
+            yield np.array(source[start:start + chunk_size], dtype=np.float64)
+        return
+    yield from source
+
 
 class DataAnalyzer:
     @staticmethod
     def analyze_quantum_results(counts):
         """Analisi statistica dei risultati quantistici"""
-        states = list(counts.keys())
-        values = list(counts.values())
-        total = sum(values)
-        
-        return {
-            'entropy': stats.entropy(values, base=2),
-            'uniformity': stats.chisquare(values).pvalue,
-            'dominant_state': states[np.argmax(values)],
-            'dominance_ratio': max(values) / total
-        }
+        return counts_statistics([counts])[0]
 
     @staticmethod
-    def time_series_analysis(data):
-        """Analisi di serie temporali per simulazioni"""
-        df = pd.DataFrame(data)
-        return {
-            'autocorrelation': df.autocorr().to_dict(),
-            'fft_analysis': np.abs(np.fft.fft(df.values)).tolist()
-        }
+    def analyze_quantum_batch(batch):
+        """Analisi di più dizionari di conteggi in una sola chiamata"""
+        return counts_statistics(batch)
+
+    @staticmethod
+    def time_series_analysis(data, max_lag=None, nperseg=None, fs=None):
+        """Analisi di serie temporali per simulazioni (dati interamente in memoria)"""
+        x, names, time = _as_columns(data)
+        n = len(x)
+        fs = _sampling_rate(time, fs)
+        lags = min(TS_MAX_LAG if max_lag is None else max_lag, n - 1)
+        centered = x - x.mean(axis=0)
+        # Autocorrelazione via FFT lungo il tempo (asse 0), con padding contro il ripiegamento
+        size = scipy_fft.next_fast_len(2 * n - 1, real=True)
+        spectrum = scipy_fft.rfft(centered, size, axis=0)
+        covariance = scipy_fft.irfft(spectrum * np.conj(spectrum), size, axis=0)[:lags + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acf = covariance / covariance[0]
+        nperseg = min(nperseg or TS_NPERSEG, n)
+        frequency, density = scipy_signal.welch(
+            x, fs=fs, window='hann', nperseg=nperseg, noverlap=nperseg // 2, axis=0
+        )
+        sq = centered * centered
+        moments = _moments(
+            n, x.mean(axis=0), sq.sum(axis=0), (sq * centered).sum(axis=0), (sq * sq).sum(axis=0),
+            x.min(axis=0), x.max(axis=0)
+        )
+        result = _per_column(names, moments, acf, frequency, density)
+        result['fft_analysis'] = np.abs(np.fft.fft(x, axis=0))
+        return result
+
+    @staticmethod
+    def time_series_analysis_chunked(source, max_lag=None, nperseg=None, fs=None, columns=None, chunk_size=None):
+        """
+        Stessa analisi su un iteratore di blocchi o su un file .npy (memory-map),
+        con memoria limitata indipendentemente dalla lunghezza della serie.
+        """
+        analyzer = StreamingTimeSeries(max_lag=max_lag, nperseg=nperseg, fs=fs, columns=columns)
+        for chunk in iter_chunks(source, chunk_size):
+            analyzer.update(chunk)
+        return analyzer.result()
@@ -1,29 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header, WebSocket, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Header, WebSocket, WebSocketDisconnect, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import timedelta
 from typing import Optional
 from pathlib import Path
 import asyncio
+import base64
+import re
+import time
 from .auth import (
     create_access_token,
-    get_password_hash,
-    verify_password,
     get_current_user,
     verify_user_key,
     generate_user_key,
     get_user_key,
     create_db_user,
+    password_hasher,
+    PasswordHasherBusy,
     User,
     TokenData,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from pydantic import BaseModel
 from .core import RIQACore
-from .visualization import VisualizationEngine
+from . import database
+from .cache import result_cache
+from .executor import SimulationExecutor, ExecutorSaturated, JobTimeout
+from .jobs import JobManager, JobNotFound
+from .streaming import SimulationStream
+from .experiment_manager import ExperimentManager, InvalidCursor
+from .encoding import encoded_response
+from .visualization import render_service, series_payload
+from .trajectories import TrajectoryService, TrajectoryNotFound, trajectory_store, TRAJECTORY_MAX_POINTS
 from .analysis import DataAnalyzer
-from .ai import AIModelHub
+from .astral import SnapshotNotFound, snapshot_path
+from .ballistics import BallisticService
+from .ml_integration import AIModelHub, model_registry
+from .metrics import (
+    registry as metrics_registry, http_request_duration, SamplingProfiler,
+    profiling_requested, PROFILE_SLOW_MS
+)
+from .subsystems import subsystems
+from starlette.routing import Match
 
 app = FastAPI()
 
@@ -37,9 +57,35 @@ app.add_middleware(
 )
 
 # Monta la cartella static per il frontend
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
 core = RIQACore()
+executor = SimulationExecutor()
+job_manager = JobManager(executor)
+ai_hub = AIModelHub()
+experiment_manager = ExperimentManager()
+trajectory_service = TrajectoryService(executor)
+ballistic_service = BallisticService(executor)
+
+# Sottosistemi pesanti importati subito solo se richiesto (RIQA_PRELOAD), ad es. prima del fork dei worker
+subsystems.preload()
+
+@app.on_event("startup")
+async def start_executor():
+    executor.start()
+    # Warm-up in background: i worker preparano backend Aer e circuiti comuni
+    asyncio.create_task(executor.warm_up())
+    # Pre-caricamento opzionale dei modelli AI (RIQA_MODEL_PREWARM)
+    asyncio.create_task(asyncio.to_thread(model_registry.prewarm))
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def stop_executor():
+    await job_manager.stop()
+    executor.shutdown(wait=False)
+    render_service.shutdown()
+    # Svuota il writer degli esperimenti e chiude il pool di connessioni
+    await asyncio.to_thread(database.close)
 
 # Modelli
 class UserCreate(BaseModel):
@@ -59,6 +105,7 @@ class SimulationRequest(BaseModel):
 class VisualizationRequest(BaseModel):
     type: str = 'circuit'
     data: dict
+    format: str = 'base64'  # 'png' restituisce direttamente i byte dell'immagine
 
 class AnalysisRequest(BaseModel):
     type: str = 'quantum'
@@ -77,7 +124,11 @@ async def register_user(user_data: UserCreate):
             detail="Username già registrato"
         )
     
-    user = create_db_user(user_data.username, user_data.password)
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusy as e:
+        raise _busy(e)
+    user = create_db_user(user_data.username, user_data.password, hashed_password)
     user_key = user.user_key
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -95,7 +146,10 @@ async def register_user(user_data: UserCreate):
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(form_data.username, form_data.password)
+    except PasswordHasherBusy as e:
+        raise _busy(e)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,52 +178,184 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @app.post("/simulate")
 async def run_simulation(
     request: SimulationRequest,
+    http_request: Request,
     current_user: TokenData = Depends(verify_user_key)
 ):
     try:
-        result = core.run_simulation(
-            request.section,
-            request.parameters or {"message": request.message}
+        params = request.parameters or {"message": request.message}
+        if request.section == 'oscillator' and ('points' in params or 'dense_points' in params):
+            # Livello di dettaglio scelto dal client: traiettoria densa calcolata una volta, poi solo fette
+            result = {'status': 'success', 'result': await trajectory_service.simulate(params)}
+        elif request.section == 'ballistic' and ballistic_service.handles(params):
+            # Lotti Monte Carlo grandi: campioni estratti qui, integrazione divisa tra i worker
+            result = await ballistic_service.simulate(params)
+        else:
+            result = await executor.run_simulation(request.section, params)
+        # JSON di default, MessagePack o octet-stream secondo l'header Accept
+        return encoded_response({"status": "success", "result": result}, http_request.headers.get("accept"))
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    except JobTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
         )
-        return {"status": "success", "result": result}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+@app.get("/trajectories/{trajectory_id}")
+async def get_trajectory_window(
+    trajectory_id: str,
+    http_request: Request,
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    points: int = 1000,
+    method: str = 'lttb',
+    current_user: TokenData = Depends(verify_user_key)
+):
+    """Finestra di una traiettoria già calcolata, ridotta a points punti senza reintegrare"""
+    if points > TRAJECTORY_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"points deve essere al più {TRAJECTORY_MAX_POINTS}"
+        )
+    try:
+        window = await asyncio.to_thread(
+            trajectory_store.window, trajectory_id, t0, t1, points=max(3, points), method=method
+        )
+    except TrajectoryNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Traiettoria non trovata")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return encoded_response({"status": "success", "result": window}, http_request.headers.get("accept"))
+
+@app.get("/astral/snapshots/{snapshot_id}")
+async def get_astral_snapshots(
+    snapshot_id: str,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    """File .npy (S, 6, N) delle istantanee di una simulazione astral, per id restituito nel risultato"""
+    try:
+        path = snapshot_path(snapshot_id)
+    except SnapshotNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Istantanee non trovate o scadute")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"astral_{snapshot_id}.npy")
+
 @app.websocket("/ws/simulate")
 async def websocket_simulation(websocket: WebSocket):
+    """Streaming dei risultati parziali, più job per socket (vedi backend/streaming.py)"""
     await websocket.accept()
     try:
-        while True:
-            data = await websocket.receive_json()
-            result = core.run_simulation(data['section'], data.get('parameters', {}))
-            await websocket.send_json({
-                "status": "success",
-                "result": result
-            })
-    except Exception as e:
-        await websocket.send_json({
-            "status": "error",
-            "message": str(e)
-        })
-    finally:
-        await websocket.close()
+        await SimulationStream(websocket, executor).serve()
+    except WebSocketDisconnect:
+        pass
+
+# Job asincroni: il client riceve subito un id e interroga lo stato
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    request: SimulationRequest,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    job_id = await job_manager.submit(
+        request.section,
+        request.parameters or {"message": request.message},
+        owner=current_user.username
+    )
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    try:
+        job = await job_manager.status(job_id, owner=current_user.username)
+    except JobNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job non trovato")
+    return {
+        "job_id": job["id"],
+        "section": job["section"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    http_request: Request,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    try:
+        job = await job_manager.result(job_id, owner=current_user.username)
+    except JobNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job non trovato")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job non ancora completato (stato: {job['status']})"
+        )
+    return encoded_response({"status": "success", "result": job["result"]}, http_request.headers.get("accept"))
+
+# Storico esperimenti: elenco leggero paginato per cursore, risultato caricato a parte
+@app.get("/experiments")
+async def list_experiments(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    try:
+        return await asyncio.to_thread(
+            experiment_manager.get_experiment_history,
+            current_user.username, limit, cursor, type, since, until
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursore non valido")
+
+@app.get("/experiments/{experiment_id}/result")
+async def get_experiment_result(
+    experiment_id: int,
+    http_request: Request,
+    current_user: TokenData = Depends(verify_user_key)
+):
+    record = await asyncio.to_thread(
+        experiment_manager.get_experiment_result, current_user.username, experiment_id
+    )
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Esperimento non trovato")
+    return encoded_response(record, http_request.headers.get("accept"))
 
 # Nuovi endpoint per visualizzazione e analisi
 @app.post("/visualize")
 async def visualize_data(
     request: VisualizationRequest,
+    http_request: Request,
     current_user: TokenData = Depends(verify_user_key)
 ):
     try:
+        # Rendering nel pool dedicato (Agg senza pyplot), con cache per hash dell'input
         if request.type == 'circuit':
-            image = VisualizationEngine.plot_quantum_circuit(request.data.get('circuit', ''))
+            png = await render_service.render_async('circuit', request.data.get('circuit', ''))
         else:
-            image = VisualizationEngine.plot_simulation_results(request.data)
+            png = await render_service.render_async('series', request.data, prepare=series_payload)
         
-        return {"status": "success", "image": image}
+        if request.format == 'png' or "image/png" in http_request.headers.get("accept", ""):
+            return Response(content=png, media_type="image/png")
+        return {"status": "success", "image": base64.b64encode(png).decode('utf-8')}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -179,6 +365,7 @@ async def visualize_data(
 @app.post("/analyze")
 async def analyze_data(
     request: AnalysisRequest,
+    http_request: Request,
     current_user: TokenData = Depends(verify_user_key)
 ):
     try:
@@ -187,7 +374,7 @@ async def analyze_data(
         else:
             results = DataAnalyzer.time_series_analysis(request.data)
         
-        return {"status": "success", "results": results}
+        return encoded_response({"status": "success", "results": results}, http_request.headers.get("accept"))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -201,9 +388,9 @@ async def optimize_code(
 ):
     try:
         if request.type == 'quantum':
-            result = AIModelHub().optimize_quantum_circuit(request.code)
+            result = await ai_hub.optimize_quantum_circuit_async(request.code)
         else:
-            result = AIModelHub().solve_math_expression(request.code)
+            result = await ai_hub.solve_math_expression_async(request.code)
         
         return {"status": "success", "result": result}
     except Exception as e:
@@ -212,6 +399,10 @@ async def optimize_code(
             detail=str(e)
         )
 
+@app.get("/optimize/stats")
+async def optimize_stats(current_user: TokenData = Depends(verify_user_key)):
+    return {"models": model_registry.stats(), "batching": ai_hub.batch_stats()}
+
 # Endpoint protetti
 @app.get("/users/me")
 async def read_users_me(current_user: User = Depends(get_current_user)):
@@ -225,26 +416,114 @@ async def rotate_user_key(current_user: TokenData = Depends(verify_user_key)):
         "new_key": new_key
     }
 
+@app.get("/cache/stats")
+async def cache_stats(current_user: TokenData = Depends(verify_user_key)):
+    return result_cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Metriche nel formato testuale di Prometheus"""
+    return Response(
+        content=metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+# Gauge letti a ogni scrape
+@metrics_registry.gauge_collector
+def _executor_gauges():
+    return [
+        ("riqa_executor_inflight", "Job dell'executor in esecuzione o in coda", {}, executor.inflight),
+        ("riqa_executor_capacity", "Job accettati al massimo dall'executor", {}, executor.capacity),
+    ]
+
+@metrics_registry.gauge_collector
+def _cache_gauges():
+    gauges = []
+    for cache_name, stats in (("result", result_cache.stats()), ("render", render_service.stats())):
+        for key in ("hits", "misses", "evictions", "entries", "bytes"):
+            gauges.append((f"riqa_cache_{key}", f"Cache: {key}", {"cache": cache_name}, stats[key]))
+    return gauges
+
+@metrics_registry.gauge_collector
+def _resource_gauges():
+    pool = database.get_pool().stats()
+    trajectories = trajectory_store.stats()
+    return [
+        ("riqa_db_connections_in_use", "Connessioni al database in uso", {"driver": pool["driver"]}, pool["in_use"]),
+        ("riqa_db_connections_max", "Dimensione massima del pool di connessioni", {"driver": pool["driver"]}, pool["max_size"]),
+        ("riqa_trajectory_store_bytes", "Memoria occupata dalle traiettorie dense", {}, trajectories["bytes"]),
+        ("riqa_trajectory_store_entries", "Traiettorie dense in memoria", {}, trajectories["entries"]),
+        ("riqa_models_used_mb", "Memoria stimata dei modelli AI caricati", {}, model_registry.used_mb),
+    ]
+
+@metrics_registry.gauge_collector
+def _subsystem_gauges():
+    loaded = subsystems.stats()["loaded"]
+    return [
+        ("riqa_subsystem_load_seconds", "Tempo di import dei sottosistemi caricati", {"subsystem": name}, seconds)
+        for name, seconds in loaded.items()
+    ]
+
 # Funzioni di utilità
-def authenticate_user(username: str, password: str) -> Optional[User]:
+def _busy(error: Exception) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": "1"}
+    )
+
+async def authenticate_user(username: str, password: str) -> Optional[User]:
     user = get_user_from_db(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
     return user
 
+# Hash bcrypt precalcolato di "testpass": nessun hashing per ogni ricerca
+TEST_USER_HASH = "$2b$12$.Ufbl9f.t9Uz3NoDWbixIOSIhKlKsK0LhVJXu/BdcvEjKqmEY2oli"
+
 def get_user_from_db(username: str) -> Optional[User]:
     # Implementazione fittizia - sostituire con DB reale
     if username == "testuser":
         return User(
             username="testuser",
-            hashed_password=get_password_hash("testpass"),
+            hashed_password=TEST_USER_HASH,
             user_key="ak_testkey_1234567890_9999999999"
         )
     return None
 
 # Middleware
+def _route_template(scope) -> str:
+    """Percorso della route (es. /jobs/{job_id}) per etichette a cardinalità limitata"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    profiler = None
+    if profiling_requested(request.headers):
+        # Campiona il thread del loop: copre handler, dipendenze e codifica della risposta
+        profiler = SamplingProfiler().start()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = _route_template(request.scope)
+        http_request_duration.observe(elapsed, method=request.method, route=route, status=status_code)
+        if profiler is not None:
+            profiler.stop()
+            if elapsed * 1000 >= PROFILE_SLOW_MS:
+                name = f"{int(time.time() * 1000)}_{request.method}_{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')}"
+                await asyncio.to_thread(profiler.dump, name)
+
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
     response = await call_next(request)
@@ -0,0 +1,708 @@
+"""
+Motore gravitazionale N-corpi di AI_RIQA.
+Lo stato è in forma structure-of-arrays: posizioni e velocità (3, N), masse (N,).
+Le forze si calcolano per somma diretta a blocchi (N piccolo) oppure con un
+albero di Barnes-Hut costruito sui codici di Morton: i corpi ordinati lungo la
+curva Z formano celle contigue, le cui masse e centri di massa si ottengono in
+O(1) dalle somme cumulative. La visita dell'albero è vettorizzata per gruppi di
+corpi contigui (group walk), quindi il costo è O(N log N) senza cicli Python
+per corpo. L'integratore è il leapfrog kick-drift-kick (simplettico); le
+istantanee periodiche finiscono in un file .npy mappato in memoria, restituito
+al client come id opaco e cancellato dopo ASTRAL_SNAPSHOT_TTL secondi.
+"""
+
+import math
+import os
+import re
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from .metrics import timed_phase
+
+# Configurazione del motore
+ASTRAL_DIRECT_MAX = int(os.getenv("RIQA_ASTRAL_DIRECT_MAX", "6000"))  # Oltre, method='auto' usa l'albero
+ASTRAL_THETA = float(os.getenv("RIQA_ASTRAL_THETA", "0.5"))  # Criterio di apertura di Barnes-Hut
+ASTRAL_LEAF_SIZE = int(os.getenv("RIQA_ASTRAL_LEAF_SIZE", "16"))  # Corpi massimi in una foglia
+ASTRAL_GROUP_SIZE = int(os.getenv("RIQA_ASTRAL_GROUP_SIZE", "32"))  # Corpi che condividono una visita dell'albero
+ASTRAL_PAIR_CHUNK = int(os.getenv("RIQA_ASTRAL_PAIR_CHUNK", str(2 ** 18)))  # Interazioni per blocco: resta in cache
+ASTRAL_MAX_BODIES = int(os.getenv("RIQA_ASTRAL_MAX_BODIES", "200000"))
+ASTRAL_MAX_STEPS = int(os.getenv("RIQA_ASTRAL_MAX_STEPS", "1000000"))
+ASTRAL_MAX_COST = float(os.getenv("RIQA_ASTRAL_MAX_COST", "1e11"))  # Interazioni a coppie stimate per richiesta
+ASTRAL_RETURN_MAX = int(os.getenv("RIQA_ASTRAL_RETURN_MAX", "1000"))  # Oltre, lo stato finale resta solo nelle istantanee
+ASTRAL_SNAPSHOT_DIR = os.getenv("RIQA_ASTRAL_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "riqa_snapshots"))
+ASTRAL_SNAPSHOT_MAX_MB = int(os.getenv("RIQA_ASTRAL_SNAPSHOT_MAX_MB", "2048"))  # Dimensione massima del file di istantanee
+ASTRAL_SNAPSHOT_TTL = float(os.getenv("RIQA_ASTRAL_SNAPSHOT_TTL", "3600"))  # Secondi prima della cancellazione
+ASTRAL_SNAPSHOT_MAX_FILES = int(os.getenv("RIQA_ASTRAL_SNAPSHOT_MAX_FILES", "8"))  # File conservati, i più vecchi escono
+
+_MORTON_BITS = 21  # Bit per asse: il codice sta in 63 bit
+_MAX_LEVEL = _MORTON_BITS
+_SOURCE_WIDTH = 64  # Sorgenti per riga nelle liste di interazione dei gruppi
+_GROUP_BLOCK = 1024  # Gruppi visitati insieme: limita la memoria delle liste di interazione
+_TREE_PAIRS_PER_LEVEL = 300  # Costo dell'albero per corpo e livello, in interazioni dirette (bench_astral, theta 0.5)
+_SNAPSHOT_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class AstralError(ValueError):
+    """Parametri N-corpi non validi"""
+
+
+class SnapshotNotFound(KeyError):
+    """Id di istantanee sconosciuto o scaduto"""
+
+
+# --- Somma diretta ---------------------------------------------------------
+
+def _pair_weights(dx, dy, dz, mass, eps2, potential=False):
+    """
+    m / r^3 (e m / r se potential) per le separazioni sorgente - bersaglio, riusando i buffer.
+    Le coppie a distanza nulla (corpi coincidenti senza softening, riempimento) valgono zero.
+    """
+    r2 = dx * dx
+    buffer = dy * dy
+    r2 += buffer
+    np.multiply(dz, dz, out=buffer)
+    r2 += buffer
+    r2 += eps2
+    r = np.sqrt(r2, out=buffer)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m_inv_r = np.divide(mass, r) if potential else None
+        r2 *= r
+        weight = np.divide(mass, r2, out=r2)
+    weight[~np.isfinite(weight)] = 0.0
+    if potential:
+        m_inv_r[~np.isfinite(m_inv_r)] = 0.0
+    return weight, m_inv_r
+
+
+def direct_accelerations(positions, masses, G=1.0, softening=0.0, potential=False):
+    """
+    Accelerazioni (3, N) per somma diretta O(N^2), a blocchi di bersagli per limitare la memoria.
+    Con potential=True restituisce anche il potenziale per unità di massa di ciascun corpo.
+    """
+    n = positions.shape[1]
+    acc = np.zeros((3, n))
+    phi = np.zeros(n) if potential else None
+    block = max(1, ASTRAL_PAIR_CHUNK // max(n, 1))
+    eps2 = softening * softening
+    x, y, z = positions
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        dx = x[None, :] - x[start:stop, None]
+        dy = y[None, :] - y[start:stop, None]
+        dz = z[None, :] - z[start:stop, None]
+        weight, m_inv_r = _pair_weights(dx, dy, dz, masses[None, :], eps2, potential)
+        acc[0, start:stop] = np.einsum('ij,ij->i', dx, weight)
+        acc[1, start:stop] = np.einsum('ij,ij->i', dy, weight)
+        acc[2, start:stop] = np.einsum('ij,ij->i', dz, weight)
+        if potential:
+            # Il corpo non interagisce con sé stesso (conta solo col softening)
+            rows = np.arange(stop - start)
+            m_inv_r[rows, rows + start] = 0.0
+            phi[start:stop] = -m_inv_r.sum(axis=1)
+    acc *= G
+    if potential:
+        return acc, G * phi
+    return acc
+
+
+# --- Albero di Barnes-Hut ----------------------------------------------------
+
+def _spread_bits(v):
+    """Distanzia i 21 bit bassi di v di due posizioni (interleaving dei codici di Morton)"""
+    v = v & np.uint64(0x1fffff)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_codes(positions, origin, side):
+    """Codici di Morton a 63 bit delle posizioni nel cubo [origin, origin + side)"""
+    scale = (1 << _MORTON_BITS) / side
+    cells = np.floor((positions - origin[:, None]) * scale)
+    cells = np.clip(cells, 0, (1 << _MORTON_BITS) - 1).astype(np.uint64)
+    return (_spread_bits(cells[0]) << np.uint64(2)) | (_spread_bits(cells[1]) << np.uint64(1)) | _spread_bits(cells[2])
+
+
+def _expand_ranges(starts, counts):
+    """Concatena gli intervalli [start, start + count): (indice dell'intervallo, indice nell'array)"""
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    return owner, np.repeat(starts, counts) + (np.arange(total) - np.repeat(offsets, counts))
+
+
+class OctTree:
+    """
+    Ottalbero lineare sui corpi ordinati per codice di Morton.
+    Ogni nodo è un intervallo [start, end) dell'ordinamento; i figli di un nodo
+    sono contigui (first_child, n_children) nel vettore piatto dei nodi.
+    """
+
+    def __init__(self, positions, masses, leaf_size=None):
+        leaf_size = leaf_size or ASTRAL_LEAF_SIZE
+        lo, hi = positions.min(axis=1), positions.max(axis=1)
+        side = float((hi - lo).max()) * (1 + 1e-9) or 1.0
+        codes = morton_codes(positions, lo, side)
+        self.order = np.argsort(codes, kind='stable')
+        codes = codes[self.order]
+        self.positions = np.ascontiguousarray(positions[:, self.order])
+        self.masses = masses[self.order]
+
+        starts, ends, level = np.array([0]), np.array([positions.shape[1]]), 0
+        levels = []
+        while True:
+            split = ((ends - starts) > leaf_size) & (level < _MAX_LEVEL)
+            levels.append((starts, ends, level, split))
+            if not split.any():
+                break
+            parent_starts = starts[split]
+            _, bodies = _expand_ranges(parent_starts, ends[split] - parent_starts)
+            # Un nuovo prefisso apre un figlio; i confini dei genitori sono già confini di prefisso
+            key = codes[bodies] >> np.uint64(3 * (_MORTON_BITS - level - 1))
+            first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+            starts = bodies[first]
+            ends = bodies[np.r_[first[1:], len(bodies)] - 1] + 1
+            level += 1
+
+        offsets = np.cumsum([0] + [len(s) for s, _, _, _ in levels])
+        first_child, n_children = [], []
+        for index, (lvl_starts, lvl_ends, _, split) in enumerate(levels):
+            first = np.zeros(len(lvl_starts), dtype=np.int64)
+            count = np.zeros(len(lvl_starts), dtype=np.int64)
+            if index + 1 < len(levels):
+                child_starts = levels[index + 1][0]
+                lo_child = np.searchsorted(child_starts, lvl_starts[split])
+                first[split] = offsets[index + 1] + lo_child
+                count[split] = np.searchsorted(child_starts, lvl_ends[split]) - lo_child
+            first_child.append(first)
+            n_children.append(count)
+        self.start = np.concatenate([s for s, _, _, _ in levels])
+        self.end = np.concatenate([e for _, e, _, _ in levels])
+        self.size = np.concatenate([np.full(len(s), side / 2 ** lvl) for s, _, lvl, _ in levels])
+        self.first_child = np.concatenate(first_child)
+        self.n_children = np.concatenate(n_children)
+        self.depth = len(levels)
+        self.parent = np.full(self.n_nodes, -1, dtype=np.int64)
+        owner, child = _expand_ranges(self.first_child, self.n_children)
+        self.parent[child] = owner
+
+        # Massa e centro di massa di ogni intervallo dalle somme cumulative
+        cumulative_mass = np.r_[0.0, np.cumsum(self.masses)]
+        cumulative_moment = np.zeros((3, len(self.masses) + 1))
+        np.cumsum(self.positions * self.masses, axis=1, out=cumulative_moment[:, 1:])
+        self.mass = cumulative_mass[self.end] - cumulative_mass[self.start]
+        moment = cumulative_moment[:, self.end] - cumulative_moment[:, self.start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.com = np.where(self.mass > 0, moment / self.mass, 0.0)
+        massless = self.mass <= 0
+        if massless.any():
+            # Celle di sole particelle di prova: centro geometrico, contributo comunque nullo
+            cumulative_position = np.zeros((3, len(self.masses) + 1))
+            np.cumsum(self.positions, axis=1, out=cumulative_position[:, 1:])
+            total = cumulative_position[:, self.end] - cumulative_position[:, self.start]
+            self.com[:, massless] = total[:, massless] / (self.end - self.start)[massless]
+
+    @property
+    def n_nodes(self):
+        return len(self.start)
+
+    def cells(self, limit):
+        """Partizione dei corpi nei nodi più alti con al massimo limit corpi (o foglie), in ordine di Morton"""
+        counts = self.end - self.start
+        selected, frontier = [], np.zeros(1, dtype=np.int64)
+        while frontier.size:
+            take = (counts[frontier] <= limit) | (self.n_children[frontier] == 0)
+            selected.append(frontier[take])
+            rest = frontier[~take]
+            _, frontier = _expand_ranges(self.first_child[rest], self.n_children[rest])
+        cells = np.concatenate(selected)
+        return cells[np.argsort(self.start[cells])]
+
+    def groups(self, limit):
+        """
+        Intervalli di corpi vicini da visitare insieme: le celle di cells(limit) figlie
+        dello stesso nodo sono contigue e vengono unite, poi spezzate in righe di limit corpi.
+        """
+        cells = self.cells(limit)
+        starts, ends = self.start[cells], self.end[cells]
+        parent = self.parent[cells]
+        first = np.flatnonzero(np.r_[True, (parent[1:] != parent[:-1]) | (starts[1:] != ends[:-1])])
+        run_ends = ends[np.r_[first[1:], len(cells)] - 1]
+        return starts[first], run_ends - starts[first]
+
+    def interaction_lists(self, center, radius, theta):
+        """
+        Visita dell'albero per gruppi di corpi (sfera di centro center e raggio radius).
+        Restituisce le coppie (gruppo, nodo) approssimate dal monopolo e le coppie
+        (gruppo, foglia) da sommare direttamente.
+        """
+        # Un nodo accettato non può contenere corpi del gruppo
+        open_factor = max(1.0 / theta, math.sqrt(3.0))
+        group = np.arange(center.shape[1])
+        node = np.zeros(center.shape[1], dtype=np.int64)
+        far, near = [], []
+        while group.size:
+            distance = np.sqrt(((self.com[:, node] - center[:, group]) ** 2).sum(axis=0)) - radius[group]
+            accept = distance > open_factor * self.size[node]
+            leaf = self.n_children[node] == 0
+            far.append((group[accept], node[accept]))
+            direct = ~accept & leaf
+            near.append((group[direct], node[direct]))
+            opened = ~accept & ~leaf
+            parent_group, parent = group[opened], node[opened]
+            counts = self.n_children[parent]
+            group = np.repeat(parent_group, counts)
+            _, node = _expand_ranges(self.first_child[parent], counts)
+        join = lambda pairs: tuple(np.concatenate(column) for column in zip(*pairs))
+        return join(far), join(near)
+
+
+class _Rows:
+    """
+    Intervalli di corpi spezzati in righe di larghezza fissa: gli slot vuoti
+    (index = -1) ripetono il primo corpo della riga e vengono scartati alla fine.
+    """
+
+    def __init__(self, starts, counts, width, positions):
+        per_range = -(-counts // width)
+        owner, local = _expand_ranges(np.zeros(len(counts), dtype=np.int64), per_range)
+        row_start = starts[owner] + local * width
+        row_count = np.minimum(width, counts[owner] - local * width)
+        slots = np.arange(width)
+        self.valid = slots < row_count[:, None]
+        self.index = np.where(self.valid, row_start[:, None] + slots, -1)
+        safe = np.where(self.valid, self.index, row_start[:, None])
+        self.x, self.y, self.z = positions[:, safe]
+
+    def __len__(self):
+        return len(self.index)
+
+    def bounds(self):
+        """Centro e raggio della sfera che contiene ogni riga"""
+        low = np.stack([self.x.min(axis=1), self.y.min(axis=1), self.z.min(axis=1)])
+        high = np.stack([self.x.max(axis=1), self.y.max(axis=1), self.z.max(axis=1)])
+        return 0.5 * (low + high), 0.5 * np.sqrt(((high - low) ** 2).sum(axis=0))
+
+
+def _scatter(total, group, values):
+    """Somma i contributi (P, ...) nelle righe dei rispettivi gruppi (group ordinato)"""
+    first = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    total[group[first]] += np.add.reduceat(values, first, axis=0)
+
+
+def _source_rows(group, n_groups, width, *columns):
+    """
+    Dispone le sorgenti (ordinate per gruppo) in righe di width slot, riempite con zeri:
+    restituisce il gruppo di ogni riga e le colonne come matrici (righe, width).
+    """
+    count = np.bincount(group, minlength=n_groups)
+    per_group = -(-count // width)
+    first_row = np.cumsum(per_group) - per_group
+    offset = np.cumsum(count) - count
+    slot = first_row[group] * width + np.arange(len(group)) - offset[group]
+    n_rows = int(per_group.sum())
+    rows = []
+    for column, fill in columns:
+        padded = np.full(n_rows * width, fill, dtype=column.dtype)
+        padded[slot] = column
+        rows.append(padded.reshape(n_rows, width))
+    return np.repeat(np.arange(n_groups), per_group), rows
+
+
+def tree_accelerations(positions, masses, G=1.0, softening=0.0, theta=None, potential=False,
+                       leaf_size=None, group_size=None):
+    """
+    Accelerazioni (3, N) con Barnes-Hut (monopolo), O(N log N).
+    Stessa interfaccia di direct_accelerations; theta=0 degenera nella somma diretta.
+    """
+    theta = ASTRAL_THETA if theta is None else theta
+    leaf_size = leaf_size or ASTRAL_LEAF_SIZE
+    group_size = group_size or ASTRAL_GROUP_SIZE
+    n = positions.shape[1]
+    tree = OctTree(positions, masses, leaf_size)
+    x, counts = tree.positions, tree.end - tree.start
+    groups = _Rows(*tree.groups(group_size), group_size, x)
+    center, radius = groups.bounds()
+    width = groups.x.shape[1]
+    acc = np.zeros((3, len(groups), width))
+    phi = np.zeros((len(groups), width)) if potential else None
+    eps2 = softening * softening
+    step = max(1, ASTRAL_PAIR_CHUNK // (_SOURCE_WIDTH * width))
+
+    for block in range(0, len(groups), _GROUP_BLOCK):
+        n_block = min(_GROUP_BLOCK, len(groups) - block)
+        (far_group, far_node), (near_group, near_leaf) = tree.interaction_lists(
+            center[:, block:block + n_block], radius[block:block + n_block], theta or 1e-12
+        )
+        # Sorgenti di ogni gruppo: monopoli dei nodi lontani e corpi delle foglie vicine
+        pair, body = _expand_ranges(tree.start[near_leaf], counts[near_leaf])
+        group = np.r_[far_group, near_group[pair]]
+        order = np.argsort(group, kind='stable')
+        row_group, (sx, sy, sz, sm, source) = _source_rows(
+            group[order], n_block, _SOURCE_WIDTH,
+            (np.r_[tree.com[0, far_node], x[0, body]][order], 0.0),
+            (np.r_[tree.com[1, far_node], x[1, body]][order], 0.0),
+            (np.r_[tree.com[2, far_node], x[2, body]][order], 0.0),
+            (np.r_[tree.mass[far_node], tree.masses[body]][order], 0.0),
+            (np.r_[np.full(len(far_node), -1), body][order], -1),
+        )
+        row_group += block
+
+        # Righe di sorgenti contro i corpi del gruppo, blocchi (righe, sorgenti, corpi)
+        for lo in range(0, len(row_group), step):
+            rows, owner = slice(lo, lo + step), row_group[lo:lo + step]
+            dx = sx[rows, :, None] - groups.x[owner, None, :]
+            dy = sy[rows, :, None] - groups.y[owner, None, :]
+            dz = sz[rows, :, None] - groups.z[owner, None, :]
+            weight, m_inv_r = _pair_weights(dx, dy, dz, sm[rows, :, None], eps2, potential)
+            for axis, d in enumerate((dx, dy, dz)):
+                _scatter(acc[axis], owner, np.einsum('rsg,rsg->rg', d, weight))
+            if potential:
+                # Il corpo non interagisce con sé stesso (conta solo col softening)
+                m_inv_r[source[rows, :, None] == groups.index[owner, None, :]] = 0.0
+                _scatter(phi, owner, -m_inv_r.sum(axis=1))
+
+    # Dalle righe all'ordine originale dei corpi
+    body = tree.order[groups.index[groups.valid]]
+    result = np.empty((3, n))
+    result[:, body] = G * acc[:, groups.valid]
+    if potential:
+        body_phi = np.empty(n)
+        body_phi[body] = G * phi[groups.valid]
+        return result, body_phi
+    return result
+
+
+def select_method(n, method='auto'):
+    """'direct' o 'tree' a seconda di N, salvo scelta esplicita"""
+    if method == 'auto':
+        return 'direct' if n <= ASTRAL_DIRECT_MAX else 'tree'
+    if method not in ('direct', 'tree'):
+        raise AstralError(f"Metodo non supportato: {method}")
+    return method
+
+
+def estimated_cost(n, steps, method, theta=None):
+    """
+    Interazioni a coppie stimate di una simulazione: N^2 per valutazione con la
+    somma diretta, N log2 N scalato per theta^-3 con l'albero (al più N^2), più
+    le due valutazioni della diagnostica.
+    """
+    theta = ASTRAL_THETA if theta is None else theta
+    per_body = n
+    if method == 'tree' and theta > 0:
+        per_body = min(n, math.log2(max(n, 2)) * _TREE_PAIRS_PER_LEVEL * (0.5 / theta) ** 3)
+    return n * per_body * (steps + 2)
+
+
+def accelerations(positions, masses, G=1.0, softening=0.0, method='auto', theta=None, potential=False):
+    """Accelerazioni con il kernel scelto da select_method"""
+    if select_method(positions.shape[1], method) == 'direct':
+        return direct_accelerations(positions, masses, G, softening, potential)
+    return tree_accelerations(positions, masses, G, softening, theta, potential)
+
+
+# --- Condizioni iniziali ----------------------------------------------------
+
+def _plummer(n, rng):
+    """Sfera di Plummer in equilibrio viriale (G = M = 1, raggio di scala 1), campionamento di Aarseth"""
+    radius = 1.0 / np.sqrt(rng.uniform(1e-10, 1.0, n) ** (-2.0 / 3.0) - 1.0)
+    direction = rng.normal(size=(3, n))
+    positions = radius * direction / np.linalg.norm(direction, axis=0)
+    # q = v / v_fuga con densità q^2 (1 - q^2)^(7/2): rifiuto vettorizzato
+    q = np.empty(n)
+    pending = np.arange(n)
+    while pending.size:
+        candidate = rng.uniform(0.0, 1.0, pending.size)
+        accepted = rng.uniform(0.0, 0.1, pending.size) < candidate ** 2 * (1 - candidate ** 2) ** 3.5
+        q[pending[accepted]] = candidate[accepted]
+        pending = pending[~accepted]
+    speed = q * np.sqrt(2.0) * (1.0 + radius ** 2) ** -0.25
+    direction = rng.normal(size=(3, n))
+    velocities = speed * direction / np.linalg.norm(direction, axis=0)
+    return positions, velocities, np.full(n, 1.0 / n)
+
+
+def _uniform_sphere(n, rng):
+    """Sfera omogenea fredda di massa 1 e raggio 1 (collasso)"""
+    direction = rng.normal(size=(3, n))
+    positions = rng.uniform(0, 1, n) ** (1 / 3) * direction / np.linalg.norm(direction, axis=0)
+    return positions, np.zeros((3, n)), np.full(n, 1.0 / n)
+
+
+def _two_body(params):
+    """Orbita kepleriana di un satellite attorno a un corpo centrale, in partenza dal pericentro"""
+    central, satellite = float(params.get('central_mass', 1.0)), float(params.get('satellite_mass', 1e-3))
+    a, e = float(params.get('semi_major_axis', 1.0)), float(params.get('eccentricity', 0.0))
+    if not 0 <= e < 1 or a <= 0:
+        raise AstralError("Servono semi_major_axis > 0 ed eccentricity in [0, 1)")
+    r = a * (1 - e)
+    v = math.sqrt(float(params.get('G', 1.0)) * (central + satellite) * (1 + e) / r)
+    positions = np.array([[0.0, r], [0.0, 0.0], [0.0, 0.0]])
+    velocities = np.array([[0.0, 0.0], [0.0, v], [0.0, 0.0]])
+    return positions, velocities, np.array([central, satellite])
+
+
+def _figure_eight(params):
+    """Coreografia a otto di Chenciner-Montgomery (tre masse unitarie, G = 1, periodo 6.3259)"""
+    x1 = np.array([0.97000436, -0.24308753, 0.0])
+    v3 = np.array([-0.93240737, -0.86473146, 0.0])
+    positions = np.stack([x1, -x1, np.zeros(3)], axis=1)
+    velocities = np.stack([-v3 / 2, -v3 / 2, v3], axis=1)
+    return positions, velocities, np.ones(3)
+
+
+PRESETS = {
+    'plummer': lambda params, rng: _plummer(int(params.get('n', 1000)), rng),
+    'uniform_sphere': lambda params, rng: _uniform_sphere(int(params.get('n', 1000)), rng),
+    'two_body': lambda params, rng: _two_body(params),
+    'figure_eight': lambda params, rng: _figure_eight(params),
+}
+
+
+def initial_state(params):
+    """
+    Stato iniziale (posizioni (3, N), velocità (3, N), masse (N,)) da un preset
+    oppure da 'masses', 'positions' e 'velocities' espliciti (liste di terne).
+    Il sistema è riportato nel riferimento del centro di massa.
+    """
+    if 'positions' in params:
+        masses = np.asarray(params.get('masses', 1.0), dtype=np.float64)
+        positions = np.asarray(params['positions'], dtype=np.float64).T
+        if positions.ndim != 2 or positions.shape[0] != 3:
+            raise AstralError("positions deve essere una lista di terne [x, y, z]")
+        n = positions.shape[1]
+        masses = np.broadcast_to(masses, (n,)).copy() if masses.ndim == 0 else masses
+        velocities = np.asarray(params.get('velocities', np.zeros((n, 3))), dtype=np.float64).T
+        if masses.shape != (n,) or velocities.shape != (3, n):
+            raise AstralError("masses e velocities devono avere un valore per corpo")
+        positions, velocities = positions.copy(), velocities.copy()
+    else:
+        preset = params.get('preset', 'plummer')
+        if preset not in PRESETS:
+            raise AstralError(f"Preset sconosciuto: {preset} (disponibili: {', '.join(PRESETS)})")
+        if int(params.get('n', 1)) > ASTRAL_MAX_BODIES:
+            raise AstralError(f"Il numero di corpi deve essere tra 1 e {ASTRAL_MAX_BODIES}")
+        positions, velocities, masses = PRESETS[preset](params, np.random.default_rng(params.get('seed')))
+    n = len(masses)
+    if not 1 <= n <= ASTRAL_MAX_BODIES:
+        raise AstralError(f"Il numero di corpi deve essere tra 1 e {ASTRAL_MAX_BODIES}")
+    if np.any(masses < 0) or masses.sum() <= 0:
+        raise AstralError("Le masse devono essere non negative con somma positiva")
+    if not (np.isfinite(positions).all() and np.isfinite(velocities).all()):
+        raise AstralError("Posizioni e velocità devono essere finite")
+    total = masses.sum()
+    positions -= (positions * masses).sum(axis=1, keepdims=True) / total
+    velocities -= (velocities * masses).sum(axis=1, keepdims=True) / total
+    return positions, velocities, masses
+
+
+# --- Diagnostica --------------------------------------------------------------
+
+def energy(velocities, masses, phi):
+    """Energia cinetica, potenziale e totale dal potenziale per corpo"""
+    kinetic = 0.5 * float((masses * (velocities ** 2).sum(axis=0)).sum())
+    potential = 0.5 * float((masses * phi).sum())
+    return {'kinetic': kinetic, 'potential': potential, 'total': kinetic + potential}
+
+
+def orbital_elements(positions, velocities, masses, G=1.0):
+    """
+    Elementi orbitali osculanti di ogni corpo rispetto al più massiccio:
+    semiasse maggiore, eccentricità, inclinazione (gradi) e periodo (NaN per orbite aperte).
+    """
+    central = int(np.argmax(masses))
+    r = positions - positions[:, central:central + 1]
+    v = velocities - velocities[:, central:central + 1]
+    mu = G * (masses[central] + masses)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.linalg.norm(r, axis=0)
+        specific_energy = 0.5 * (v ** 2).sum(axis=0) - mu / distance
+        a = -mu / (2 * specific_energy)
+        h = np.cross(r, v, axis=0)
+        e = np.linalg.norm(np.cross(v, h, axis=0) / mu - r / distance, axis=0)
+        inclination = np.degrees(np.arccos(h[2] / np.linalg.norm(h, axis=0)))
+        period = np.where(a > 0, 2 * np.pi * np.sqrt(np.abs(a) ** 3 / mu), np.nan)
+    elements = {'semi_major_axis': a, 'eccentricity': e, 'inclination_deg': inclination, 'period': period}
+    for values in elements.values():
+        values[central] = np.nan
+    elements['central'] = central
+    return elements
+
+
+# --- Istantanee ---------------------------------------------------------------
+
+def cleanup_snapshots(directory=None, keep=None, now=None):
+    """
+    Cancella le istantanee più vecchie di ASTRAL_SNAPSHOT_TTL e, fra le restanti,
+    tutte tranne le keep più recenti (default ASTRAL_SNAPSHOT_MAX_FILES).
+    Vale anche per i file .partial lasciati da simulazioni interrotte.
+    """
+    directory = directory or ASTRAL_SNAPSHOT_DIR
+    keep = ASTRAL_SNAPSHOT_MAX_FILES if keep is None else keep
+    now = time.time() if now is None else now
+    try:
+        names = [name for name in os.listdir(directory) if name.startswith('astral_')]
+    except FileNotFoundError:
+        return 0
+    files = []
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    files.sort(reverse=True)
+    removed = 0
+    for index, (mtime, path) in enumerate(files):
+        if index >= keep or now - mtime > ASTRAL_SNAPSHOT_TTL:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class SnapshotWriter:
+    """
+    Istantanee (S, 6, N) in un file .npy mappato in memoria: righe 0-2 posizioni,
+    3-5 velocità. Il file è preallocato; ogni scrittura tocca solo la propria riga.
+    Durante la simulazione il file ha suffisso .partial e diventa leggibile con
+    snapshot_path solo dopo close().
+    """
+
+    def __init__(self, n_bodies, count, directory=None):
+        size_mb = count * 6 * n_bodies * 8 / 2 ** 20
+        if size_mb > ASTRAL_SNAPSHOT_MAX_MB:
+            raise AstralError(f"Istantanee troppo grandi ({size_mb:.0f} MB, massimo {ASTRAL_SNAPSHOT_MAX_MB} MB)")
+        directory = directory or ASTRAL_SNAPSHOT_DIR
+        os.makedirs(directory, exist_ok=True)
+        # Lascia posto al nuovo file: al più ASTRAL_SNAPSHOT_MAX_FILES su disco
+        cleanup_snapshots(directory, keep=max(ASTRAL_SNAPSHOT_MAX_FILES - 1, 0))
+        self.snapshot_id = uuid.uuid4().hex
+        self.path = os.path.join(directory, f"astral_{self.snapshot_id}.npy")
+        self._partial = self.path + '.partial'
+        self._file = np.lib.format.open_memmap(self._partial, mode='w+', dtype=np.float64,
+                                               shape=(count, 6, n_bodies))
+        self.written = 0
+
+    def write(self, positions, velocities):
+        self._file[self.written, :3] = positions
+        self._file[self.written, 3:] = velocities
+        self.written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            self._file = None
+            os.replace(self._partial, self.path)
+
+    def discard(self):
+        """Simulazione fallita: il file parziale non serve a nessuno"""
+        self._file = None
+        try:
+            os.remove(self._partial)
+        except FileNotFoundError:
+            pass
+
+
+def snapshot_path(snapshot_id, directory=None):
+    """Percorso del file di un id restituito da simulate_nbody; SnapshotNotFound se sconosciuto o scaduto"""
+    if not isinstance(snapshot_id, str) or not _SNAPSHOT_ID.fullmatch(snapshot_id):
+        raise SnapshotNotFound(snapshot_id)
+    path = os.path.join(directory or ASTRAL_SNAPSHOT_DIR, f"astral_{snapshot_id}.npy")
+    try:
+        expired = time.time() - os.path.getmtime(path) > ASTRAL_SNAPSHOT_TTL
+    except FileNotFoundError:
+        raise SnapshotNotFound(snapshot_id) from None
+    if expired:
+        raise SnapshotNotFound(snapshot_id)
+    return path
+
+
+def load_snapshots(snapshot_id, directory=None):
+    """Istantanee salvate da SnapshotWriter, in sola lettura e senza caricarle in RAM"""
+    return np.load(snapshot_path(snapshot_id, directory), mmap_mode='r')
+
+
+# --- Integrazione -------------------------------------------------------------
+
+def simulate_nbody(params):
+    """
+    Integra un sistema N-corpi con leapfrog kick-drift-kick a passo fisso.
+    Parametri: stato iniziale (vedi initial_state), dt, steps, G, softening,
+    method ('auto', 'direct', 'tree'), theta, snapshot_every (0 = nessuna istantanea).
+    """
+    positions, velocities, masses = initial_state(params)
+    n = len(masses)
+    dt, steps = float(params.get('dt', 0.01)), int(params.get('steps', 100))
+    G, softening = float(params.get('G', 1.0)), float(params.get('softening', 0.0))
+    theta = float(params.get('theta', ASTRAL_THETA))
+    method = select_method(n, params.get('method', 'auto'))
+    every = int(params.get('snapshot_every', 0))
+    if dt <= 0 or not 0 <= steps <= ASTRAL_MAX_STEPS:
+        raise AstralError(f"Servono dt > 0 e steps tra 0 e {ASTRAL_MAX_STEPS}")
+    if softening < 0 or theta < 0 or every < 0:
+        raise AstralError("softening, theta e snapshot_every non possono essere negativi")
+    cost = estimated_cost(n, steps, method, theta)
+    if cost > ASTRAL_MAX_COST:
+        raise AstralError(f"Simulazione troppo costosa ({cost:.2g} interazioni stimate, massimo {ASTRAL_MAX_COST:.2g}): "
+                          "ridurre corpi o passi")
+
+    def forces(potential=False):
+        with timed_phase(f'astral.{method}'):
+            return accelerations(positions, masses, G, softening, method, theta, potential)
+
+    acc, phi = forces(potential=True)
+    initial_energy = energy(velocities, masses, phi)
+    initial_momentum = (velocities * masses).sum(axis=1)
+    writer = SnapshotWriter(n, steps // every + 1) if every else None
+    try:
+        if writer:
+            writer.write(positions, velocities)
+        for step in range(1, steps + 1):
+            velocities += 0.5 * dt * acc
+            positions += dt * velocities
+            acc = forces()
+            velocities += 0.5 * dt * acc
+            if writer and step % every == 0:
+                writer.write(positions, velocities)
+    except BaseException:
+        if writer:
+            writer.discard()
+        raise
+    if writer:
+        writer.close()
+
+    _, phi = forces(potential=True)
+    final_energy = energy(velocities, masses, phi)
+    drift = abs(final_energy['total'] - initial_energy['total']) / max(abs(initial_energy['total']), 1e-300)
+    result = {
+        'n_bodies': n,
+        'method': method,
+        'steps': steps,
+        'dt': dt,
+        'time': steps * dt,
+        'energy': {'initial': initial_energy, 'final': final_energy, 'relative_drift': drift},
+        'momentum': {'initial': initial_momentum, 'final': (velocities * masses).sum(axis=1)},
+    }
+    if writer:
+        result['snapshots'] = {
+            'id': writer.snapshot_id,
+            'count': writer.written,
+            'every': every,
+            'times': np.arange(writer.written) * every * dt,
+        }
+    if n <= ASTRAL_RETURN_MAX or params.get('return_state'):
+        result['positions'] = positions
+        result['velocities'] = velocities
+        if n > 1:
+            result['orbital_elements'] = orbital_elements(positions, velocities, masses, G)
+    return result
@@ -1,22 +1,166 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from typing import Dict, Optional
 from uuid import uuid4
 from pydantic import BaseModel
+from .metrics import timed_phase
+import asyncio
+import os
+import threading
+import time
 
 # Configurazione
 SECRET_KEY = "your-secret-key-change-this-in-production"  # In produzione usa una chiave segreta complessa
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 KEY_EXPIRATION_DAYS = 90
+KEY_STORE_BACKEND = os.getenv("RIQA_KEY_STORE", "memory")  # "memory" oppure "database"
+KEY_CACHE_TTL = float(os.getenv("RIQA_KEY_CACHE_TTL", "30"))  # Secondi di validità delle copie in memoria
+TOKEN_CACHE_SIZE = int(os.getenv("RIQA_TOKEN_CACHE_SIZE", "100000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("RIQA_PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("RIQA_PASSWORD_HASH_MAX_PENDING", "64"))  # Oltre: 503
 
 # Strutture dati
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-user_keys_db: Dict[str, str] = {}  # Sostituire con database reale in produzione
+
+class DatabaseKeyPersistence:
+    """Persistenza delle chiavi su backend/database.py, condivisa tra worker e riavvii"""
+    def __init__(self):
+        from . import database
+        self.db = database
+        database.init_db()
+
+    def save(self, username: str, key: str, expiry: float):
+        self.db.save_user_key(username, key, expiry)
+
+    def load(self, username: str):
+        return self.db.load_user_key(username)
+
+    def find(self, key: str):
+        return self.db.find_user_key(key)
+
+class UserKeyStore:
+    """
+    Indice diretto username -> (chiave, scadenza) e inverso chiave -> (username, scadenza).
+    Con una persistenza configurata, le copie in memoria scadono dopo `ttl` secondi.
+    """
+    def __init__(self, persistence=None, ttl: float = KEY_CACHE_TTL):
+        self.persistence = persistence
+        self.ttl = ttl
+        self._by_user: Dict[str, tuple] = {}  # username -> (chiave, scadenza, caricato_il)
+        self._by_key: Dict[str, tuple] = {}  # chiave -> (username, scadenza)
+        self._lock = threading.Lock()
+
+    def _index(self, username: str, key: str, expiry: float):
+        with self._lock:
+            old = self._by_user.get(username)
+            if old is not None and old[0] != key:
+                self._by_key.pop(old[0], None)
+            self._by_user[username] = (key, expiry, time.monotonic())
+            self._by_key[key] = (username, expiry)
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return self.persistence is None or time.monotonic() - loaded_at < self.ttl
+
+    def set(self, username: str, key: str, expiry: float):
+        if self.persistence is not None:
+            self.persistence.save(username, key, expiry)
+        self._index(username, key, expiry)
+
+    def get(self, username: str) -> Optional[str]:
+        entry = self._by_user.get(username)
+        if entry is not None and self._fresh(entry[2]):
+            return entry[0]
+        if self.persistence is None:
+            return None
+        row = self.persistence.load(username)
+        if row is None:
+            return None
+        self._index(username, row[0], row[1])
+        return row[0]
+
+    def _cached(self, key: str) -> Optional[tuple]:
+        entry = self._by_key.get(key)
+        if entry is not None:
+            user_entry = self._by_user.get(entry[0])
+            if user_entry is not None and user_entry[0] == key and self._fresh(user_entry[2]):
+                return entry
+        return None
+
+    def lookup(self, key: str) -> Optional[tuple]:
+        """Restituisce (username, scadenza) della chiave in O(1), oppure None"""
+        entry = self._cached(key)
+        if entry is not None or self.persistence is None:
+            return entry
+        return self._load(key)
+
+    async def lookup_async(self, key: str) -> Optional[tuple]:
+        """Come lookup, ma la lettura dalla persistenza gira in un thread e non blocca il loop"""
+        entry = self._cached(key)
+        if entry is not None or self.persistence is None:
+            return entry
+        return await asyncio.to_thread(self._load, key)
+
+    def _load(self, key: str) -> Optional[tuple]:
+        row = self.persistence.find(key)
+        if row is None:
+            with self._lock:
+                self._by_key.pop(key, None)
+            return None
+        self._index(row[0], key, row[1])
+        return row[0], row[1]
+
+class VerifiedTokenCache:
+    """
+    Cache a scadenza breve delle coppie (token, chiave) già verificate.
+    Le voci di un utente vengono invalidate alla rotazione della chiave.
+    """
+    def __init__(self, ttl: float = KEY_CACHE_TTL, max_size: int = TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (token, chiave) -> (TokenData, scade_il)
+        self._by_user: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str, key: str):
+        with self._lock:
+            entry = self._entries.get((token, key))
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._drop((token, key))
+                return None
+            return entry[0]
+
+    def put(self, token: str, key: str, token_data, not_after: float):
+        expires_at = min(time.time() + self.ttl, not_after)
+        with self._lock:
+            self._entries[(token, key)] = (token_data, expires_at)
+            self._by_user.setdefault(token_data.username, set()).add((token, key))
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, cache_key):
+        token_data, _ = self._entries.pop(cache_key)
+        user_keys = self._by_user.get(token_data.username)
+        if user_keys is not None:
+            user_keys.discard(cache_key)
+            if not user_keys:
+                del self._by_user[token_data.username]
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            for cache_key in self._by_user.pop(username, set()):
+                self._entries.pop(cache_key, None)
+
+key_store = UserKeyStore(DatabaseKeyPersistence() if KEY_STORE_BACKEND == "database" else None)
+token_cache = VerifiedTokenCache()
 
 # Modelli
 class TokenData(BaseModel):
@@ -35,24 +179,65 @@ def verify_password(plain_password: str, hashed_password: str):
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    """Sollevata quando troppe operazioni bcrypt sono già in coda"""
+
+class PasswordHasher:
+    """
+    Esegue bcrypt in un pool di thread dedicato e limitato, fuori dal loop asyncio.
+    Oltre `max_pending` operazioni in corso o in coda le nuove vengono rifiutate.
+    """
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="riqa-bcrypt")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy(f"{self._pending} operazioni di hashing già in coda")
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+password_hasher = PasswordHasher()
+
 def generate_user_key(username: str) -> str:
     """Genera e salva una chiave unica per l'utente con scadenza"""
     key_id = uuid4().hex[:12]
     timestamp = int(datetime.utcnow().timestamp())
     expiry = timestamp + (KEY_EXPIRATION_DAYS * 86400)
     user_key = f"ak_{key_id}_{timestamp}_{expiry}"
-    user_keys_db[username] = user_key
+    key_store.set(username, user_key, expiry)
+    # La rotazione invalida i token già verificati con la chiave precedente
+    token_cache.invalidate_user(username)
     return user_key
 
 def get_user_key(username: str) -> Optional[str]:
     """Recupera la chiave utente"""
-    return user_keys_db.get(username)
+    return key_store.get(username)
 
 def validate_user_key(key: str) -> bool:
     """Verifica se una chiave esiste nel sistema e non è scaduta"""
-    if key not in user_keys_db.values():
+    entry = key_store.lookup(key)
+    if entry is None:
         return False
-    return not is_key_expired(key)
+    return datetime.utcnow().timestamp() <= entry[1]
 
 def is_key_expired(key: str) -> bool:
     """Verifica se una chiave è scaduta"""
@@ -100,19 +285,26 @@ async def verify_user_key(
             detail="User key mancante"
         )
     
-    # Verifica JWT
-    payload = decode_token(token)
-    username = payload.username
+    with timed_phase('auth.verify'):
+        # Coppia (token, chiave) già verificata di recente
+        cached = token_cache.get(token, x_user_key)
+        if cached is not None:
+            return cached
     
-    # Verifica User Key
-    stored_key = get_user_key(username)
-    if not stored_key or stored_key != x_user_key or not validate_user_key(x_user_key):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User key non valida o scaduta"
-        )
+        # Verifica JWT
+        payload = decode_token(token)
+        username = payload.username
+    
+        # Verifica User Key tramite l'indice inverso
+        entry = await key_store.lookup_async(x_user_key)
+        if entry is None or entry[0] != username or datetime.utcnow().timestamp() > entry[1]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User key non valida o scaduta"
+            )
     
-    return payload
+        token_cache.put(token, x_user_key, payload, min(jwt.get_unverified_claims(token)["exp"], entry[1]))
+        return payload
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -140,11 +332,11 @@ def get_user_from_db(username: str) -> Optional[User]:
     # Implementare con database reale
     return User(username=username, hashed_password="fakehashedpass")
 
-def create_db_user(username: str, password: str) -> User:
+def create_db_user(username: str, password: str, hashed_password: Optional[str] = None) -> User:
     # Implementare con database reale
     user_key = generate_user_key(username)
     return User(
         username=username,
-        hashed_password=get_password_hash(password),
+        hashed_password=hashed_password or get_password_hash(password),
         user_key=user_key
     )
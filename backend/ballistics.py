@@ -0,0 +1,378 @@
+"""
+Motore balistico a lotti di AI_RIQA.
+Tutte le traiettorie di un lotto Monte Carlo avanzano insieme come righe di
+array NumPy: RK4 con gravità, resistenza quadratica e vento costante. Il passo
+è proporzionale al tempo di volo stimato di ciascuna traiettoria, così ognuna
+arriva al suolo in circa lo stesso numero di passi; l'impatto è individuato a
+ogni passo e interpolato con il polinomio di Hermite del passo stesso.
+Delle traiettorie restano solo i punti di impatto, salvo richiesta esplicita.
+"""
+
+import asyncio
+import math
+import os
+
+import numpy as np
+
+# Configurazione del motore
+BALLISTIC_STEPS_PER_FLIGHT = int(os.getenv("RIQA_BALLISTIC_STEPS_PER_FLIGHT", "200"))  # Passi RK4 per il volo stimato
+BALLISTIC_MAX_STEPS = int(os.getenv("RIQA_BALLISTIC_MAX_STEPS", "100000"))  # Tetto assoluto dei passi di un lotto
+BALLISTIC_MAX_SAMPLES = int(os.getenv("RIQA_BALLISTIC_MAX_SAMPLES", "2000000"))
+BALLISTIC_MAX_KEPT = int(os.getenv("RIQA_BALLISTIC_MAX_KEPT", "100"))  # Traiettorie complete restituibili
+BALLISTIC_SPLIT_SAMPLES = int(os.getenv("RIQA_BALLISTIC_SPLIT_SAMPLES", "50000"))  # Oltre, il lotto si divide tra i worker
+GRAVITY = 9.80665
+AIR_DENSITY = 1.225
+
+_PERCENTILES = (5, 50, 95)
+_DRAG_STEP = 0.25  # Passo massimo in unità del tempo di smorzamento 1/(k |v|): RK4 resta stabile e accurato
+_STEP_MARGIN = 4  # Passi concessi oltre la stima del volo prima di arrendersi
+
+
+class BallisticError(ValueError):
+    """Parametri balistici non validi"""
+
+
+def _sample(spec, n, rng, name):
+    """Scalare, lista esplicita, {'mean', 'std'} (normale) oppure {'low', 'high'} (uniforme)"""
+    if isinstance(spec, dict):
+        if 'mean' in spec:
+            return rng.normal(float(spec['mean']), float(spec.get('std', 0.0)), n)
+        if 'low' in spec and 'high' in spec:
+            return rng.uniform(float(spec['low']), float(spec['high']), n)
+        raise BallisticError(f"Distribuzione non riconosciuta per '{name}': usa mean/std o low/high")
+    values = np.asarray(spec, dtype=np.float64)
+    if values.ndim == 0:
+        return np.full(n, float(values))
+    if len(values) != n:
+        raise BallisticError(f"'{name}' ha {len(values)} valori, attesi {n}")
+    return values
+
+
+def sample_launches(params):
+    """
+    Condizioni di lancio del lotto come array (uno per grandezza, lunghezza samples).
+    drag è il coefficiente k = rho * Cd * A / (2 m) in 1/m; in alternativa cd, area e mass.
+    """
+    n = int(params.get('samples', 1))
+    if not 1 <= n <= BALLISTIC_MAX_SAMPLES:
+        raise BallisticError(f"samples deve essere tra 1 e {BALLISTIC_MAX_SAMPLES}")
+    rng = np.random.default_rng(params.get('seed'))
+    if 'drag' in params:
+        drag = _sample(params['drag'], n, rng, 'drag')
+    elif 'mass' in params:
+        density = float(params.get('air_density', AIR_DENSITY))
+        drag = (density * _sample(params.get('cd', 0.47), n, rng, 'cd') * _sample(params['area'], n, rng, 'area')
+                / (2 * _sample(params['mass'], n, rng, 'mass')))
+    else:
+        drag = np.zeros(n)
+    wind = np.zeros((3, n))
+    wind[:] = np.asarray(params.get('wind', (0.0, 0.0, 0.0)), dtype=np.float64).reshape(3, 1)
+    if params.get('wind_std'):
+        wind += rng.normal(0.0, 1.0, (3, n)) * np.asarray(params['wind_std'], dtype=np.float64).reshape(-1, 1)
+    launches = {
+        'speed': _sample(params.get('speed', 100.0), n, rng, 'speed'),
+        'elevation': np.radians(_sample(params.get('angle_deg', 45.0), n, rng, 'angle_deg')),
+        'azimuth': np.radians(_sample(params.get('azimuth_deg', 0.0), n, rng, 'azimuth_deg')),
+        'height': _sample(params.get('height', 0.0), n, rng, 'height'),
+        'drag': drag,
+        'wind': wind,
+    }
+    if np.any(launches['speed'] <= 0) or np.any(drag < 0) or np.any(launches['height'] < 0):
+        raise BallisticError("speed deve essere positiva, drag e height non negativi")
+    return launches
+
+
+def split_launches(launches, parts):
+    """Divide il lotto in parti contigue per l'esecuzione su più processi"""
+    n = len(launches['speed'])
+    edges = np.linspace(0, n, parts + 1).astype(int)
+    return [
+        {name: values[..., start:stop] for name, values in launches.items()}
+        for start, stop in zip(edges[:-1], edges[1:]) if stop > start
+    ]
+
+
+class _Workspace:
+    """
+    Buffer (3, n) riusati a ogni passo. L'accelerazione dipende solo dalla velocità
+    (vento e densità costanti), quindi RK4 integra le velocità e le posizioni seguono
+    dalla media pesata delle velocità di stadio, senza stadi per la posizione.
+    """
+
+    def __init__(self, n, drag, wind, gravity):
+        self.drag, self.wind, self.gravity = drag, wind, gravity
+        self.a1, self.a2, self.a3, self.a4, self.v2, self.v3, self.v4, self.relative = (
+            np.empty((3, n)) for _ in range(8)
+        )
+        self.speed = np.empty(n)
+
+    def acceleration(self, velocity, out):
+        """-k |v - w| (v - w) e gravità, per tutte le colonne"""
+        np.subtract(velocity, self.wind, out=self.relative)
+        np.einsum('ij,ij->j', self.relative, self.relative, out=self.speed)
+        np.sqrt(self.speed, out=self.speed)
+        self.speed *= self.drag
+        np.negative(self.speed, out=self.speed)
+        np.multiply(self.relative, self.speed, out=out)
+        out[2] -= self.gravity
+        return out
+
+    def step(self, position, velocity, dt):
+        """Un passo RK4 (dt per colonna); restituisce nuove posizione e velocità"""
+        half = dt / 2
+        a1 = self.acceleration(velocity, self.a1)
+        np.multiply(a1, half, out=self.v2)
+        self.v2 += velocity
+        a2 = self.acceleration(self.v2, self.a2)
+        np.multiply(a2, half, out=self.v3)
+        self.v3 += velocity
+        a3 = self.acceleration(self.v3, self.a3)
+        np.multiply(a3, dt, out=self.v4)
+        self.v4 += velocity
+        a4 = self.acceleration(self.v4, self.a4)
+        sixth = dt / 6
+        # Somme pesate (1, 2, 2, 1) nei buffer degli stadi, già consumati
+        self.v2 += self.v3
+        self.v2 *= 2
+        self.v2 += velocity
+        self.v2 += self.v4
+        self.v2 *= sixth
+        new_position = position + self.v2
+        a2 += a3
+        a2 *= 2
+        a2 += a1
+        a2 += a4
+        a2 *= sixth
+        new_velocity = velocity + a2
+        return new_position, new_velocity
+
+
+def _hermite_root(z0, z1, vz0, vz1, dt):
+    """Frazione s in [0, 1] del passo in cui la cubica di Hermite di z si annulla (Newton dal valore lineare)"""
+    s = np.clip(z0 / (z0 - z1), 0.0, 1.0)
+    m0, m1 = vz0 * dt, vz1 * dt
+    for _ in range(3):
+        s2, s3 = s * s, s * s * s
+        value = (2 * s3 - 3 * s2 + 1) * z0 + (s3 - 2 * s2 + s) * m0 + (-2 * s3 + 3 * s2) * z1 + (s3 - s2) * m1
+        slope = (6 * s2 - 6 * s) * z0 + (3 * s2 - 4 * s + 1) * m0 + (-6 * s2 + 6 * s) * z1 + (3 * s2 - 2 * s) * m1
+        s = np.clip(s - value / np.where(slope == 0, -1.0, slope), 0.0, 1.0)
+    return s
+
+
+def _hermite_point(p0, p1, v0, v1, dt, s):
+    s2, s3 = s * s, s * s * s
+    return ((2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * dt * v0
+            + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * dt * v1)
+
+
+def _flight_time(vz0, h0, drag, wind, gravity):
+    """
+    Stima del tempo di volo per il passo di integrazione. Nel vuoto è esatta; con
+    la resistenza somma la salita nel vuoto e la caduta dall'apogeo nel vuoto con
+    velocità limite v_t (anche il vento orizzontale frena la caduta), che per
+    quote grandi è molto più lunga della caduta libera:
+    t = (v_t / g) arccosh(exp(g H / v_t^2)).
+    """
+    vacuum = (vz0 + np.sqrt(vz0 * vz0 + 2 * gravity * h0)) / gravity
+    rise = np.maximum(vz0, 0.0)
+    apex = h0 + rise * rise / (2 * gravity)
+    k = np.where(drag > 0, drag, 1.0)
+    w2 = wind[0] ** 2 + wind[1] ** 2
+    # Caduta a regime: k sqrt(vz^2 + w^2) vz = g
+    terminal = np.sqrt((np.sqrt(w2 * w2 + 4 * (gravity / k) ** 2) - w2) / 2)
+    x = gravity * apex / (terminal * terminal)
+    fall = terminal / gravity * (x + np.log1p(np.sqrt(-np.expm1(-2 * x))))  # arccosh(e^x) senza overflow
+    flight = np.where(drag > 0, rise / gravity + fall, vacuum)
+    flight = np.where(flight > 0, flight, math.sqrt(2 * max(float(h0.max()), 1.0) / gravity))
+    return flight, np.where(drag > 0, terminal, np.inf)
+
+
+def integrate_launches(launches, gravity=GRAVITY, steps_per_flight=None, keep=0):
+    """
+    Integra il lotto fino all'impatto (z = 0) di ogni traiettoria.
+    Restituisce gli array di impatto (x, y, time, speed, angle_deg, max_height, landed) e, con keep > 0,
+    le prime keep traiettorie complete campionate a ogni passo.
+    """
+    steps_per_flight = steps_per_flight or BALLISTIC_STEPS_PER_FLIGHT
+    n = len(launches['speed'])
+    speed, elevation, azimuth = launches['speed'], launches['elevation'], launches['azimuth']
+    horizontal = speed * np.cos(elevation)
+    position = np.zeros((3, n))
+    position[2] = launches['height']
+    velocity = np.stack([horizontal * np.cos(azimuth), horizontal * np.sin(azimuth), speed * np.sin(elevation)])
+    drag, wind = launches['drag'], launches['wind']
+
+    # Passo: frazione del volo stimato, limitata dal tempo di smorzamento 1/(k |v|) alla velocità
+    # massima attesa (quella di lancio o quella limite in caduta, rispetto al vento)
+    flight, terminal = _flight_time(velocity[2], position[2], drag, wind, gravity)
+    relative = np.sqrt(np.einsum('ij,ij->j', velocity - wind, velocity - wind))
+    fastest = np.maximum(relative, terminal + np.sqrt(np.einsum('ij,ij->j', wind, wind)))
+    with np.errstate(divide='ignore'):
+        damping = np.where(drag > 0, _DRAG_STEP / (drag * np.where(drag > 0, fastest, 1.0)), np.inf)
+    dt = np.minimum(flight / steps_per_flight, damping)
+    max_steps = int(min(BALLISTIC_MAX_STEPS, _STEP_MARGIN * np.ceil(flight / dt).max()))
+
+    impacts = {name: np.full(n, np.nan) for name in ('x', 'y', 'time', 'speed', 'angle_deg')}
+    impacts['max_height'] = position[2].copy()
+    impacts['landed'] = np.zeros(n, dtype=bool)
+
+    keep = min(int(keep), n, BALLISTIC_MAX_KEPT)
+    kept = []  # Una riga (4, keep) per passo: il numero di passi si conosce solo alla fine
+    if keep:
+        kept.append(np.vstack([np.zeros((1, keep)), position[:, :keep]]))
+
+    index = np.arange(n)  # Colonna attiva -> traiettoria originale (ordine crescente preservato)
+    elapsed = np.zeros(n)
+    max_height = position[2].copy()
+    workspace = _Workspace(n, drag, wind, gravity)
+    step = 0
+    while index.size and step < max_steps:
+        step += 1
+        new_position, new_velocity = workspace.step(position, velocity, dt)
+        np.maximum(max_height, new_position[2], out=max_height)
+        elapsed += dt
+
+        if keep:
+            row = np.full((4, keep), np.nan)
+            active_kept = int(np.searchsorted(index, keep))
+            row[0, index[:active_kept]] = elapsed[:active_kept]
+            row[1:, index[:active_kept]] = new_position[:, :active_kept]
+            kept.append(row)
+        landed = new_position[2] <= 0
+        if landed.any():
+            # Cubica di Hermite sul passo: posizioni e velocità ai due estremi sono note
+            p0, p1 = position[:, landed], new_position[:, landed]
+            v0, v1 = velocity[:, landed], new_velocity[:, landed]
+            step_dt = dt[landed]
+            s = _hermite_root(p0[2], p1[2], v0[2], v1[2], step_dt)
+            point = _hermite_point(p0[:2], p1[:2], v0[:2], v1[:2], step_dt, s)
+            impact_velocity = v0 + s * (v1 - v0)
+            ids = index[landed]
+            impacts['x'][ids], impacts['y'][ids] = point
+            impacts['time'][ids] = elapsed[landed] - (1 - s) * step_dt
+            impacts['speed'][ids] = np.sqrt(np.einsum('ij,ij->j', impact_velocity, impact_velocity))
+            impacts['angle_deg'][ids] = np.degrees(
+                np.arctan2(-impact_velocity[2], np.hypot(impact_velocity[0], impact_velocity[1]))
+            )
+            impacts['max_height'][ids] = max_height[landed]
+            impacts['landed'][ids] = True
+            if keep:
+                kept_landed = ids < keep
+                row[0, ids[kept_landed]] = impacts['time'][ids[kept_landed]]
+                row[1:3, ids[kept_landed]] = point[:, kept_landed]
+                row[3, ids[kept_landed]] = 0.0
+            # Compattazione: le traiettorie atterrate escono dagli array di lavoro
+            stay = ~landed
+            position, velocity = new_position[:, stay], new_velocity[:, stay]
+            index, elapsed, max_height, dt = index[stay], elapsed[stay], max_height[stay], dt[stay]
+            workspace = _Workspace(index.size, workspace.drag[stay], workspace.wind[:, stay], gravity)
+        else:
+            position, velocity = new_position, new_velocity
+    impacts['max_height'][index] = max_height  # Traiettorie ancora in volo al limite di passi
+
+    result = {'impacts': impacts, 'steps': step}
+    if keep:
+        rows = np.stack(kept)
+        result['trajectories'] = {'time': rows[:, 0], 'x': rows[:, 1], 'y': rows[:, 2], 'z': rows[:, 3]}
+    return result
+
+
+def merge_impacts(parts):
+    """Concatena gli impatti delle parti di un lotto diviso tra più processi"""
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def _describe(values):
+    if values.size == 0:
+        return {'mean': None, 'std': None, 'min': None, 'max': None, **{f'p{q:02d}': None for q in _PERCENTILES}}
+    percentiles = np.percentile(values, _PERCENTILES)
+    return {
+        'mean': float(values.mean()), 'std': float(values.std()),
+        'min': float(values.min()), 'max': float(values.max()),
+        **{f'p{q:02d}': float(p) for q, p in zip(_PERCENTILES, percentiles)}
+    }
+
+
+def impact_statistics(impacts):
+    """Statistiche dei punti di impatto: distribuzioni, punto medio, covarianza e raggi di dispersione"""
+    landed = impacts['landed']
+    x, y = impacts['x'][landed], impacts['y'][landed]
+    stats = {
+        'samples': int(landed.size),
+        'landed': int(landed.sum()),
+        'airborne': int(landed.size - landed.sum()),
+        'range': _describe(np.hypot(x, y)),
+        'x': _describe(x),
+        'y': _describe(y),
+        'time_of_flight': _describe(impacts['time'][landed]),
+        'impact_speed': _describe(impacts['speed'][landed]),
+        'impact_angle_deg': _describe(impacts['angle_deg'][landed]),
+        'max_height': _describe(impacts['max_height']),
+    }
+    if x.size:
+        center = np.array([x.mean(), y.mean()])
+        miss = np.hypot(x - center[0], y - center[1])
+        stats['mean_point'] = center.tolist()
+        stats['covariance'] = np.cov(np.vstack([x, y])).reshape(2, 2).tolist() if x.size > 1 else [[0.0, 0.0], [0.0, 0.0]]
+        stats['cep50'] = float(np.median(miss))  # Raggio che contiene metà degli impatti
+        stats['r95'] = float(np.percentile(miss, 95))
+    return stats
+
+
+def _options(params):
+    return float(params.get('gravity', GRAVITY)), params.get('steps_per_flight'), int(params.get('keep_trajectories', 0))
+
+
+def _result(impacts, params, integration=None):
+    result = {'statistics': impact_statistics(impacts)}
+    if params.get('return_impacts'):
+        result['impacts'] = impacts
+    if integration is not None and 'trajectories' in integration:
+        result['trajectories'] = integration['trajectories']
+    return result
+
+
+def simulate_ballistic_batch(params):
+    """Lotto completo in un solo processo: statistiche degli impatti (e impatti/traiettorie se richiesti)"""
+    gravity, steps_per_flight, keep = _options(params)
+    integration = integrate_launches(sample_launches(params), gravity, steps_per_flight, keep)
+    return _result(integration['impacts'], params, integration)
+
+
+class BallisticService:
+    """
+    Divide i lotti grandi tra i worker dell'executor; i campioni sono estratti una
+    sola volta qui, in un thread, come le statistiche finali: l'event loop non
+    esegue mai calcoli sull'intero lotto. La risposta ha la stessa forma di
+    RIQA_Core.process_message, errori di parametri compresi.
+    """
+
+    def __init__(self, executor, split_samples=None):
+        self.executor = executor
+        self.split_samples = split_samples or BALLISTIC_SPLIT_SAMPLES
+
+    def parts_for(self, n):
+        return max(1, min(self.executor.max_workers, math.ceil(n / self.split_samples)))
+
+    def handles(self, params):
+        """Lotto abbastanza grande da dividere; parametri illeggibili restano al percorso ordinario"""
+        try:
+            return int(params.get('samples', 1)) > self.split_samples
+        except (TypeError, ValueError):
+            return False
+
+    async def simulate(self, params):
+        try:
+            gravity, steps_per_flight, keep = _options(params)
+            launches = await asyncio.to_thread(sample_launches, params)
+            parts = split_launches(launches, self.parts_for(len(launches['speed'])))
+            # Solo la prima parte conserva le traiettorie complete: sono le prime keep del lotto
+            results = await asyncio.gather(*(
+                self.executor.run(integrate_launches, part, gravity, steps_per_flight, keep if i == 0 else 0)
+                for i, part in enumerate(parts)
+            ))
+            impacts = await asyncio.to_thread(merge_impacts, [r['impacts'] for r in results])
+            result = await asyncio.to_thread(_result, impacts, params, results[0])
+        except (TypeError, ValueError) as e:
+            return {'status': 'error', 'result': str(e)}
+        return {'status': 'success', 'result': result}
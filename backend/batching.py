@@ -0,0 +1,88 @@
+"""
+Micro-batching dinamico per l'inferenza dei modelli AI di AI_RIQA.
+Le richieste concorrenti vengono raccolte per al massimo N millisecondi o M
+elementi, eseguite con una sola chiamata batch e restituite a chi le attende.
+"""
+
+import asyncio
+import os
+
+# Valori predefiniti, sovrascrivibili per modello
+BATCH_MAX_SIZE = int(os.getenv("RIQA_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("RIQA_BATCH_MAX_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    def __init__(self, run_batch, max_batch_size=None, max_wait_ms=None, name=""):
+        """
+        Args:
+            run_batch (callable): funzione sincrona lista di input -> lista di output,
+                eseguita in un thread per non bloccare il loop
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size or BATCH_MAX_SIZE
+        self.max_wait = (BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.name = name
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        """Accoda un input e attende il suo output"""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Le richieste già abbandonate dal client non occupano il batch
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if batch:
+                await self._execute(batch)
+
+    async def _execute(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            outputs = await asyncio.to_thread(self.run_batch, [item for item, _ in batch])
+            if len(outputs) != len(batch):
+                raise RuntimeError(f"Batch '{self.name}': {len(outputs)} output per {len(batch)} input")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "fill_rate": self.items / (self.batches * self.max_batch_size) if self.batches else 0.0
+        }
@@ -0,0 +1,188 @@
+"""
+Cache dei risultati di simulazione per AI_RIQA.
+Le chiavi sono hash canonici di sezione + parametri normalizzati.
+Livello 1: LRU in processo con limite in byte.
+Livello 2 (opzionale): Redis condiviso tra i worker uvicorn.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import Counter, OrderedDict
+from functools import wraps
+
+import numpy as np
+from pydantic import BaseModel
+
+# Configurazione della cache
+CACHE_ENABLED = os.getenv("RIQA_CACHE_ENABLED", "1") == "1"
+CACHE_MAX_BYTES = int(os.getenv("RIQA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_REDIS_URL = os.getenv("RIQA_CACHE_REDIS_URL")  # es. redis://localhost:6379/0
+CACHE_REDIS_TTL = int(os.getenv("RIQA_CACHE_REDIS_TTL", "3600"))  # Secondi
+
+
+def _normalize(value):
+    """Riduce i parametri a strutture JSON con ordine deterministico"""
+    if isinstance(value, BaseModel):
+        return _normalize(value.dict())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _normalize(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def canonical_key(section, params):
+    """Hash SHA-256 della sezione e dei parametri normalizzati"""
+    payload = json.dumps(
+        {"section": section, "params": _normalize(params)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes=None, redis_client=None, namespace="riqa:cache", ttl=None):
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.namespace = namespace
+        self.ttl = ttl or CACHE_REDIS_TTL
+        self._redis = redis_client
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pending = Counter()  # Contatori non ancora raccolti dal processo principale
+        self._collected = Counter()
+
+    @property
+    def redis(self):
+        if self._redis is None and CACHE_REDIS_URL:
+            import redis
+            self._redis = redis.Redis.from_url(CACHE_REDIS_URL)
+        return self._redis
+
+    def _count(self, name):
+        self._pending[name] += 1
+
+    def get(self, key):
+        """Restituisce (trovato, valore); il valore è sempre una copia"""
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self._count("hits")
+                return True, pickle.loads(blob)
+        blob = self._redis_get(key)
+        if blob is not None:
+            with self._lock:
+                self._count("hits")
+                self._count("redis_hits")
+                self._store(key, blob)
+            return True, pickle.loads(blob)
+        with self._lock:
+            self._count("misses")
+        return False, None
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store(key, blob)
+        self._redis_set(key, blob)
+
+    def _store(self, key, blob):
+        if len(blob) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = blob
+        self._bytes += len(blob)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._count("evictions")
+
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            return self.redis.get(f"{self.namespace}:{key}")
+        except Exception:
+            # Il livello condiviso è best effort: un errore equivale a un miss
+            with self._lock:
+                self._count("redis_errors")
+            return None
+
+    def _redis_set(self, key, blob):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(f"{self.namespace}:{key}", blob, ex=self.ttl)
+        except Exception:
+            with self._lock:
+                self._count("redis_errors")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def drain_counters(self):
+        """Restituisce e azzera i contatori locali (usato dai worker dell'executor)"""
+        with self._lock:
+            counters = dict(self._pending)
+            self._pending.clear()
+        return counters
+
+    def merge_counters(self, counters):
+        """Accumula i contatori raccolti da un worker"""
+        with self._lock:
+            self._collected.update(counters)
+
+    def stats(self):
+        with self._lock:
+            totals = self._collected + self._pending
+            lookups = totals["hits"] + totals["misses"]
+            return {
+                "hits": totals["hits"],
+                "misses": totals["misses"],
+                "evictions": totals["evictions"],
+                "redis_hits": totals["redis_hits"],
+                "redis_errors": totals["redis_errors"],
+                "hit_rate": totals["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+result_cache = ResultCache()
+
+
+def cached(section, method=False):
+    """
+    Decoratore: memorizza il risultato per (sezione, parametri).
+    Con method=True il primo argomento (self) è escluso dalla chiave.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key_args = args[1:] if method else args
+            key = canonical_key(section, {"args": key_args, "kwargs": kwargs})
+            found, value = result_cache.get(key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            result_cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
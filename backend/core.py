@@ -1,86 +1,236 @@
 # backend/core.py
-from qiskit import QuantumCircuit, execute, Aer
-from scipy.integrate import solve_ivp
+from collections import OrderedDict
+from typing import Dict
+import os
+import threading
+import time
 import numpy as np
+from .cache import cached
+from . import statevector
+from .statevector import NativeCircuit, use_native
+from .subsystems import qiskit
+from .analysis import entropy_bits
+from .astral import simulate_nbody
+from .ballistics import simulate_ballistic_batch
+from .math_engine import axis_values, compile_expression, evaluate, evaluate_grid
+from .metrics import section_duration, timed_phase
+from .simulation import SimulationParameters, simulate_complex_system, simulate_batch
+
+# Circuiti transpilati tenuti in memoria e forme pre-caricate all'avvio
+TRANSPILE_CACHE_SIZE = int(os.getenv("RIQA_TRANSPILE_CACHE_SIZE", "64"))
+WARMUP_SHAPES = os.getenv("RIQA_WARMUP_SHAPES", "")  # "n_qubits:gate,gate;..."; vuoto: forme che vanno su Aer
+
+# Sezioni per nome: ogni handler importa le proprie dipendenze pesanti (backend.subsystems) al primo uso
+SECTION_HANDLERS = {
+    'math': '_handle_math',
+    'quantum': '_handle_quantum',
+    'ballistic': '_handle_ballistic',
+    'biological': '_handle_biological',
+    'astral': '_handle_astral',
+    'oscillator': '_handle_oscillator',
+}
+
+def _parse_shapes(spec):
+    shapes = []
+    for item in filter(None, spec.split(';')):
+        n_qubits, _, gates = item.partition(':')
+        shapes.append((int(n_qubits), [g for g in gates.split(',') if g]))
+    return shapes
+
+def _default_shapes():
+    """
+    Circuiti H/CX che il motore nativo non esegue: con il backend 'aer' i più piccoli,
+    altrimenti quelli appena oltre NATIVE_MAX_QUBITS. Con 'native' non serve Aer.
+    """
+    if statevector.QUANTUM_BACKEND == 'aer':
+        sizes = range(2, 6)
+    elif statevector.QUANTUM_BACKEND == 'native':
+        sizes = range(0)
+    else:
+        sizes = range(statevector.NATIVE_MAX_QUBITS + 1, statevector.NATIVE_MAX_QUBITS + 5)
+    return [(n_qubits, ['h', 'cx']) for n_qubits in sizes]
 
 class RIQA_Core:
     def __init__(self):
-        self.simulator = QuantumSimulator()
         self.sessions = {}
+        self._backend = None
+        self._transpiled = OrderedDict()
+        self._transpile_lock = threading.Lock()
+    
+    @property
+    def backend(self):
+        """Backend Aer unico e persistente per tutta la vita del core"""
+        if self._backend is None:
+            self._backend = qiskit.Aer.get_backend('qasm_simulator')
+        return self._backend
+    
+    def warm_up(self, shapes=None):
+        """
+        Pre-carica i circuiti transpilati per le forme che finiscono su Aer e li esegue
+        con un solo shot, così anche il simulatore è già caricato. Le forme che il
+        motore nativo esegue (o rifiuta, con il backend 'native') non richiedono nulla.
+        """
+        warmed = []
+        for n_qubits, gates in shapes or _parse_shapes(WARMUP_SHAPES) or _default_shapes():
+            ops = self._gate_ops(gates)
+            try:
+                if use_native(n_qubits, [gate for gate, _ in ops]):
+                    continue
+            except ValueError:
+                continue
+            _, transpiled = self._get_transpiled(n_qubits, ops)
+            with timed_phase('quantum.warmup'):
+                self.backend.run(transpiled, shots=1).result()
+            warmed.append(n_qubits)
+        return warmed
+    
+    def run_simulation(self, section, params):
+        """Punto di ingresso usato dagli endpoint HTTP/WebSocket"""
+        params = params or {}
+        message = params.get('message', params)
+        return self.process_message(message, section, params.get('client_id'))
     
     def process_message(self, message, section, client_id):
         """Elabora i messaggi in base alla sezione selezionata"""
+        start = time.perf_counter()
         try:
-            if section == 'math':
-                response = self._handle_math(message)
-            elif section == 'quantum':
-                response = self._handle_quantum(message)
-            elif section == 'ballistic':
-                response = self._handle_ballistic(message)
-            elif section == 'biological':
-                response = self._handle_biological(message)
-            elif section == 'astral':
-                response = self._handle_astral(message)
-            else:
+            handler = SECTION_HANDLERS.get(section)
+            if handler is None:
                 response = f"Sezione {section} non implementata"
+            else:
+                response = getattr(self, handler)(message)
             
+            section_duration.observe(time.perf_counter() - start, section=section, status='success')
             return {'status': 'success', 'result': response}
         except Exception as e:
+            section_duration.observe(time.perf_counter() - start, section=section, status='error')
             return {'status': 'error', 'result': str(e)}
     
     def _handle_math(self, message):
-        """Gestisce le richieste matematiche"""
-        # Implementa logica matematica avanzata
+        """
+        Gestisce le richieste matematiche con il motore ristretto e compilato (backend/math_engine.py).
+        Una stringa restituisce il testo del risultato; {'expression', 'variables', 'grid'} valuta
+        l'espressione su array o su una griglia ({'start', 'stop', 'num'} per asse) in un'unica chiamata.
+        """
+        if isinstance(message, dict):
+            compiled = compile_expression(message.get('expression', ''))
+            variables = message.get('variables') or {}
+            if message.get('grid'):
+                result = evaluate_grid(message['expression'], variables)
+            else:
+                result = compiled(**{name: axis_values(spec) for name, spec in variables.items()})
+            return {'expression': compiled.expression, 'variables': list(compiled.variables), 'result': result}
         try:
-            result = eval(message)  # Nota: usa con cautela in produzione!
-            return f"Risultato matematico: {result}"
-        except:
+            value = evaluate(message)
+            # Il motore calcola in float64: i risultati interi esatti si mostrano senza '.0'
+            if isinstance(value, float) and value.is_integer() and abs(value) <= 2 ** 53:
+                value = int(value)
+            return f"Risultato matematico: {value}"
+        except Exception:
             return f"Impossibile valutare l'espressione: {message}"
     
     def _handle_quantum(self, message):
         """Gestisce le richieste quantistiche"""
-        result = self.simulator.run_experiment(message)
+        params = message if isinstance(message, dict) else {}
+        result = self.simulate_quantum_entanglement(params)
         return f"Risultato quantistico: {result}"
     
     def _handle_ballistic(self, message):
-        """Gestisce le simulazioni balistiche"""
-        simulation_result = run_simulation(message)
-        return f"Simulazione balistica: {simulation_result}"
+        """Lotto Monte Carlo di traiettorie (backend/ballistics.py): statistiche dei punti di impatto"""
+        params = message if isinstance(message, dict) else {}
+        return simulate_ballistic_batch(params)
     
     def _handle_biological(self, message):
         """Gestisce le richieste biologiche"""
         return f"Analisi biologica di: {message}"
     
+    def _handle_oscillator(self, message):
+        """Traiettoria dell'oscillatore, oppure uno sweep con 'sweep': [parametri, ...]; restituisce array NumPy"""
+        params = message if isinstance(message, dict) else {}
+        if 'sweep' in params:
+            return simulate_batch(params['sweep'], n_points=int(params.get('n_points', 100)))
+        return simulate_complex_system(SimulationParameters(**params))
+    
     def _handle_astral(self, message):
-        """Gestisce le richieste astrali/matematica avanzata"""
-        return f"Calcolo astrale per: {message}"
+        """Sistema N-corpi (backend/astral.py); un testo è il nome di un preset"""
+        params = message if isinstance(message, dict) else {'preset': str(message).strip()}
+        return simulate_nbody(params)
     
+    @cached('quantum_entanglement', method=True)
     def simulate_quantum_entanglement(self, params: Dict) -> Dict:
         """Nuova simulazione di entanglement quantistico"""
+        return self.sample_quantum_entanglement(params)
+    
+    def sample_quantum_entanglement(self, params: Dict) -> Dict:
+        """Un campionamento indipendente del circuito, senza la cache dei risultati (streaming a lotti di shot)"""
         n_qubits = params.get('n_qubits', 2)
-        qc = QuantumCircuit(n_qubits, n_qubits)
+        shots = params.get('shots', 1024)
         
-        # Applica gate in base ai parametri
-        for gate in params.get('gates', ['h', 'cx']):
-            if gate == 'h':
-                qc.h(0)
-            elif gate == 'cx':
-                qc.cx(0, 1)
-                
-        qc.measure_all()
+        ops = self._gate_ops(params.get('gates', ['h', 'cx']))
         
-        backend = Aer.get_backend('qasm_simulator')
-        job = execute(qc, backend, shots=params.get('shots', 1024))
-        counts = job.result().get_counts(qc)
+        if use_native(n_qubits, [gate for gate, _ in ops]):
+            # Circuiti piccoli: statevector NumPy senza transpilazione né job Qiskit
+            with timed_phase('quantum.native'):
+                qc = NativeCircuit(n_qubits, n_qubits)
+                for gate, qubits in ops:
+                    qc.append(gate, *qubits)
+                counts = qc.sample_counts(shots)
+            return {
+                'counts': counts,
+                'entropy': self._calculate_entropy(counts),
+                'circuit': qc.draw()
+            }
+        
+        # Solo shot ed esecuzione variano: il circuito transpilato viene dalla cache
+        circuit, _ = self._get_transpiled(n_qubits, ops)
+        counts = self.run_counts(n_qubits, ops, shots)
         
         return {
             'counts': counts,
             'entropy': self._calculate_entropy(counts),
-            'circuit': qc.draw(output='text')
+            'circuit': circuit
         }
     
+    def _gate_ops(self, gates):
+        """Traduce la lista di gate dei parametri in operazioni (gate, qubit)"""
+        ops = []
+        for gate in gates:
+            if gate == 'h':
+                ops.append(('h', (0,)))
+            elif gate == 'cx':
+                ops.append(('cx', (0, 1)))
+        return ops
+    
+    def run_counts(self, n_qubits, ops, shots):
+        """Conteggi di un circuito di operazioni (gate, qubit) su Aer, con backend e transpilazione riusati"""
+        _, transpiled = self._get_transpiled(n_qubits, ops)
+        with timed_phase('quantum.execute'):
+            return self.backend.run(transpiled, shots=shots).result().get_counts()
+    
+    def _get_transpiled(self, n_qubits, ops):
+        """Restituisce (disegno, circuito transpilato) dalla cache LRU, per struttura del circuito"""
+        key = (n_qubits, tuple(ops))
+        with self._transpile_lock:
+            entry = self._transpiled.get(key)
+            if entry is not None:
+                self._transpiled.move_to_end(key)
+                return entry
+        qc = qiskit.QuantumCircuit(n_qubits, n_qubits)
+        for gate, qubits in ops:
+            getattr(qc, gate)(*qubits)
+        qc.measure_all()
+        with timed_phase('quantum.transpile'):
+            entry = (str(qc.draw(output='text')), qiskit.transpile(qc, self.backend))
+        with self._transpile_lock:
+            self._transpiled[key] = entry
+            while len(self._transpiled) > TRANSPILE_CACHE_SIZE:
+                self._transpiled.popitem(last=False)
+        return entry
+    
     def _calculate_entropy(self, counts: Dict) -> float:
-        """Helper per calcolo entropia"""
-        total = sum(counts.values())
-        probs = [v/total for v in counts.values()]
-        return -sum(p * np.log2(p) for p in probs if p > 0)
+        """Helper per calcolo entropia (kernel condiviso di backend/analysis.py)"""
+        return entropy_bits(counts)
+
+
+# Alias usato da backend/app.py
+RIQACore = RIQA_Core
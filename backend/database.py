@@ -3,14 +3,32 @@ Modulo per la gestione del database per AI_RIQA.
 Supporta SQLite e PostgreSQL in base alla configurazione.
 """
 
+import ast
+import atexit
+import json
+import logging
 import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.pool
+try:
+    from .storage import json_default, pack_result, unpack_result
+except ImportError:  # Eseguito come script: python3 backend/database.py
+    from storage import json_default, pack_result, unpack_result
 
 # Configurazione del database
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite")  # Default: SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "dbname=riqa user=postgres password=secret")  # Per PostgreSQL
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "riqa.db")  # Per SQLite
+DB_POOL_MIN = int(os.getenv("RIQA_DB_POOL_MIN", "1"))  # Connessioni aperte all'avvio (PostgreSQL)
+DB_POOL_MAX = int(os.getenv("RIQA_DB_POOL_MAX", "10"))  # Connessioni in uso contemporaneamente
+DB_BATCH_SIZE = int(os.getenv("RIQA_DB_BATCH_SIZE", "200"))  # Righe per transazione del writer
+DB_FLUSH_INTERVAL = float(os.getenv("RIQA_DB_FLUSH_INTERVAL", "1.0"))  # Secondi tra due flush
+
+logger = logging.getLogger(__name__)
 
 def get_connection():
     """
@@ -23,27 +41,394 @@ def get_connection():
     else:
         raise ValueError(f"Tipo di database '{DATABASE_TYPE}' non supportato. Usa 'sqlite' o 'postgresql'.")
 
-def save_simulation(sim_type, params, result):
+class SQLitePool:
+    """
+    Una connessione per thread, in modalità WAL, riusata tra le chiamate.
+    Il semaforo limita le connessioni in uso contemporaneamente.
+    """
+    def __init__(self, path, max_size=DB_POOL_MAX):
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self.opened = 0
+        self.in_use = 0
+
+    def _open(self):
+        # check_same_thread=False solo per permettere a close() di chiuderle tutte
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connections.append(conn)
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        self._slots.acquire()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def stats(self):
+        return {"driver": "sqlite", "in_use": self.in_use, "opened": self.opened, "max_size": self.max_size}
+
+class PostgresPool:
+    """
+    Pool psycopg2 con attesa (invece di errore) quando tutte le connessioni sono in uso.
+    """
+    def __init__(self, dsn, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX):
+        self.max_size = max_size
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_size, max_size, dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            self.in_use -= 1
+        self._pool.putconn(conn)
+        self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+    def stats(self):
+        return {"driver": "postgresql", "in_use": self.in_use, "max_size": self.max_size}
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Restituisce il pool per la configurazione corrente, creandolo al primo uso.
+    """
+    global _pool, _pool_key
+    key = (DATABASE_TYPE.lower(), SQLITE_DB_PATH if DATABASE_TYPE.lower() == "sqlite" else DATABASE_URL)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                _pool.close()
+            if key[0] == "sqlite":
+                _pool = SQLitePool(SQLITE_DB_PATH)
+            elif key[0] == "postgresql":
+                _pool = PostgresPool(DATABASE_URL)
+            else:
+                raise ValueError(f"Tipo di database '{DATABASE_TYPE}' non supportato. Usa 'sqlite' o 'postgresql'.")
+            _pool_key = key
+        return _pool
+
+@contextmanager
+def connection():
+    """
+    Connessione dal pool: commit all'uscita, rollback in caso di errore.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+def _q(query):
+    """
+    Adatta i segnaposto della query ('?') al driver configurato.
+    """
+    return query if DATABASE_TYPE.lower() == "sqlite" else query.replace("?", "%s")
+
+def save_simulation(sim_type, params, result, user_id=None, session_id=None):
     """
     Salva i risultati di una simulazione nel database.
     Args:
         sim_type (str): Tipo di simulazione
         params (dict): Parametri della simulazione
         result (dict): Risultati della simulazione
+        user_id (str): Utente proprietario (opzionale)
+        session_id (str): Sessione dell'esperimento (opzionale)
+    """
+    with connection() as conn:
+        conn.cursor().execute(_q(EXPERIMENT_INSERT), _experiment_row(sim_type, params, result, user_id, session_id))
+
+# Formati di archiviazione: 1 = repr Python in TEXT (legacy), 2 = JSON + blob di array
+STORAGE_FORMAT_LEGACY = 1
+STORAGE_FORMAT_STRUCTURED = 2
+
+EXPERIMENT_INSERT = """
+    INSERT INTO experiments
+        (type, user_id, session_id, n_qubits, params_json, result_json, result_arrays, storage_format)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _blob(data):
+    if data is None or DATABASE_TYPE.lower() == "sqlite":
+        return data
+    return psycopg2.Binary(data)
+
+def _n_qubits(params):
+    """Campo caldo n_qubits, anche annidato nel messaggio della richiesta"""
+    if isinstance(params, dict):
+        for source in (params, params.get("message")):
+            if isinstance(source, dict) and isinstance(source.get("n_qubits"), int):
+                return source["n_qubits"]
+    return None
+
+def _experiment_row(sim_type, params, result, user_id=None, session_id=None):
+    result_json, arrays = pack_result(result)
+    return (
+        sim_type,
+        user_id,
+        session_id,
+        _n_qubits(params),
+        json.dumps(params, default=json_default),
+        result_json,
+        _blob(arrays),
+        STORAGE_FORMAT_STRUCTURED
+    )
+
+def _from_json(value):
+    # psycopg2 restituisce le colonne JSONB già decodificate
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+def _literal(text):
+    """Decodifica sicura dei repr Python salvati nel formato legacy"""
+    if text is None:
+        return None
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return {"raw": text}
+
+def load_experiment(experiment_id):
+    """
+    Restituisce un esperimento con parametri e risultato decodificati, oppure None.
+    Gli array del risultato sono viste NumPy in sola lettura, senza copie.
+    """
+    columns = ["id", "type", "user_id", "session_id", "n_qubits", "created_at", "storage_format",
+               "params_json", "result_json", "result_arrays", "parameters", "result"]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q(f"SELECT {', '.join(columns)} FROM experiments WHERE id = ?"), (experiment_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    record = dict(zip(columns, row))
+    if record.pop("storage_format") == STORAGE_FORMAT_STRUCTURED:
+        params = _from_json(record.pop("params_json"))
+        result = unpack_result(record.pop("result_json"), record.pop("result_arrays"))
+    else:
+        params, result = _literal(record["parameters"]), _literal(record["result"])
+        for column in ("params_json", "result_json", "result_arrays"):
+            record.pop(column)
+    record.pop("parameters")
+    record.pop("result")
+    record.update(parameters=params, result=result)
+    return record
+
+# Colonne restituite dagli elenchi: niente parametri né risultati
+EXPERIMENT_SUMMARY_COLUMNS = ["id", "type", "session_id", "n_qubits", "created_at"]
+
+def list_experiments(user_id, limit=50, after=None, sim_type=None, since=None, until=None):
+    """
+    Elenco degli esperimenti di un utente, dal più recente, con paginazione per chiave.
+    Args:
+        after (tuple): (created_at, id) dell'ultimo elemento della pagina precedente
+        since, until: intervallo [since, until) su created_at
+    Restituisce al massimo limit + 1 righe, per sapere se esiste una pagina successiva.
+    """
+    conditions, args = ["user_id = ?"], [user_id]
+    if sim_type is not None:
+        conditions.append("type = ?")
+        args.append(sim_type)
+    if since is not None:
+        conditions.append("created_at >= ?")
+        args.append(since)
+    if until is not None:
+        conditions.append("created_at < ?")
+        args.append(until)
+    if after is not None:
+        conditions.append("(created_at, id) < (?, ?)")
+        args.extend(after)
+    query = f"""
+        SELECT {', '.join(EXPERIMENT_SUMMARY_COLUMNS)} FROM experiments
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q(query), (*args, limit + 1))
+        rows = cur.fetchall()
+    return [dict(zip(EXPERIMENT_SUMMARY_COLUMNS, row)) for row in rows]
+
+def migrate_experiments(batch_size=500):
+    """
+    Converte le righe legacy (repr Python in TEXT) nel formato strutturato.
+    Restituisce il numero di righe migrate.
+    """
+    init_db()
+    migrated, last_id = 0, 0
+    while True:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                _q("""
+                    SELECT id, type, parameters, result FROM experiments
+                    WHERE (storage_format IS NULL OR storage_format = ?) AND id > ?
+                    ORDER BY id LIMIT ?
+                """),
+                (STORAGE_FORMAT_LEGACY, last_id, batch_size)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return migrated
+            updates = []
+            for row_id, sim_type, parameters, result in rows:
+                params = _literal(parameters)
+                _, _, _, n_qubits, params_json, result_json, arrays, fmt = _experiment_row(sim_type, params, _literal(result))
+                updates.append((n_qubits, params_json, result_json, arrays, fmt, row_id))
+            cur.executemany(
+                _q("""
+                    UPDATE experiments
+                    SET n_qubits = ?, params_json = ?, result_json = ?, result_arrays = ?,
+                        storage_format = ?, parameters = NULL, result = NULL
+                    WHERE id = ?
+                """),
+                updates
+            )
+        migrated += len(rows)
+        last_id = rows[-1][0]
+
+class ExperimentWriter:
+    """
+    Raggruppa gli inserimenti in transazioni executemany.
+    Il flush avviene al raggiungimento di batch_size righe, ogni flush_interval
+    secondi oppure alla chiusura. Se l'inserimento fallisce le righe tornano in
+    testa alla coda e il thread del writer riprova all'intervallo successivo.
+    """
+    def __init__(self, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.failures = 0
+
+    def add(self, sim_type, params, result, user_id=None, session_id=None):
+        row = _experiment_row(sim_type, params, result, user_id, session_id)
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="riqa-db-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self._try_flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._try_flush()
+
+    def _try_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            # Le righe restano in coda: il prossimo flush le riprova
+            logger.exception("Inserimento degli esperimenti fallito, %d righe in attesa", self.pending)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                with connection() as conn:
+                    conn.cursor().executemany(_q(EXPERIMENT_INSERT), rows)
+            except Exception:
+                with self._lock:
+                    self._rows[:0] = rows
+                    self.failures += 1
+                raise
+            self.flushed += len(rows)
+            return len(rows)
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._stop.clear()
+
+experiment_writer = ExperimentWriter()
+
+def save_simulation_buffered(sim_type, params, result, user_id=None, session_id=None):
+    """
+    Come save_simulation, ma l'inserimento viene raggruppato dal writer condiviso.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    query = "INSERT INTO experiments (type, parameters, result) VALUES (?, ?, ?)" if DATABASE_TYPE.lower() == "sqlite" else "INSERT INTO experiments (type, parameters, result) VALUES (%s, %s, %s)"
-    cur.execute(query, (sim_type, str(params), str(result)))
-    conn.commit()
-    conn.close()
+    experiment_writer.add(sim_type, params, result, user_id, session_id)
+
+def close():
+    """
+    Svuota il writer e chiude le connessioni del pool.
+    """
+    global _pool, _pool_key
+    experiment_writer.close()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool, _pool_key = None, None
+
+atexit.register(experiment_writer.close)
 
 def init_db():
     """
     Inizializza il database creando la tabella experiments se non esiste.
     """
-    conn = get_connection()
-    cur = conn.cursor()
+    with connection() as conn:
+        _create_schema(conn.cursor())
+
+def _create_schema(cur):
     if DATABASE_TYPE.lower() == "sqlite":
         cur.execute("""
             CREATE TABLE IF NOT EXISTS experiments (
@@ -64,9 +449,217 @@ def init_db():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-    conn.commit()
-    conn.close()
+    _upgrade_experiments(cur)
+    # La tabella jobs ha la stessa forma su entrambi i database
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            owner TEXT,
+            section TEXT NOT NULL,
+            parameters TEXT,
+            status TEXT NOT NULL,
+            progress REAL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+    _upgrade_jobs(cur)
+    # Chiavi utente: una per utente, univoca, con scadenza (timestamp Unix)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_keys (
+            username TEXT PRIMARY KEY,
+            user_key TEXT NOT NULL UNIQUE,
+            expiry DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# Colonne del formato strutturato: (nome, tipo SQLite, tipo PostgreSQL)
+EXPERIMENT_COLUMNS = [
+    ("user_id", "TEXT", "TEXT"),
+    ("session_id", "TEXT", "TEXT"),
+    ("n_qubits", "INTEGER", "INTEGER"),
+    ("params_json", "TEXT", "JSONB"),
+    ("result_json", "TEXT", "JSONB"),
+    ("result_arrays", "BLOB", "BYTEA"),
+    ("storage_format", f"INTEGER DEFAULT {STORAGE_FORMAT_LEGACY}", f"INTEGER DEFAULT {STORAGE_FORMAT_LEGACY}"),
+]
+
+def _upgrade_experiments(cur):
+    """
+    Aggiunge alle tabelle esistenti le colonne e gli indici del formato strutturato.
+    """
+    if DATABASE_TYPE.lower() == "sqlite":
+        cur.execute("PRAGMA table_info(experiments)")
+        existing = {row[1] for row in cur.fetchall()}
+        for name, sqlite_type, _ in EXPERIMENT_COLUMNS:
+            if name not in existing:
+                cur.execute(f"ALTER TABLE experiments ADD COLUMN {name} {sqlite_type}")
+    else:
+        for name, _, pg_type in EXPERIMENT_COLUMNS:
+            cur.execute(f"ALTER TABLE experiments ADD COLUMN IF NOT EXISTS {name} {pg_type}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_experiments_type ON experiments (type)")
+    # Indici per lo storico paginato per chiave (user_id, created_at, id), con filtro opzionale sul tipo
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_experiments_user_created ON experiments (user_id, created_at DESC, id DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_experiments_user_type_created ON experiments (user_id, type, created_at DESC, id DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_experiments_n_qubits ON experiments (n_qubits)")
+
+# Colonne del lease dei job: (nome, tipo), uguali su entrambi i database
+JOB_LEASE_COLUMNS = [
+    ("claimed_by", "TEXT"),  # Worker che esegue il job
+    ("lease_until", "DOUBLE PRECISION"),  # Scadenza del lease (timestamp Unix)
+]
+
+def _upgrade_jobs(cur):
+    """
+    Aggiunge alle tabelle jobs esistenti le colonne del lease.
+    """
+    if DATABASE_TYPE.lower() == "sqlite":
+        cur.execute("PRAGMA table_info(jobs)")
+        existing = {row[1] for row in cur.fetchall()}
+        for name, column_type in JOB_LEASE_COLUMNS:
+            if name not in existing:
+                cur.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+    else:
+        for name, column_type in JOB_LEASE_COLUMNS:
+            cur.execute(f"ALTER TABLE jobs ADD COLUMN IF NOT EXISTS {name} {column_type}")
+
+def create_job(job_id, owner, section, params):
+    """
+    Registra un nuovo job in stato 'queued'.
+    """
+    with connection() as conn:
+        conn.cursor().execute(
+            _q("INSERT INTO jobs (id, owner, section, parameters, status, progress) VALUES (?, ?, ?, ?, ?, ?)"),
+            (job_id, owner, section, json.dumps(params), "queued", 0.0)
+        )
+
+def update_job(job_id, status, progress=None, result=None, error=None, worker=None):
+    """
+    Aggiorna stato, avanzamento ed eventuale risultato di un job.
+    Con worker, l'aggiornamento vale solo se il job è ancora reclamato da quel worker;
+    restituisce True se la riga è stata aggiornata.
+    """
+    query = """
+        UPDATE jobs
+        SET status = ?, progress = COALESCE(?, progress), result = COALESCE(?, result),
+            error = COALESCE(?, error), updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """
+    values = [status, progress, None if result is None else json.dumps(result, default=json_default), error, job_id]
+    if worker is not None:
+        query += " AND claimed_by = ?"
+        values.append(worker)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q(query), values)
+        return cur.rowcount == 1
+
+def claim_job(job_id, worker, lease_seconds):
+    """
+    Reclama atomicamente un job in coda (o in esecuzione con lease scaduto) per worker.
+    Restituisce True solo al worker che lo ottiene: gli altri processi lo saltano.
+    """
+    now = time.time()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            _q("""
+                UPDATE jobs
+                SET status = 'running', claimed_by = ?, lease_until = ?, progress = 0,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND (status = 'queued'
+                    OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))
+            """),
+            (worker, now + lease_seconds, job_id, now)
+        )
+        return cur.rowcount == 1
+
+def renew_job_lease(job_id, worker, lease_seconds):
+    """
+    Prolunga il lease di un job in esecuzione; False se il job non è più di worker.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            _q("UPDATE jobs SET lease_until = ? WHERE id = ? AND claimed_by = ? AND status = 'running'"),
+            (time.time() + lease_seconds, job_id, worker)
+        )
+        return cur.rowcount == 1
+
+def get_job(job_id, with_result=False):
+    """
+    Restituisce un job come dizionario, oppure None se non esiste.
+    Il risultato viene letto solo se richiesto esplicitamente.
+    """
+    columns = ["id", "owner", "section", "status", "progress", "error", "created_at", "updated_at"]
+    if with_result:
+        columns.append("result")
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q(f"SELECT {', '.join(columns)} FROM jobs WHERE id = ?"), (job_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    job = dict(zip(columns, row))
+    if with_result and job["result"] is not None:
+        job["result"] = json.loads(job["result"])
+    return job
+
+def list_pending_jobs():
+    """
+    Restituisce (id, section, parameters) dei job da eseguire: in coda, oppure in
+    esecuzione con lease scaduto (il worker che li aveva reclamati è fermo).
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            _q("""
+                SELECT id, section, parameters FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))
+                ORDER BY created_at
+            """),
+            (time.time(),)
+        )
+        rows = cur.fetchall()
+    return [(job_id, section, json.loads(params)) for job_id, section, params in rows]
+
+def save_user_key(username, user_key, expiry):
+    """
+    Salva (o ruota) la chiave di un utente.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q("DELETE FROM user_keys WHERE username = ?"), (username,))
+        cur.execute(
+            _q("INSERT INTO user_keys (username, user_key, expiry) VALUES (?, ?, ?)"),
+            (username, user_key, expiry)
+        )
+
+def load_user_key(username):
+    """
+    Restituisce (user_key, expiry) dell'utente, oppure None.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q("SELECT user_key, expiry FROM user_keys WHERE username = ?"), (username,))
+        return cur.fetchone()
+
+def find_user_key(user_key):
+    """
+    Ricerca inversa per chiave: restituisce (username, expiry), oppure None.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_q("SELECT username, expiry FROM user_keys WHERE user_key = ?"), (user_key,))
+        return cur.fetchone()
 
 if __name__ == "__main__":
+    import sys
     init_db()
-    print(f"Database inizializzato con {DATABASE_TYPE}")
\ No newline at end of file
+    print(f"Database inizializzato con {DATABASE_TYPE}")
+    if sys.argv[1:] == ["migrate"]:
+        print(f"Esperimenti migrati al formato strutturato: {migrate_experiments()}")
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Decimazione delle serie per la visualizzazione di AI_RIQA.
+Una serie con più punti dei pixel disponibili viene ridotta a pochi punti per
+colonna di pixel senza perdere i picchi visibili nel grafico.
+"""
+
+import numpy as np
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Indici che conservano primo, ultimo, minimo e massimo di ogni bucket.
+    Il tracciato risultante è indistinguibile dall'originale a n_buckets pixel di larghezza.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n_buckets <= 0 or n <= 4 * n_buckets:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    width = int((ends - starts).max())
+    # Bucket come righe di una matrice (riempite con l'ultimo valore del bucket) per ridurre senza cicli
+    offsets = np.minimum(starts[:, None] + np.arange(width), (ends - 1)[:, None])
+    values = y[offsets]
+    candidates = np.column_stack([
+        starts,
+        offsets[np.arange(n_buckets), np.argmin(values, axis=1)],
+        offsets[np.arange(n_buckets), np.argmax(values, axis=1)],
+        ends - 1
+    ])
+    return np.unique(candidates)
+
+
+def decimate(x, y, pixels):
+    """Riduce (x, y) per un grafico largo pixels: al più 4 punti per colonna di pixel; y può avere più colonne"""
+    x, y = np.asarray(x), np.asarray(y)
+    if not pixels or len(x) <= 4 * pixels:
+        return x, y
+    if y.ndim == 1:
+        keep = minmax_indices(y, pixels)
+    else:
+        keep = np.unique(np.concatenate([minmax_indices(column, pixels) for column in y.T]))
+    return x[keep], y[keep]
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: per ogni bucket il punto che forma il triangolo
+    più grande con il punto scelto prima e la media del bucket successivo.
+    Conserva la forma della curva con esattamente n_out punti.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Medie di tutti i bucket calcolate in anticipo; l'ultimo "bucket successivo" è l'ultimo punto
+    sums_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sums_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    next_x = np.append(sums_x[1:] / counts[1:], x[-1])
+    next_y = np.append(sums_y[1:] / counts[1:], y[-1])
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
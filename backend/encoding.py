@@ -0,0 +1,117 @@
+"""
+Codifica delle risposte di AI_RIQA con negoziazione del contenuto.
+JSON resta il formato predefinito; con Accept: application/msgpack o
+application/octet-stream gli array NumPy vengono scritti direttamente dalla
+loro memoria, senza passare da .tolist() e dai float Python.
+"""
+
+import json
+import struct
+
+import numpy as np
+from fastapi import Response
+
+from .metrics import timed_phase
+from .storage import json_default, pack_result, unpack_result
+
+try:
+    import msgpack
+except ImportError:  # Dipendenza opzionale: senza msgpack si negoziano solo JSON e octet-stream
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+OCTET_STREAM = "application/octet-stream"
+_ALIASES = {"application/x-msgpack": MSGPACK}
+
+# Frame octet-stream: magic, lunghezza del documento JSON, documento, blob degli array (storage.encode_arrays)
+FRAME_MAGIC = b"RIQF"
+_FRAME = struct.Struct("<4sI")
+
+
+def supported_types():
+    return [JSON, OCTET_STREAM] + ([MSGPACK] if msgpack is not None else [])
+
+
+def negotiate(accept):
+    """Sceglie il formato dall'header Accept (con i pesi q); JSON se nessuno è supportato"""
+    if not accept:
+        return JSON
+    supported = supported_types()
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *options = [item.strip() for item in part.split(";")]
+        media_type = _ALIASES.get(media_type.lower(), media_type.lower())
+        quality = 1.0
+        for option in options:
+            if option.startswith("q="):
+                try:
+                    quality = float(option[2:])
+                except ValueError:
+                    quality = 0.0
+        candidates.append((-quality, position, media_type))
+    for negative_quality, _, media_type in sorted(candidates):
+        if negative_quality == 0:
+            break
+        if media_type in supported:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON
+    return JSON
+
+
+def _msgpack_default(value):
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        if array.dtype.byteorder == ">":
+            array = array.astype(array.dtype.newbyteorder("<"))
+        return {"__ndarray__": True, "dtype": array.dtype.str, "shape": list(array.shape), "data": array.data}
+    if isinstance(value, np.generic):
+        return value.item()
+    return json_default(value)
+
+
+def _msgpack_hook(value):
+    if value.get("__ndarray__") is True:
+        return np.frombuffer(value["data"], dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+    return value
+
+
+def encode(content, media_type=JSON):
+    """Serializza content nel formato indicato"""
+    if media_type == MSGPACK:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+    if media_type == OCTET_STREAM:
+        # Buffer grezzi non compressi: la compressione costerebbe più della copia
+        doc, blob = pack_result(content, compress=False)
+        doc = doc.encode("utf-8")
+        return b"".join([_FRAME.pack(FRAME_MAGIC, len(doc)), doc, blob or b""])
+    return json.dumps(content, default=json_default).encode("utf-8")
+
+
+def decode(data, media_type=JSON):
+    """Operazione inversa di encode: gli array tornano come ndarray"""
+    if media_type == MSGPACK:
+        return msgpack.unpackb(data, object_hook=_msgpack_hook, raw=False)
+    if media_type == OCTET_STREAM:
+        data = memoryview(data)
+        magic, doc_length = _FRAME.unpack_from(data)
+        if magic != FRAME_MAGIC:
+            raise ValueError("Frame octet-stream non riconosciuto")
+        start = _FRAME.size
+        blob = data[start + doc_length:]
+        return unpack_result(bytes(data[start:start + doc_length]), blob if len(blob) else None)
+    return json.loads(data)
+
+
+def encoded_response(content, accept=None, status_code=200):
+    """Risposta nel formato negoziato; Vary: Accept per le cache intermedie"""
+    media_type = negotiate(accept)
+    with timed_phase(f"encode.{media_type.split('/')[-1]}"):
+        body = encode(content, media_type)
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type=media_type,
+        headers={"Vary": "Accept"}
+    )
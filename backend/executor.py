@@ -0,0 +1,169 @@
+"""
+Executor per il lavoro di calcolo pesante di AI_RIQA.
+Le simulazioni (Qiskit, solve_ivp, ...) girano in un pool di processi limitato,
+così il loop asyncio di uvicorn gestisce solo l'I/O.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cache import result_cache
+from .metrics import registry as metrics_registry
+
+# Configurazione dell'executor
+EXECUTOR_MODE = os.getenv("RIQA_EXECUTOR_MODE", "process")  # "process" oppure "thread"
+EXECUTOR_WORKERS = int(os.getenv("RIQA_EXECUTOR_WORKERS", str(os.cpu_count() or 1)))
+EXECUTOR_MAX_QUEUE = int(os.getenv("RIQA_EXECUTOR_MAX_QUEUE", "32"))  # Job in attesa oltre ai worker
+EXECUTOR_TIMEOUT = float(os.getenv("RIQA_EXECUTOR_TIMEOUT", "60"))  # Secondi per job
+EXECUTOR_START_METHOD = os.getenv("RIQA_EXECUTOR_START_METHOD", "spawn")
+EXECUTOR_WARMUP = os.getenv("RIQA_WARMUP", "1") == "1"  # Pre-carica backend e circuiti nei worker
+
+
+class ExecutorSaturated(Exception):
+    """Sollevata quando la coda dell'executor è piena"""
+
+
+class JobTimeout(Exception):
+    """Sollevata quando un job supera il timeout configurato"""
+
+
+# Istanza di RIQA_Core propria di ogni processo worker
+_worker_core = None
+
+
+def _init_worker():
+    global _worker_core
+    from .core import RIQA_Core
+    _worker_core = RIQA_Core()
+    if EXECUTOR_WARMUP:
+        _worker_core.warm_up()
+
+
+def _ping_worker():
+    """Job vuoto: forza l'avvio (e quindi il warm-up) di un worker"""
+    if _worker_core is None:
+        _init_worker()
+    return os.getpid()
+
+
+def _run_core_job(section, params):
+    """
+    Esegue una simulazione con il core del processo worker.
+    Restituisce anche i contatori della cache e le metriche, che vivono nel worker.
+    """
+    if _worker_core is None:
+        _init_worker()
+    result = _worker_core.run_simulation(section, params)
+    return result, result_cache.drain_counters(), metrics_registry.drain()
+
+
+def _run_quantum_shots(params, shots):
+    """Un lotto di shot non in cache: ogni lotto dello streaming è un campionamento indipendente"""
+    if _worker_core is None:
+        _init_worker()
+    result = _worker_core.sample_quantum_entanglement(dict(params, shots=shots))
+    return {'counts': result['counts'], 'shots': shots}, metrics_registry.drain()
+
+
+class SimulationExecutor:
+    def __init__(self, mode=None, max_workers=None, max_queue=None, timeout=None):
+        self.mode = mode or EXECUTOR_MODE
+        self.max_workers = max_workers or EXECUTOR_WORKERS
+        self.max_queue = EXECUTOR_MAX_QUEUE if max_queue is None else max_queue
+        self.timeout = timeout or EXECUTOR_TIMEOUT
+        self._pool = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        """Numero massimo di job accettati (in esecuzione + in coda)"""
+        return self.max_workers + self.max_queue
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.mode == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(EXECUTOR_START_METHOD),
+                initializer=_init_worker
+            )
+        elif self.mode == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="riqa-sim"
+            )
+        else:
+            raise ValueError(f"Modalità executor '{self.mode}' non supportata. Usa 'process' o 'thread'.")
+
+    async def warm_up(self):
+        """
+        Avvia tutti i worker in anticipo, così il primo utente non paga l'avvio a freddo.
+        I ping passano dall'ammissione dei job (submit): occupano uno slot come gli altri
+        e, a pool già pieno di lavoro vero, non vengono accodati.
+        """
+        futures = []
+        for _ in range(self.max_workers):
+            try:
+                futures.append(asyncio.wrap_future(self.submit(_ping_worker)))
+            except ExecutorSaturated:
+                break
+        return await asyncio.gather(*futures)
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, _future):
+        with self._lock:
+            self._inflight -= 1
+
+    def submit(self, fn, *args):
+        """Accoda un job rispettando il limite di profondità della coda"""
+        if self._pool is None:
+            self.start()
+        with self._lock:
+            if self._inflight >= self.capacity:
+                raise ExecutorSaturated(
+                    f"Executor saturo: {self._inflight} job attivi su {self.capacity}"
+                )
+            self._inflight += 1
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        # Lo slot si libera solo quando il job termina davvero
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, timeout=None):
+        """Esegue fn nel pool e ne attende il risultato senza bloccare il loop"""
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Un job già in esecuzione non può essere interrotto: viene abbandonato
+            # e continua a occupare il suo slot fino al termine
+            raise JobTimeout(f"Job oltre il timeout di {timeout or self.timeout}s")
+
+    async def run_quantum_shots(self, params, shots, timeout=None):
+        """Conteggi di un lotto di shot del circuito di params, campionati nel worker"""
+        result, metrics = await self.run(_run_quantum_shots, params, shots, timeout=timeout)
+        metrics_registry.merge(metrics)
+        return result
+
+    async def run_simulation(self, section, params, timeout=None):
+        result, cache_counters, metrics = await self.run(_run_core_job, section, params, timeout=timeout)
+        result_cache.merge_counters(cache_counters)
+        metrics_registry.merge(metrics)
+        return result
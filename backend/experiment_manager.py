@@ -1,11 +1,26 @@
+import base64
+import json
 import uuid
 from datetime import datetime
-from .database import RIQA_DB
+from . import database
+
+HISTORY_MAX_LIMIT = 200
+
+class InvalidCursor(ValueError):
+    """Sollevata quando il cursore di paginazione non è valido"""
+
+def encode_cursor(created_at, experiment_id):
+    raw = json.dumps([str(created_at), experiment_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        created_at, experiment_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(created_at), int(experiment_id)
+    except Exception:
+        raise InvalidCursor(cursor)
 
 class ExperimentManager:
-    def __init__(self):
-        self.db = RIQA_DB()
-    
     def create_experiment(self, user_id, experiment_type):
         session_id = str(uuid.uuid4())
         return {
@@ -14,23 +29,38 @@ class ExperimentManager:
             'type': experiment_type,
             'created_at': datetime.now().isoformat()
         }
-    
+
     def save_results(self, session_id, params, results):
-        self.db.save_simulation(
+        """Inserimento raggruppato dal writer condiviso: visibile nello storico dopo il flush"""
+        database.save_simulation_buffered(
+            results.get('type'),
+            params,
+            results,
             user_id=results.get('user_id'),
-            session_id=session_id,
-            sim_type=results.get('type'),
-            params=params,
-            results=results
+            session_id=session_id
+        )
+
+    def get_experiment_history(self, user_id, limit=50, cursor=None, sim_type=None, since=None, until=None):
+        """Pagina dello storico, senza risultati; next_cursor è None sull'ultima pagina"""
+        limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+        rows = database.list_experiments(
+            user_id,
+            limit=limit,
+            after=decode_cursor(cursor) if cursor else None,
+            sim_type=sim_type,
+            since=since,
+            until=until
         )
-    
-    def get_experiment_history(self, user_id):
-        with self.db._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM simulations 
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT 50
-            ''', (user_id,))
-            return cursor.fetchall()
+        items = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def get_experiment_result(self, user_id, experiment_id):
+        """Caricamento su richiesta del risultato completo di un esperimento"""
+        record = database.load_experiment(experiment_id)
+        if record is None or record['user_id'] != user_id:
+            return None
+        return record
@@ -0,0 +1,157 @@
+"""
+Sottosistema dei job asincroni di AI_RIQA.
+Un job viene registrato nel database, accodato in memoria ed eseguito
+nel pool dell'executor tramite il dispatch per sezione di RIQA_Core.
+Il client interroga lo stato invece di tenere aperta la connessione.
+Prima di eseguire un job il processo lo reclama nel database con un lease
+rinnovato durante l'esecuzione: con più processi worker ogni job gira una
+volta sola, e un job resta a un processo fermo solo finché il lease scade.
+"""
+
+import asyncio
+import os
+import socket
+from uuid import uuid4
+
+import numpy as np
+
+from . import database
+from .executor import ExecutorSaturated
+
+JOB_DISPATCHERS = int(os.getenv("RIQA_JOB_DISPATCHERS", "0"))  # 0 = uno per worker dell'executor
+JOB_RETRY_DELAY = float(os.getenv("RIQA_JOB_RETRY_DELAY", "0.5"))  # Attesa se l'executor è saturo
+JOB_LEASE_SECONDS = float(os.getenv("RIQA_JOB_LEASE_SECONDS", "60"))  # Rinnovato ogni terzo di lease
+JOB_SWEEP_CHUNK = int(os.getenv("RIQA_JOB_SWEEP_CHUNK", "64"))  # Righe di sweep per blocco (avanzamento)
+
+
+class JobNotFound(Exception):
+    """Sollevata quando un job non esiste o non appartiene all'utente"""
+
+
+class JobManager:
+    def __init__(self, executor, dispatchers=None):
+        self.executor = executor
+        self.dispatchers = dispatchers or JOB_DISPATCHERS or executor.max_workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._queue = None
+        self._tasks = []
+        self._known = set()  # Job già nella coda di questo processo
+
+    async def start(self):
+        """Avvia i dispatcher e il controllo periodico dei job in sospeso o con lease scaduto"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        await asyncio.to_thread(database.init_db)
+        await self._requeue_pending()
+        self._tasks = [
+            asyncio.create_task(self._dispatch()) for _ in range(self.dispatchers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, section, params, owner=None):
+        """Registra un job e restituisce subito il suo id"""
+        job_id = uuid4().hex
+        await asyncio.to_thread(database.create_job, job_id, owner, section, params)
+        self._enqueue(job_id, section, params)
+        return job_id
+
+    async def status(self, job_id, owner=None):
+        job = await asyncio.to_thread(database.get_job, job_id)
+        if job is None or (owner is not None and job["owner"] != owner):
+            raise JobNotFound(job_id)
+        return job
+
+    async def result(self, job_id, owner=None):
+        job = await asyncio.to_thread(database.get_job, job_id, True)
+        if job is None or (owner is not None and job["owner"] != owner):
+            raise JobNotFound(job_id)
+        return job
+
+    @property
+    def queued(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _enqueue(self, job_id, section, params):
+        if job_id not in self._known:
+            self._known.add(job_id)
+            self._queue.put_nowait((job_id, section, params))
+
+    async def _requeue_pending(self):
+        for job_id, section, params in await asyncio.to_thread(database.list_pending_jobs):
+            self._enqueue(job_id, section, params)
+
+    async def _reaper(self):
+        """Riprende i job di processi fermi quando il loro lease scade"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+            await self._requeue_pending()
+
+    async def _dispatch(self):
+        while True:
+            job_id, section, params = await self._queue.get()
+            try:
+                await self._run(job_id, section, params)
+            finally:
+                self._known.discard(job_id)
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await asyncio.to_thread(database.renew_job_lease, job_id, self.worker_id, JOB_LEASE_SECONDS)
+
+    async def _run(self, job_id, section, params):
+        claimed = await asyncio.to_thread(database.claim_job, job_id, self.worker_id, JOB_LEASE_SECONDS)
+        if not claimed:
+            # Già reclamato da un altro processo (o completato nel frattempo)
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            try:
+                result = await self._execute(job_id, section, params)
+            except Exception as e:
+                await self._finish(job_id, "failed", None, str(e))
+                return
+            if isinstance(result, dict) and result.get("status") == "error":
+                await self._finish(job_id, "failed", None, str(result.get("result")))
+            else:
+                await self._finish(job_id, "completed", result)
+        finally:
+            heartbeat.cancel()
+
+    async def _finish(self, job_id, status, result=None, error=None):
+        await asyncio.to_thread(database.update_job, job_id, status, 1.0, result, error, self.worker_id)
+
+    async def _simulate(self, section, params):
+        while True:
+            try:
+                return await self.executor.run_simulation(section, params)
+            except ExecutorSaturated:
+                # Il pool è condiviso con /simulate: si riprova senza perdere il job
+                await asyncio.sleep(JOB_RETRY_DELAY)
+
+    async def _execute(self, job_id, section, params):
+        """
+        Esegue il job; gli sweep lunghi dell'oscillatore girano a blocchi di
+        JOB_SWEEP_CHUNK righe, aggiornando l'avanzamento dopo ogni blocco.
+        """
+        message = params.get('message', params) if isinstance(params, dict) else params
+        sweep = message.get('sweep') if section == 'oscillator' and isinstance(message, dict) else None
+        if not sweep or len(sweep) <= JOB_SWEEP_CHUNK:
+            return await self._simulate(section, params)
+        parts = []
+        for start in range(0, len(sweep), JOB_SWEEP_CHUNK):
+            response = await self._simulate(section, dict(message, sweep=sweep[start:start + JOB_SWEEP_CHUNK]))
+            if response.get("status") == "error":
+                return response
+            parts.append(response["result"])
+            progress = min(1.0, (start + JOB_SWEEP_CHUNK) / len(sweep))
+            await asyncio.to_thread(database.update_job, job_id, "running", progress, None, None, self.worker_id)
+        return {"status": "success", "result": {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}}
@@ -0,0 +1,339 @@
+"""
+Motore di espressioni della sezione math di AI_RIQA.
+Un'espressione viene analizzata una sola volta in un AST ristretto (solo
+operatori, funzioni e costanti in whitelist) e compilata in una funzione che
+chiama direttamente le ufunc NumPy: la stessa funzione valuta uno scalare o una
+griglia di milioni di punti in un'unica chiamata vettoriale. Le funzioni
+compilate restano in cache per testo normalizzato.
+
+Semantica numerica: quella di NumPy in float64, anche per letterali e variabili
+intere (1/0 -> inf, log(-1) -> nan, nessun overflow silenzioso degli int64);
+'^' è la potenza, come nella notazione matematica, non lo XOR di Python.
+"""
+
+import ast
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Configurazione del motore
+MATH_CACHE_SIZE = int(os.getenv("RIQA_MATH_CACHE_SIZE", "256"))  # Espressioni compilate in memoria
+MATH_MAX_LENGTH = int(os.getenv("RIQA_MATH_MAX_LENGTH", "2000"))  # Caratteri per espressione
+MATH_MAX_NODES = int(os.getenv("RIQA_MATH_MAX_NODES", "500"))  # Nodi dell'AST per espressione
+MATH_MAX_POINTS = int(os.getenv("RIQA_MATH_MAX_POINTS", str(10 ** 7)))  # Elementi di una griglia o di un risultato
+
+
+class MathEngineError(ValueError):
+    """Espressione non valida o con costrutti non ammessi"""
+
+
+def _power(base, exponent):
+    # Le potenze intere passano in virgola mobile: niente overflow silenziosi né errori per esponenti negativi
+    return np.float_power(base, exponent)
+
+
+def _square(base):
+    return np.square(base, dtype=np.float64)
+
+
+def _cube(base):
+    return np.multiply(np.square(base, dtype=np.float64), base)
+
+
+def _sqrt(base):
+    return np.sqrt(base, dtype=np.float64)
+
+
+def _reciprocal(base):
+    return np.true_divide(1.0, base)
+
+
+# Esponenti costanti frequenti: kernel dedicati invece della potenza generica (x^2 con square è ~30x più veloce)
+_POWER_SPECIALIZATIONS = {2: _square, 3: _cube, 0.5: _sqrt, -1: _reciprocal}
+
+
+# Funzioni ammesse: nome -> (callable, numero di argomenti)
+FUNCTIONS = {
+    'sin': (np.sin, 1), 'cos': (np.cos, 1), 'tan': (np.tan, 1),
+    'arcsin': (np.arcsin, 1), 'arccos': (np.arccos, 1), 'arctan': (np.arctan, 1), 'arctan2': (np.arctan2, 2),
+    'sinh': (np.sinh, 1), 'cosh': (np.cosh, 1), 'tanh': (np.tanh, 1),
+    'arcsinh': (np.arcsinh, 1), 'arccosh': (np.arccosh, 1), 'arctanh': (np.arctanh, 1),
+    'exp': (np.exp, 1), 'expm1': (np.expm1, 1),
+    'log': (np.log, 1), 'log10': (np.log10, 1), 'log2': (np.log2, 1), 'log1p': (np.log1p, 1),
+    'sqrt': (np.sqrt, 1), 'cbrt': (np.cbrt, 1), 'abs': (np.absolute, 1), 'sign': (np.sign, 1),
+    'floor': (np.floor, 1), 'ceil': (np.ceil, 1), 'round': (np.rint, 1),
+    'degrees': (np.degrees, 1), 'radians': (np.radians, 1),
+    'hypot': (np.hypot, 2), 'min': (np.minimum, 2), 'max': (np.maximum, 2), 'pow': (_power, 2),
+    'where': (np.where, 3), 'clip': (np.clip, 3),
+}
+ALIASES = {'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan', 'atan2': 'arctan2', 'ln': 'log'}
+CONSTANTS = {'pi': np.pi, 'e': np.e, 'tau': 2 * np.pi}
+
+_BINARY = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide, ast.Mod: np.mod,
+    ast.Pow: _power,
+}
+_UNARY = {ast.UAdd: np.positive, ast.USub: np.negative, ast.Not: np.logical_not}
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_BOOL = {ast.And: np.logical_and, ast.Or: np.logical_or}
+
+# Namespace della funzione compilata: solo le operazioni in whitelist, nessun builtin
+_NAMESPACE = {'__builtins__': {}}
+_SYMBOLS = {}
+
+
+def _symbol(fn):
+    """Nome interno (non scrivibile dall'utente, inizia con '_') con cui il codice compilato chiama fn"""
+    key = id(fn)
+    if key not in _SYMBOLS:
+        _SYMBOLS[key] = f"_f{len(_SYMBOLS)}"
+        _NAMESPACE[_SYMBOLS[key]] = fn
+    return _SYMBOLS[key]
+
+
+# Simboli registrati all'import: la compilazione concorrente legge soltanto il namespace
+for _fn in [fn for fn, _ in FUNCTIONS.values()] + [*_BINARY.values(), *_UNARY.values(), *_COMPARE.values(),
+                                                  *_BOOL.values(), *_POWER_SPECIALIZATIONS.values()]:
+    _symbol(_fn)
+del _fn
+
+
+def _call(fn, *args):
+    return ast.Call(func=ast.Name(id=_symbol(fn), ctx=ast.Load()), args=list(args), keywords=[])
+
+
+class _Compiler(ast.NodeTransformer):
+    """Riscrive l'AST ristretto in chiamate alle ufunc; qualunque altro nodo è un errore"""
+
+    def __init__(self):
+        self.variables = set()
+
+    def generic_visit(self, node):
+        raise MathEngineError(f"Costrutto non ammesso: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        return self.visit(node.body)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise MathEngineError(f"Costante non ammessa: {node.value!r}")
+        try:
+            # Gli interi restano esatti fino a 2**53 e poi perdono precisione invece di traboccare in int64
+            return ast.Constant(value=float(node.value))
+        except OverflowError:
+            raise MathEngineError(f"Costante fuori dall'intervallo float64: {node.value}") from None
+
+    def visit_Name(self, node):
+        if node.id in CONSTANTS:
+            return ast.Constant(value=float(CONSTANTS[node.id]))
+        if node.id.startswith('_') or node.id in FUNCTIONS or node.id in ALIASES:
+            raise MathEngineError(f"Nome non ammesso come variabile: {node.id}")
+        self.variables.add(node.id)
+        return ast.Name(id=node.id, ctx=ast.Load())
+
+    def visit_BinOp(self, node):
+        if isinstance(node.op, ast.Pow) and isinstance(node.right, ast.Constant):
+            special = _POWER_SPECIALIZATIONS.get(node.right.value)
+            if special is not None and not isinstance(node.right.value, bool):
+                return _call(special, self.visit(node.left))
+        fn = _BINARY.get(type(node.op))
+        if fn is None:
+            raise MathEngineError(f"Operatore non ammesso: {type(node.op).__name__}")
+        return _call(fn, self.visit(node.left), self.visit(node.right))
+
+    def visit_UnaryOp(self, node):
+        fn = _UNARY.get(type(node.op))
+        if fn is None:
+            raise MathEngineError(f"Operatore non ammesso: {type(node.op).__name__}")
+        return _call(fn, self.visit(node.operand))
+
+    def visit_BoolOp(self, node):
+        fn = _BOOL[type(node.op)]
+        result = self.visit(node.values[0])
+        for value in node.values[1:]:
+            result = _call(fn, result, self.visit(value))
+        return result
+
+    def visit_Compare(self, node):
+        # a < b < c diventa (a < b) & (b < c)
+        operands = [self.visit(node.left)] + [self.visit(c) for c in node.comparators]
+        parts = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            fn = _COMPARE.get(type(op))
+            if fn is None:
+                raise MathEngineError(f"Confronto non ammesso: {type(op).__name__}")
+            parts.append(_call(fn, left, right))
+        result = parts[0]
+        for part in parts[1:]:
+            result = _call(np.logical_and, result, part)
+        return result
+
+    def visit_IfExp(self, node):
+        return _call(np.where, self.visit(node.test), self.visit(node.body), self.visit(node.orelse))
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise MathEngineError("Sono ammesse solo chiamate a funzioni in whitelist con argomenti posizionali")
+        name = ALIASES.get(node.func.id, node.func.id)
+        if name not in FUNCTIONS:
+            raise MathEngineError(f"Funzione non ammessa: {node.func.id}")
+        fn, arity = FUNCTIONS[name]
+        if len(node.args) != arity or any(isinstance(a, ast.Starred) for a in node.args):
+            raise MathEngineError(f"{node.func.id} richiede {arity} argomenti")
+        return _call(fn, *(self.visit(a) for a in node.args))
+
+
+class CompiledExpression:
+    """Espressione compilata: le variabili sono argomenti per nome, scalari o array (con broadcasting)"""
+
+    def __init__(self, expression, variables, fn):
+        self.expression = expression
+        self.variables = variables
+        self._fn = fn
+
+    def __call__(self, **values):
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise MathEngineError(f"Valori mancanti per le variabili: {', '.join(missing)}")
+        operands = [_as_operand(values[name]) for name in self.variables]
+        # Le operazioni sono elemento per elemento: nessun intermedio supera la forma del risultato
+        try:
+            shape = np.broadcast_shapes(*(np.shape(operand) for operand in operands))
+        except ValueError:
+            raise MathEngineError("Forme delle variabili non compatibili") from None
+        if math.prod(shape) > MATH_MAX_POINTS:
+            raise MathEngineError(f"Risultato di {math.prod(shape)} elementi oltre il limite di {MATH_MAX_POINTS}")
+        with np.errstate(all='ignore'):
+            result = self._fn(*operands)
+        if isinstance(result, np.ndarray) and result.ndim == 0 or isinstance(result, np.generic):
+            return result.item()
+        return result
+
+    def __repr__(self):
+        return f"CompiledExpression({self.expression!r}, variables={self.variables})"
+
+
+def _as_operand(value):
+    if isinstance(value, float) or isinstance(value, (np.ndarray, np.generic)) and value.dtype.kind in 'fc':
+        return value
+    return np.asarray(value, dtype=np.float64)
+
+
+def _parse(text):
+    if not isinstance(text, str):
+        raise MathEngineError("L'espressione deve essere una stringa")
+    if len(text) > MATH_MAX_LENGTH:
+        raise MathEngineError(f"Espressione oltre {MATH_MAX_LENGTH} caratteri")
+    try:
+        # '^' è la potenza: sostituito prima del parsing, così ha anche la precedenza di '**' (2^3+1 = 9)
+        tree = ast.parse(text.strip().replace('^', '**'), mode='eval')
+    except (SyntaxError, RecursionError) as e:
+        raise MathEngineError(f"Espressione non valida: {text}") from e
+    if sum(1 for _ in ast.walk(tree)) > MATH_MAX_NODES:
+        raise MathEngineError(f"Espressione oltre {MATH_MAX_NODES} nodi")
+    return tree
+
+
+def _compile(tree):
+    compiler = _Compiler()
+    body = compiler.visit(tree)
+    variables = tuple(sorted(compiler.variables))
+    arguments = ast.arguments(
+        posonlyargs=[], args=[ast.arg(arg=name) for name in variables], vararg=None,
+        kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]
+    )
+    code = compile(ast.fix_missing_locations(ast.Expression(body=ast.Lambda(args=arguments, body=body))),
+                   '<riqa-math>', 'eval')
+    return variables, eval(code, _NAMESPACE)
+
+
+class ExpressionCache:
+    """LRU delle espressioni compilate, per testo grezzo e per testo normalizzato (ast.unparse)"""
+
+    def __init__(self, max_size=None):
+        self.max_size = MATH_CACHE_SIZE if max_size is None else max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return compiled
+
+    def _put(self, keys, compiled):
+        with self._lock:
+            for key in keys:
+                self._entries[key] = compiled
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def compile(self, text):
+        compiled = self._get(text) if isinstance(text, str) else None
+        if compiled is not None:
+            return compiled
+        tree = _parse(text)
+        normalized = ast.unparse(tree)
+        compiled = self._get(normalized)
+        if compiled is None:
+            with self._lock:
+                self.misses += 1
+            variables, fn = _compile(tree)
+            compiled = CompiledExpression(normalized, variables, fn)
+        self._put({text, normalized}, compiled)
+        return compiled
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'max_size': self.max_size}
+
+
+expression_cache = ExpressionCache()
+
+
+def compile_expression(text):
+    """Espressione compilata (dalla cache se già vista)"""
+    return expression_cache.compile(text)
+
+
+def evaluate(text, variables=None):
+    """Valuta l'espressione; le variabili possono essere scalari o array NumPy di qualunque forma compatibile"""
+    return compile_expression(text)(**(variables or {}))
+
+
+def axis_values(spec):
+    """Valori di una variabile: scalare, lista, oppure {'start', 'stop', 'num'} (np.linspace)"""
+    if isinstance(spec, dict):
+        num = int(spec.get('num', 100))
+        if num > MATH_MAX_POINTS:
+            raise MathEngineError(f"Al massimo {MATH_MAX_POINTS} punti per asse")
+        return np.linspace(float(spec['start']), float(spec['stop']), num)
+    if isinstance(spec, (list, tuple)):
+        return np.asarray(spec, dtype=np.float64)
+    return spec
+
+
+def evaluate_grid(text, axes):
+    """
+    Valuta l'espressione sul prodotto cartesiano degli assi ({nome: valori}), un asse per dimensione
+    nell'ordine del dict. Gli assi restano unidimensionali (meshgrid sparsa): la memoria è quella del risultato.
+    """
+    values = [axis_values(spec) for spec in axes.values()]
+    points = int(np.prod([np.size(v) for v in values]))
+    if points > MATH_MAX_POINTS:
+        raise MathEngineError(f"Griglia di {points} punti oltre il limite di {MATH_MAX_POINTS}")
+    grids = np.meshgrid(*values, indexing='ij', sparse=True)
+    return evaluate(text, dict(zip(axes, grids)))
@@ -0,0 +1,261 @@
+"""
+Metriche e profilazione di AI_RIQA.
+Contatori e istogrammi in memoria esposti su /metrics nel formato testuale di
+Prometheus, senza dipendenze esterne. Come per i contatori della cache, le
+osservazioni fatte nei worker dell'executor vengono raccolte (drain) e unite
+(merge) nel processo principale.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Configurazione del profiler a campionamento
+PROFILE_MODE = os.getenv("RIQA_PROFILE_MODE", "off")  # "off", "header" (X-RIQA-Profile: 1) oppure "always"
+PROFILE_SLOW_MS = float(os.getenv("RIQA_PROFILE_SLOW_MS", "500"))  # Profili salvati solo oltre questa durata
+PROFILE_INTERVAL_MS = float(os.getenv("RIQA_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("RIQA_PROFILE_DIR", "profiles")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._pending = _Tally()
+        self._collected = _Tally()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._pending[key] += amount
+
+    def drain(self):
+        with self._lock:
+            pending = dict(self._pending)
+            self._pending.clear()
+        return pending
+
+    def merge(self, state):
+        with self._lock:
+            self._collected.update(state)
+
+    def samples(self):
+        with self._lock:
+            totals = self._collected + self._pending
+        for key, value in sorted(totals.items()):
+            yield self.name + "_total", _label_text(self.labels, key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._pending = {}  # etichette -> [conteggi per bucket, somma, conteggio]
+        self._collected = {}
+        self._lock = threading.Lock()
+
+    def _add(self, table, key, counts, total, count):
+        entry = table.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total
+        entry[2] += count
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._pending.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def merge(self, state):
+        with self._lock:
+            for key, (counts, total, count) in state.items():
+                self._add(self._collected, tuple(key), counts, total, count)
+
+    def samples(self):
+        with self._lock:
+            merged = {}
+            for table in (self._collected, self._pending):
+                for key, (counts, total, count) in table.items():
+                    self._add(merged, key, counts, total, count)
+        for key in sorted(merged):
+            counts, total, count = merged[key]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield (self.name + "_bucket",
+                       _label_text(self.labels + ("le",), key + (_format(bound),)), cumulative)
+            yield self.name + "_sum", _label_text(self.labels, key), total
+            yield self.name + "_count", _label_text(self.labels, key), count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def gauge_collector(self, collect):
+        """
+        Registra una funzione che restituisce [(nome, aiuto, {etichette}, valore), ...]
+        letta a ogni scrape (profondità della coda, stato della cache, pool DB, ...).
+        """
+        self._collectors.append(collect)
+        return collect
+
+    def drain(self):
+        """Osservazioni non ancora raccolte, per nome di metrica (usato dai worker dell'executor)"""
+        return {name: metric.drain() for name, metric in self._metrics.items()}
+
+    def merge(self, state):
+        for name, metric_state in state.items():
+            metric = self._metrics.get(name)
+            if metric is not None and metric_state:
+                metric.merge(metric_state)
+
+    def render(self):
+        """Formato testuale di esposizione Prometheus (versione 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format(value)}" for name, labels, value in metric.samples())
+        gauges = {}
+        for collect in self._collectors:
+            try:
+                for name, help_text, labels, value in collect():
+                    gauges.setdefault(name, (help_text, []))[1].append((labels, value))
+            except Exception:
+                # Un sottosistema non disponibile non deve rompere lo scrape
+                continue
+        for name, (help_text, values) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                lines.append(f"{name}{_label_text(tuple(labels), tuple(labels.values()))} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "riqa_http_request_duration_seconds", "Durata delle richieste HTTP", ("method", "route", "status")
+)
+section_duration = registry.histogram(
+    "riqa_section_duration_seconds", "Durata del dispatch di RIQA_Core per sezione", ("section", "status")
+)
+phase_duration = registry.histogram(
+    "riqa_phase_duration_seconds", "Durata delle fasi interne (transpile, esecuzione, solve_ivp, codifica, auth)",
+    ("phase",)
+)
+profiles_written = registry.counter("riqa_profiles", "Profili di richieste lente salvati su disco")
+
+
+def timed_phase(phase):
+    """Context manager per una fase interna: with timed_phase('quantum.transpile'): ..."""
+    return phase_duration.time(phase=phase)
+
+
+class SamplingProfiler:
+    """
+    Campiona periodicamente lo stack di un thread (sys._current_frames) e conta gli
+    stack identici; il risultato è in formato "collapsed" (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, thread_id=None, interval_ms=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = (interval_ms or PROFILE_INTERVAL_MS) / 1000
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="riqa-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def dump(self, name):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.collapsed")
+        with open(path, "w") as f:
+            f.write(self.collapsed() + "\n")
+        profiles_written.inc()
+        return path
+
+
+def profiling_requested(headers):
+    if PROFILE_MODE == "always":
+        return True
+    return PROFILE_MODE == "header" and headers.get("x-riqa-profile") == "1"
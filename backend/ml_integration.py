@@ -1,14 +1,93 @@
-from transformers import pipeline
 from typing import Dict, Any
+import os
 import warnings
 
+from .batching import MicroBatcher
+from .model_registry import ModelRegistry
+from .subsystems import transformers
+
+QUANTUM_OPT_MODEL = os.getenv("RIQA_QUANTUM_OPT_MODEL", "mistralai/Mixtral-8x7B-Instruct-v0.1")
+MATH_SOLVER_MODEL = os.getenv("RIQA_MATH_SOLVER_MODEL", "google/flan-t5-large")
+
+def _pipeline_factory(task, model):
+    def load():
+        # transformers viene importato solo al primo caricamento effettivo
+        pipeline = transformers.pipeline(task, model=model)
+        tokenizer = getattr(pipeline, 'tokenizer', None)
+        if task == 'text-generation' and tokenizer is not None and tokenizer.pad_token is None:
+            # I tokenizer dei modelli decoder-only (Mixtral) non hanno pad_token e senza
+            # non si può fare batching; il padding va a sinistra per la generazione
+            tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = 'left'
+        return pipeline
+    return load
+
+def _batch_size(pipeline, n_prompts):
+    """Batch pieno solo se il tokenizer sa fare padding, altrimenti un prompt alla volta"""
+    tokenizer = getattr(pipeline, 'tokenizer', None)
+    if tokenizer is not None and tokenizer.pad_token_id is None:
+        return 1
+    return n_prompts
+
+# Registro condiviso da tutte le richieste del processo (dimensioni indicative in MB)
+model_registry = ModelRegistry()
+model_registry.register('quantum_opt', _pipeline_factory('text-generation', QUANTUM_OPT_MODEL), size_mb=94000)
+model_registry.register('math_solver', _pipeline_factory('text2text-generation', MATH_SOLVER_MODEL), size_mb=3000)
+
+class _LazyModels:
+    """Accesso per nome ai modelli del registro, caricati al primo uso"""
+    def __init__(self, registry):
+        self.registry = registry
+
+    def __getitem__(self, name):
+        return self.registry.get(name)
+
+def _first_text(output):
+    """Le pipeline restituiscono un dict o una lista di dict per ogni input"""
+    if isinstance(output, list):
+        output = output[0]
+    return output['generated_text']
+
 class AIModelHub:
-    def __init__(self):
-        self.models = {
-            'quantum_opt': pipeline('text-generation', model='mistralai/Mixtral-8x7B-Instruct-v0.1'),
-            'math_solver': pipeline('text2text-generation', model='google/flan-t5-large')
-        }
-    
+    # Parametri di generazione per modello, condivisi da chiamate singole e batch
+    GENERATION_KWARGS = {'quantum_opt': {'max_length': 500}, 'math_solver': {}}
+
+    def __init__(self, registry=None, batch_config=None):
+        """
+        Args:
+            batch_config (dict): per modello, {'max_batch_size': M, 'max_wait_ms': N}
+        """
+        self.registry = registry or model_registry
+        self.models = _LazyModels(self.registry)
+        self.batch_config = batch_config or {}
+        self._batchers = {}
+
+    def _batcher(self, name):
+        if name not in self._batchers:
+            self._batchers[name] = MicroBatcher(
+                lambda prompts: self._run_batch(name, prompts),
+                name=name,
+                **self.batch_config.get(name, {})
+            )
+        return self._batchers[name]
+
+    def _run_batch(self, name, prompts):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pipeline = self.models[name]
+            outputs = pipeline(prompts, batch_size=_batch_size(pipeline, len(prompts)), **self.GENERATION_KWARGS[name])
+        return [_first_text(output) for output in outputs]
+
+    async def optimize_quantum_circuit_async(self, circuit_code: str) -> Dict[str, Any]:
+        prompt = f"Ottimizza questo circuito quantistico:\n{circuit_code}"
+        return {'optimized': await self._batcher('quantum_opt').submit(prompt)}
+
+    async def solve_math_expression_async(self, expression: str) -> Dict[str, Any]:
+        return {'solution': await self._batcher('math_solver').submit(expression)}
+
+    def batch_stats(self):
+        return {name: batcher.stats() for name, batcher in self._batchers.items()}
+
     def optimize_quantum_circuit(self, circuit_code: str) -> Dict[str, Any]:
         prompt = f"Ottimizza questo circuito quantistico:\n{circuit_code}"
         with warnings.catch_warnings():
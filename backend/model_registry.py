@@ -0,0 +1,114 @@
+"""
+Registro dei modelli AI di AI_RIQA.
+Ogni modello viene caricato al primo utilizzo, condiviso tra le richieste
+del processo e scaricato in ordine LRU quando si supera il budget di RAM.
+"""
+
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+# Configurazione del registro
+MODEL_RAM_BUDGET_MB = float(os.getenv("RIQA_MODEL_RAM_BUDGET_MB", "0"))  # 0 = nessun limite
+MODEL_PREWARM = os.getenv("RIQA_MODEL_PREWARM", "")  # Nomi separati da virgola, es. "math_solver"
+
+
+class ModelNotRegistered(KeyError):
+    """Sollevata quando si richiede un modello mai registrato"""
+
+
+def _footprint_mb(model, declared_mb):
+    """Occupazione misurata (se il modello la espone), altrimenti quella dichiarata"""
+    inner = getattr(model, "model", model)
+    try:
+        return inner.get_memory_footprint() / (1024 * 1024)
+    except Exception:
+        return declared_mb
+
+
+class ModelRegistry:
+    def __init__(self, ram_budget_mb=None):
+        self.ram_budget_mb = MODEL_RAM_BUDGET_MB if ram_budget_mb is None else ram_budget_mb
+        self._specs = {}
+        self._loaded = OrderedDict()  # nome -> (modello, MB)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.unloads = 0
+
+    def register(self, name, factory, size_mb=0.0):
+        """Registra (o sostituisce) la factory di un modello; un eventuale modello caricato viene scartato"""
+        with self._lock:
+            self._specs[name] = (factory, size_mb)
+            self._load_locks.setdefault(name, threading.Lock())
+            if self._loaded.pop(name, None) is not None:
+                self.unloads += 1
+
+    def get(self, name):
+        """Restituisce il modello, caricandolo al primo utilizzo"""
+        with self._lock:
+            if name not in self._specs:
+                raise ModelNotRegistered(name)
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry[0]
+            load_lock = self._load_locks[name]
+        # Un solo caricamento per modello anche con richieste concorrenti
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(name)
+                if entry is not None:
+                    self._loaded.move_to_end(name)
+                    return entry[0]
+                factory, declared_mb = self._specs[name]
+                self._make_room(declared_mb)
+            model = factory()
+            size_mb = _footprint_mb(model, declared_mb)
+            with self._lock:
+                self._loaded[name] = (model, size_mb)
+                self.loads += 1
+                self._make_room(0, keep=name)
+            return model
+
+    def _make_room(self, needed_mb, keep=None):
+        """Scarica i modelli meno usati finché il budget lo consente (chiamare con il lock)"""
+        if not self.ram_budget_mb:
+            return
+        for name in list(self._loaded):
+            if self.used_mb + needed_mb <= self.ram_budget_mb:
+                return
+            if name != keep:
+                del self._loaded[name]
+                self.unloads += 1
+        if self.used_mb + needed_mb > self.ram_budget_mb:
+            # Il budget è indicativo: un modello più grande del budget viene comunque caricato da solo
+            warnings.warn(f"Budget RAM modelli superato: {self.used_mb + needed_mb:.0f} MB su {self.ram_budget_mb:.0f} MB")
+
+    @property
+    def used_mb(self):
+        return sum(size for _, size in self._loaded.values())
+
+    def unload(self, name):
+        with self._lock:
+            if self._loaded.pop(name, None) is not None:
+                self.unloads += 1
+
+    def prewarm(self, names=None):
+        """Carica in anticipo i modelli indicati (o quelli di RIQA_MODEL_PREWARM)"""
+        if names is None:
+            names = [n.strip() for n in MODEL_PREWARM.split(",") if n.strip()]
+        for name in names:
+            self.get(name)
+        return names
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": {name: size for name, (_, size) in self._loaded.items()},
+                "used_mb": self.used_mb,
+                "ram_budget_mb": self.ram_budget_mb,
+                "loads": self.loads,
+                "unloads": self.unloads
+            }
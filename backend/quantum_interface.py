@@ -1,12 +1,32 @@
 # backend/quantum_interface.py
-from qiskit import QuantumCircuit, execute, Aer
+import threading
 
+from .cache import cached
+from .statevector import NativeCircuit, use_native
+
+_core = None
+_core_lock = threading.Lock()
+
+
+def _shared_core():
+    """Core del processo, creato al primo circuito Aer: Qiskit si importa solo allora"""
+    global _core
+    with _core_lock:
+        if _core is None:
+            from .core import RIQA_Core
+            _core = RIQA_Core()
+        return _core
+
+
+@cached('advanced_quantum')
 def run_advanced_quantum_sim(params):
     n_qubits = params.get('n_qubits', 2)
-    qc = QuantumCircuit(n_qubits, n_qubits)
-    qc.h(range(n_qubits))  # Porta Hadamard su tutti i qubit
-    qc.cx(0, 1)  # Entanglement
-    qc.measure_all()
-    backend = Aer.get_backend('qasm_simulator')
-    result = execute(qc, backend, shots=1024).result()
-    return result.get_counts()
\ No newline at end of file
+    if use_native(n_qubits, ['h', 'cx']):
+        qc = NativeCircuit(n_qubits, n_qubits)
+        for q in range(n_qubits):
+            qc.h(q)  # Porta Hadamard su tutti i qubit
+        qc.cx(0, 1)  # Entanglement
+        return qc.sample_counts(1024)
+    # Hadamard su tutti i qubit ed entanglement: backend persistente e circuito transpilato dalla cache del core
+    ops = [('h', (q,)) for q in range(n_qubits)] + [('cx', (0, 1))]
+    return _shared_core().run_counts(n_qubits, ops, 1024)
@@ -1,36 +1,152 @@
 # backend/simulation.py
 import numpy as np
-from scipy.integrate import solve_ivp
-from functools import lru_cache
 from pydantic import BaseModel, confloat
-from typing import Tuple
+from typing import Sequence, Tuple, Union
+from .cache import cached
+from .metrics import timed_phase
+from .subsystems import scipy_integrate
 
 class SimulationParameters(BaseModel):
-    time_range: Tuple[confloat(gt=0), confloat(gt=0)] = (0, 10)
+    time_range: Tuple[confloat(ge=0), confloat(gt=0)] = (0, 10)
     initial_conditions: Tuple[float, float] = (1.0, 0.0)
     k: confloat(gt=0) = 1.0  # Costante elastica
     m: confloat(gt=0) = 1.0  # Massa
+    k3: float = 0.0  # Costante non lineare (oscillatore di Duffing), 0 = sistema lineare
 
-@lru_cache(maxsize=100)
+@cached('oscillator')
 def simulate_complex_system(params: SimulationParameters):
     """Simula un sistema fisico complesso con validazione input e caching."""
-    def system(t, y, k=params.k, m=params.m):
+    def system(t, y, k=params.k, m=params.m, k3=params.k3):
         x, v = y
         dx_dt = v
-        dv_dt = -k * x / m
+        dv_dt = -(k * x + k3 * x**3) / m
         return [dx_dt, dv_dt]
     
-    sol = solve_ivp(
-        system,
-        params.time_range,
-        params.initial_conditions,
-        method='RK45',
-        t_eval=np.linspace(*params.time_range, 100)
-    )  # Aggiunto parentesi mancante qui
+    with timed_phase('solve_ivp'):
+        sol = scipy_integrate.solve_ivp(
+            system,
+            params.time_range,
+            params.initial_conditions,
+            method='RK45',
+            t_eval=np.linspace(*params.time_range, 100)
+        )  # Aggiunto parentesi mancante qui
     
+    # Array NumPy: la conversione in liste avviene solo se la risposta è JSON
     return {
-        'time': sol.t.tolist(),
-        'position': sol.y[0].tolist(),
-        'velocity': sol.y[1].tolist(),
-        'energy': (params.k * sol.y[0]**2 + params.m * sol.y[1]**2).tolist()  # Nuova metrica
+        'time': sol.t,
+        'position': sol.y[0],
+        'velocity': sol.y[1],
+        'energy': _energy(params.k, params.k3, params.m, sol.y[0], sol.y[1])  # Nuova metrica
     }
+
+def dense_trajectory(params: Union[SimulationParameters, dict], n_points: int):
+    """
+    Traiettoria ad alta risoluzione, calcolata una volta e poi servita a finestre
+    e livelli di dettaglio diversi (vedi backend/trajectories.py).
+    """
+    params = params if isinstance(params, SimulationParameters) else SimulationParameters(**params)
+    k, m, k3 = params.k, params.m, params.k3
+
+    def system(t, y):
+        x, v = y
+        return [v, -(k * x + k3 * x * x * x) / m]
+
+    # Tolleranze strette: i punti densi vengono mostrati anche a forte ingrandimento
+    with timed_phase('solve_ivp.dense'):
+        sol = scipy_integrate.solve_ivp(
+            system,
+            params.time_range,
+            params.initial_conditions,
+            method='RK45',
+            rtol=1e-8,
+            atol=1e-10,
+            t_eval=np.linspace(*params.time_range, n_points)
+        )
+    if not sol.success:
+        raise RuntimeError(sol.message)
+    return {
+        'time': sol.t,
+        'position': sol.y[0],
+        'velocity': sol.y[1],
+        'energy': _energy(k, k3, m, sol.y[0], sol.y[1])
+    }
+
+def _energy(k, k3, m, x, v):
+    return k * x**2 + m * v**2 + 0.5 * k3 * x**4
+
+# Passi RK4 per periodo di oscillazione locale nel percorso non lineare
+RK4_STEPS_PER_PERIOD = 50
+
+def simulate_batch(params_list: Sequence[Union[SimulationParameters, dict]], n_points: int = 100):
+    """
+    Integra un intero sweep di parametri in un'unica passata vettoriale.
+    Le righe lineari (k3 == 0) usano la soluzione in forma chiusa, le altre un
+    RK4 a passo fisso vettorizzato su tutte le righe.
+    Restituisce array di forma (len(params_list), n_points).
+    """
+    with timed_phase('simulate_batch'):
+        return _simulate_batch(params_list, n_points)
+
+def _simulate_batch(params_list, n_points):
+    rows = [p if isinstance(p, SimulationParameters) else SimulationParameters(**p) for p in params_list]
+    table = np.array(
+        [(*p.time_range, *p.initial_conditions, p.k, p.m, p.k3) for p in rows],
+        dtype=float
+    ).reshape(-1, 7)
+    t0, t1, x0, v0, k, m, k3 = table.T
+    time = t0[:, None] + (t1 - t0)[:, None] * np.linspace(0.0, 1.0, n_points)
+    position = np.empty_like(time)
+    velocity = np.empty_like(time)
+
+    linear = k3 == 0
+    if linear.any():
+        omega = np.sqrt(k[linear] / m[linear])[:, None]
+        tau = time[linear] - t0[linear, None]
+        cos, sin = np.cos(omega * tau), np.sin(omega * tau)
+        a, b = x0[linear, None], v0[linear, None]
+        position[linear] = a * cos + b / omega * sin
+        velocity[linear] = b * cos - a * omega * sin
+    if not linear.all():
+        nl = ~linear
+        position[nl], velocity[nl] = _rk4_batch(time[nl], x0[nl], v0[nl], k[nl], m[nl], k3[nl])
+
+    return {
+        'time': time,
+        'position': position,
+        'velocity': velocity,
+        'energy': _energy(k[:, None], k3[:, None], m[:, None], position, velocity)
+    }
+
+def _rk4_batch(time, x0, v0, k, m, k3):
+    """RK4 a passo fisso su tutte le righe; ogni riga ha il proprio passo"""
+    n_rows, n_points = time.shape
+    # Frequenza locale massima stimata dall'ampiezza iniziale (conservazione dell'energia)
+    amplitude = np.sqrt(x0**2 + m * v0**2 / k)
+    omega = np.sqrt((k + 3 * np.abs(k3) * amplitude**2) / m)
+    interval = time[:, 1] - time[:, 0] if n_points > 1 else np.zeros(n_rows)
+    substeps = max(1, int(np.ceil((interval * omega).max() * RK4_STEPS_PER_PERIOD / (2 * np.pi))))
+    h = (interval / substeps)
+
+    # Coefficienti pre-divisi per la massa; x*x*x evita la pow generica
+    k_m, k3_m = k / m, k3 / m
+
+    def accel(x):
+        return -x * (k_m + k3_m * x * x)
+
+    x, v = x0.copy(), v0.copy()
+    position = np.empty((n_rows, n_points))
+    velocity = np.empty((n_rows, n_points))
+    position[:, 0], velocity[:, 0] = x, v
+    for i in range(1, n_points):
+        for _ in range(substeps):
+            a1 = accel(x)
+            x2, v2 = x + 0.5 * h * v, v + 0.5 * h * a1
+            a2 = accel(x2)
+            x3, v3 = x + 0.5 * h * v2, v + 0.5 * h * a2
+            a3 = accel(x3)
+            x4, v4 = x + h * v3, v + h * a3
+            a4 = accel(x4)
+            x = x + h / 6 * (v + 2 * v2 + 2 * v3 + v4)
+            v = v + h / 6 * (a1 + 2 * a2 + 2 * a3 + a4)
+        position[:, i], velocity[:, i] = x, v
+    return position, velocity
@@ -0,0 +1,124 @@
+"""
+Motore statevector nativo in NumPy per i piccoli circuiti di AI_RIQA.
+Evita transpilazione e overhead dei job di Qiskit per circuiti H/CX da pochi
+qubit; i conteggi hanno lo stesso formato di `get_counts()` di Qiskit.
+"""
+
+import os
+
+import numpy as np
+
+# Configurazione del backend quantistico
+QUANTUM_BACKEND = os.getenv("RIQA_QUANTUM_BACKEND", "auto")  # "auto", "native" oppure "aer"
+NATIVE_MAX_QUBITS = int(os.getenv("RIQA_NATIVE_MAX_QUBITS", "16"))
+
+_SQRT1_2 = 1 / np.sqrt(2)
+SINGLE_QUBIT_GATES = {
+    'h': np.array([[_SQRT1_2, _SQRT1_2], [_SQRT1_2, -_SQRT1_2]], dtype=complex),
+    'x': np.array([[0, 1], [1, 0]], dtype=complex),
+    'y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+    'z': np.array([[1, 0], [0, -1]], dtype=complex),
+    's': np.array([[1, 0], [0, 1j]], dtype=complex),
+    't': np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=complex),
+}
+TWO_QUBIT_GATES = {'cx', 'cz', 'swap'}
+SUPPORTED_GATES = set(SINGLE_QUBIT_GATES) | TWO_QUBIT_GATES
+
+
+def use_native(n_qubits, gates=()):
+    """Decide se il circuito può girare sul motore nativo"""
+    if QUANTUM_BACKEND == "aer":
+        return False
+    fits = n_qubits <= NATIVE_MAX_QUBITS and all(g in SUPPORTED_GATES for g in gates)
+    if QUANTUM_BACKEND == "native" and not fits:
+        raise ValueError(f"Circuito non supportato dal motore nativo: {n_qubits} qubit, gate {list(gates)}")
+    return fits
+
+
+class NativeCircuit:
+    def __init__(self, n_qubits, n_clbits=0):
+        self.n_qubits = n_qubits
+        self.n_clbits = n_clbits  # Registro classico extra, come QuantumCircuit(n, n) + measure_all()
+        self.ops = []
+
+    def _check(self, *qubits):
+        for q in qubits:
+            if not 0 <= q < self.n_qubits:
+                raise IndexError(f"Qubit {q} fuori dal circuito di {self.n_qubits} qubit")
+        if len(set(qubits)) != len(qubits):
+            raise ValueError(f"Qubit duplicati nel gate: {qubits}")
+
+    def append(self, gate, *qubits):
+        if gate not in SUPPORTED_GATES:
+            raise ValueError(f"Gate '{gate}' non supportato dal motore nativo")
+        self._check(*qubits)
+        self.ops.append((gate, qubits))
+        return self
+
+    def h(self, qubit):
+        return self.append('h', qubit)
+
+    def x(self, qubit):
+        return self.append('x', qubit)
+
+    def cx(self, control, target):
+        return self.append('cx', control, target)
+
+    def statevector(self):
+        """Vettore di stato finale; il qubit 0 è il bit meno significativo (come Qiskit)"""
+        n = self.n_qubits
+        psi = np.zeros(2 ** n, dtype=complex)
+        psi[0] = 1.0
+        index = np.arange(2 ** n)
+        for gate, qubits in self.ops:
+            if gate in SINGLE_QUBIT_GATES:
+                q = qubits[0]
+                view = psi.reshape(2 ** (n - q - 1), 2, 2 ** q)
+                psi = np.einsum('ij,ajb->aib', SINGLE_QUBIT_GATES[gate], view).reshape(-1)
+            elif gate == 'cx':
+                control, target = qubits
+                psi = psi[np.where(index >> control & 1, index ^ (1 << target), index)]
+            elif gate == 'cz':
+                a, b = qubits
+                psi = np.where((index >> a & 1) & (index >> b & 1), -psi, psi)
+            elif gate == 'swap':
+                a, b = qubits
+                differ = (index >> a & 1) != (index >> b & 1)
+                psi = psi[np.where(differ, index ^ (1 << a) ^ (1 << b), index)]
+        return psi
+
+    def probabilities(self):
+        probs = np.abs(self.statevector()) ** 2
+        return probs / probs.sum()
+
+    def sample_counts(self, shots=1024, rng=None):
+        """Campiona tutti gli shot con un'unica multinomiale sul vettore di probabilità"""
+        rng = rng or np.random.default_rng()
+        hits = rng.multinomial(shots, self.probabilities())
+        states = np.flatnonzero(hits)
+        suffix = ' ' + '0' * self.n_clbits if self.n_clbits else ''
+        return {
+            format(int(s), f'0{self.n_qubits}b') + suffix: int(hits[s])
+            for s in states
+        }
+
+    def draw(self):
+        """Disegno testuale essenziale del circuito"""
+        lines = [[f"q_{q}: "] for q in range(self.n_qubits)]
+        for gate, qubits in self.ops:
+            for q in range(self.n_qubits):
+                if gate in SINGLE_QUBIT_GATES and q == qubits[0]:
+                    cell = gate.upper()
+                elif gate in TWO_QUBIT_GATES and q in qubits:
+                    cell = {'cx': ('■', 'X'), 'cz': ('■', '■'), 'swap': ('x', 'x')}[gate][qubits.index(q)]
+                elif gate in TWO_QUBIT_GATES and min(qubits) < q < max(qubits):
+                    cell = '┼'
+                else:
+                    cell = '─'
+                lines[q].append(f"─{cell}─")
+        for q in range(self.n_qubits):
+            lines[q].append("─M")
+        return "\n".join("".join(parts) for parts in lines)
+
+    def __str__(self):
+        return self.draw()
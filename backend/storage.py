@@ -0,0 +1,143 @@
+"""
+Formato di archiviazione strutturato dei risultati di AI_RIQA.
+I risultati vengono separati in un documento JSON interrogabile e in un blob
+binario compresso con gli array numerici grandi (time/position/velocity/...).
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+ARRAY_MIN_LENGTH = 16  # Liste numeriche più corte restano nel documento JSON
+BLOB_MAGIC = b"RIQA"
+BLOB_VERSION = 1
+_HEADER = struct.Struct("<4sBBI")  # magic, versione, compresso, lunghezza header JSON
+_ALIGN = 8
+
+
+def _as_numeric_array(value):
+    """Restituisce un ndarray se il valore è una sequenza numerica abbastanza lunga"""
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, (list, tuple)) and len(value) >= ARRAY_MIN_LENGTH:
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value[:ARRAY_MIN_LENGTH]):
+            return None
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return None
+    else:
+        return None
+    if array.dtype.kind not in "biufc" or array.size < ARRAY_MIN_LENGTH:
+        return None
+    return array
+
+
+def json_default(value):
+    """Serializzazione JSON dei tipi usati nei parametri (pydantic, NumPy)"""
+    if hasattr(value, "dict"):
+        return value.dict()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def to_builtin(value):
+    """Converte ricorsivamente array e scalari NumPy in tipi Python (per le risposte JSON)"""
+    if isinstance(value, dict):
+        return {k: to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(v) for v in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+def pack_result(result, compress=True):
+    """
+    Divide un risultato in (documento JSON, blob degli array o None).
+    Gli array estratti sono sostituiti nel documento da {"__array__": nome}.
+    """
+    arrays = {}
+
+    def walk(value, path):
+        array = _as_numeric_array(value)
+        if array is not None:
+            arrays[path] = array
+            return {"__array__": path}
+        if isinstance(value, dict):
+            return {str(k): walk(v, f"{path}/{k}" if path else str(k)) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [walk(v, f"{path}/{i}") for i, v in enumerate(value)]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    doc = json.dumps(walk(result, ""), default=json_default)
+    return doc, (encode_arrays(arrays, compress=compress) if arrays else None)
+
+
+def unpack_result(doc, blob=None):
+    """Ricostruisce il risultato; gli array sono viste in sola lettura sul blob decompresso"""
+    arrays = decode_arrays(blob) if blob is not None else {}
+
+    def walk(value):
+        if isinstance(value, dict):
+            if set(value) == {"__array__"}:
+                return arrays[value["__array__"]]
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    return walk(json.loads(doc) if isinstance(doc, (str, bytes)) else doc)
+
+
+def encode_arrays(arrays, level=6, compress=True):
+    """Serializza {nome: ndarray} in un blob: header JSON + buffer grezzi allineati, compressi con zlib"""
+    entries, chunks, offset = [], [], 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.byteorder == ">":
+            array = array.astype(array.dtype.newbyteorder("<"))
+        padding = -offset % _ALIGN
+        if padding:
+            chunks.append(b"\0" * padding)
+            offset += padding
+        entries.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        chunks.append(array.tobytes())
+        offset += array.nbytes
+    payload = b"".join(chunks)
+    compressed = zlib.compress(payload, level) if compress else payload
+    use_compressed = len(compressed) < len(payload)
+    header = json.dumps(entries).encode("utf-8")
+    return b"".join([
+        _HEADER.pack(BLOB_MAGIC, BLOB_VERSION, int(use_compressed), len(header)),
+        header,
+        compressed if use_compressed else payload
+    ])
+
+
+def decode_arrays(blob):
+    """Legge un blob di encode_arrays senza copiare i singoli array"""
+    blob = memoryview(blob)
+    magic, version, compressed, header_length = _HEADER.unpack_from(blob)
+    if magic != BLOB_MAGIC or version != BLOB_VERSION:
+        raise ValueError("Blob di array non riconosciuto")
+    start = _HEADER.size
+    entries = json.loads(bytes(blob[start:start + header_length]))
+    payload = blob[start + header_length:]
+    if compressed:
+        payload = zlib.decompress(payload)
+    arrays = {}
+    for entry in entries:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arrays[entry["name"]] = np.frombuffer(
+            payload, dtype=dtype, count=count, offset=entry["offset"]
+        ).reshape(entry["shape"])
+    return arrays
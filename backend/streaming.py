@@ -0,0 +1,179 @@
+"""
+Protocollo di streaming WebSocket delle simulazioni di AI_RIQA.
+Ogni job viene diviso in pezzi (segmenti della traiettoria solve_ivp, lotti di
+shot quantistici) eseguiti uno alla volta nell'executor: il client riceve i
+risultati parziali appena pronti e può annullare un job tra un pezzo e l'altro.
+
+Messaggi del client:
+    {"type": "start", "job_id": "...", "section": "...", "parameters": {...}}
+    {"type": "cancel", "job_id": "..."}
+Messaggi del server (tutti con "job_id"):
+    started, chunk (con "seq" e "data"), done (con "chunks"), cancelled, error
+"""
+
+import asyncio
+import os
+import uuid
+
+import numpy as np
+
+from .simulation import SimulationParameters, _energy
+from .storage import to_builtin
+from .subsystems import scipy_integrate
+
+# Configurazione dello streaming
+STREAM_OUTBOX_SIZE = int(os.getenv("RIQA_STREAM_OUTBOX_SIZE", "16"))  # Messaggi in attesa di invio per socket
+STREAM_MAX_JOBS = int(os.getenv("RIQA_STREAM_MAX_JOBS", "4"))  # Job contemporanei per socket
+STREAM_CHUNK_POINTS = int(os.getenv("RIQA_STREAM_CHUNK_POINTS", "100"))  # Punti di traiettoria per pezzo
+STREAM_SHOT_BATCH = int(os.getenv("RIQA_STREAM_SHOT_BATCH", "256"))  # Shot quantistici per pezzo
+
+
+class StreamError(Exception):
+    """Errore di protocollo riferito a un singolo job: il socket resta aperto"""
+
+
+def _oscillator_segment(params, times, state):
+    """Integra l'oscillatore dallo stato (t, x, v) fino a times[-1], campionando in times"""
+    p = SimulationParameters(**params)
+    k, m, k3 = p.k, p.m, p.k3
+
+    def system(t, y):
+        x, v = y
+        return [v, -(k * x + k3 * x**3) / m]
+
+    times = np.asarray(times, dtype=float)
+    if times[-1] <= state[0]:
+        # Segmento di un solo punto coincidente con lo stato (solve_ivp non accetta intervalli nulli)
+        t, y = times, np.array(state[1:], dtype=float).reshape(2, 1)
+    else:
+        sol = scipy_integrate.solve_ivp(system, (float(state[0]), float(times[-1])), state[1:], method='RK45', t_eval=times)
+        if not sol.success:
+            raise RuntimeError(sol.message)
+        t, y = sol.t, sol.y
+    return {
+        'time': t.tolist(),
+        'position': y[0].tolist(),
+        'velocity': y[1].tolist(),
+        'energy': _energy(k, k3, m, y[0], y[1]).tolist()
+    }
+
+
+async def oscillator_chunks(executor, params):
+    """Traiettoria a segmenti: ogni segmento riparte dallo stato finale del precedente"""
+    p = SimulationParameters(**params)
+    n_points = int(params.get('n_points', 100))
+    chunk_points = max(1, int(params.get('chunk_points', STREAM_CHUNK_POINTS)))
+    times = np.linspace(*p.time_range, n_points)
+    state = (float(times[0]), *p.initial_conditions)
+    base = p.dict()
+    for start in range(0, n_points, chunk_points):
+        segment = times[start:start + chunk_points].tolist()
+        data = await executor.run(_oscillator_segment, base, segment, state)
+        state = (data['time'][-1], data['position'][-1], data['velocity'][-1])
+        yield data
+
+
+async def quantum_chunks(executor, params):
+    """Conteggi a lotti di shot; ogni pezzo porta anche gli shot già completati"""
+    total = int(params.get('shots', 1024))
+    batch = max(1, int(params.get('batch_shots', STREAM_SHOT_BATCH)))
+    done = 0
+    while done < total:
+        shots = min(batch, total - done)
+        data = await executor.run_quantum_shots(params, shots)
+        done += shots
+        yield dict(data, shots_done=done, shots_total=total)
+
+
+async def single_chunk(executor, section, params):
+    """Sezioni senza risultati parziali: un solo pezzo con il risultato completo"""
+    result = await executor.run_simulation(section, params)
+    if isinstance(result, dict) and result.get('status') == 'error':
+        raise StreamError(result.get('result'))
+    yield result
+
+
+def chunk_source(executor, section, params):
+    if section == 'oscillator':
+        return oscillator_chunks(executor, params)
+    if section == 'quantum':
+        return quantum_chunks(executor, params)
+    return single_chunk(executor, section, params)
+
+
+class SimulationStream:
+    """
+    Gestisce un socket: più job multiplexati, un solo mittente.
+    La coda di uscita è limitata: se il client legge lentamente i job si
+    fermano in attesa prima di calcolare il pezzo successivo.
+    """
+
+    def __init__(self, websocket, executor, outbox_size=None, max_jobs=None):
+        self.websocket = websocket
+        self.executor = executor
+        self.outbox = asyncio.Queue(maxsize=outbox_size or STREAM_OUTBOX_SIZE)
+        self.max_jobs = max_jobs or STREAM_MAX_JOBS
+        self.jobs = {}
+
+    async def serve(self):
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                try:
+                    message = await self.websocket.receive_json()
+                    if not isinstance(message, dict):
+                        raise ValueError(message)
+                except ValueError:
+                    await self.outbox.put({'type': 'error', 'job_id': None, 'message': 'Messaggio JSON non valido'})
+                    continue
+                await self.handle(message)
+        finally:
+            tasks = list(self.jobs.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+    async def handle(self, message):
+        kind = message.get('type', 'start')
+        job_id = message.get('job_id')
+        if kind == 'cancel':
+            task = self.jobs.get(job_id)
+            if task is not None:
+                # Un pezzo ancora in coda nell'executor non parte; quello in corso termina nel worker
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await self.outbox.put({'type': 'cancelled', 'job_id': job_id})
+            return
+        if kind != 'start' or 'section' not in message:
+            await self.outbox.put({'type': 'error', 'job_id': job_id, 'message': f"Messaggio '{kind}' non valido"})
+            return
+        job_id = job_id or str(uuid.uuid4())
+        if job_id in self.jobs:
+            await self.outbox.put({'type': 'error', 'job_id': job_id, 'message': 'job_id già in uso'})
+            return
+        if len(self.jobs) >= self.max_jobs:
+            await self.outbox.put({'type': 'error', 'job_id': job_id, 'message': f"Massimo {self.max_jobs} job per connessione"})
+            return
+        self.jobs[job_id] = asyncio.create_task(
+            self._run_job(job_id, message['section'], message.get('parameters') or {})
+        )
+
+    async def _run_job(self, job_id, section, params):
+        seq = 0
+        try:
+            await self.outbox.put({'type': 'started', 'job_id': job_id})
+            async for data in chunk_source(self.executor, section, params):
+                await self.outbox.put({'type': 'chunk', 'job_id': job_id, 'seq': seq, 'data': data})
+                seq += 1
+            await self.outbox.put({'type': 'done', 'job_id': job_id, 'chunks': seq})
+        except Exception as e:
+            await self.outbox.put({'type': 'error', 'job_id': job_id, 'message': str(e)})
+        finally:
+            self.jobs.pop(job_id, None)
+
+    async def _send_loop(self):
+        while True:
+            message = await self.outbox.get()
+            await self.websocket.send_json(to_builtin(message))
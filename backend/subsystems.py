@@ -0,0 +1,113 @@
+"""
+Caricamento pigro dei sottosistemi pesanti di AI_RIQA.
+Qiskit, SciPy, matplotlib e transformers sono registrati per nome e importati
+al primo uso: importare backend.app costa solo FastAPI e NumPy, e un worker che
+non esegue mai una sezione non ne paga né il tempo né la memoria.
+RIQA_PRELOAD elenca i sottosistemi da importare subito, ad esempio nel processo
+master prima del fork, così i worker li condividono copy-on-write.
+"""
+
+import importlib
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Nomi separati da virgola (es. "qiskit,scipy.integrate"), oppure "all"
+PRELOAD = os.getenv("RIQA_PRELOAD", "")
+
+_MISSING = object()
+
+
+class SubsystemNotRegistered(KeyError):
+    """Sollevata quando si richiede un sottosistema mai registrato"""
+
+
+class SubsystemRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._loaded = {}
+        self.load_seconds = {}
+        # Rientrante: il loader di un sottosistema può chiederne un altro
+        self._lock = threading.RLock()
+
+    def register(self, name, loader):
+        """Registra la funzione che importa il sottosistema e restituisce un proxy pigro"""
+        with self._lock:
+            self._loaders[name] = loader
+        return LazyModule(self, name)
+
+    def module(self, import_name):
+        """Scorciatoia per un modulo importabile così com'è"""
+        return self.register(import_name, lambda: importlib.import_module(import_name))
+
+    def get(self, name):
+        """Restituisce il sottosistema, importandolo al primo uso"""
+        subsystem = self._loaded.get(name, _MISSING)
+        if subsystem is not _MISSING:
+            return subsystem
+        with self._lock:
+            subsystem = self._loaded.get(name, _MISSING)
+            if subsystem is not _MISSING:
+                return subsystem
+            if name not in self._loaders:
+                raise SubsystemNotRegistered(name)
+            start = time.perf_counter()
+            subsystem = self._loaders[name]()
+            self.load_seconds[name] = time.perf_counter() - start
+            self._loaded[name] = subsystem
+            return subsystem
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def preload(self, names=None):
+        """Importa subito i sottosistemi indicati (predefinito: RIQA_PRELOAD); restituisce i nomi caricati"""
+        names = PRELOAD if names is None else names
+        if isinstance(names, str):
+            names = list(self._loaders) if names.strip() == "all" else [n.strip() for n in names.split(",")]
+        names = [name for name in names if name]
+        for name in names:
+            self.get(name)
+        return names
+
+    def stats(self):
+        with self._lock:
+            return {
+                "registered": sorted(self._loaders),
+                "loaded": {name: self.load_seconds.get(name, 0.0) for name in self._loaded}
+            }
+
+
+class LazyModule:
+    """Proxy che inoltra gli attributi al sottosistema, importandolo al primo accesso"""
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = "caricato" if self._registry.is_loaded(self._name) else "non caricato"
+        return f"<sottosistema {self._name} ({state})>"
+
+
+def _load_matplotlib():
+    # Solo l'API a oggetti con il canvas Agg: pyplot e i backend interattivi non servono
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    return SimpleNamespace(Figure=Figure, FigureCanvasAgg=FigureCanvasAgg)
+
+
+subsystems = SubsystemRegistry()
+
+qiskit = subsystems.module("qiskit")
+scipy_integrate = subsystems.module("scipy.integrate")
+scipy_signal = subsystems.module("scipy.signal")
+scipy_stats = subsystems.module("scipy.stats")
+scipy_fft = subsystems.module("scipy.fft")
+matplotlib = subsystems.register("matplotlib", _load_matplotlib)
+transformers = subsystems.module("transformers")
@@ -0,0 +1,121 @@
+"""
+Traiettorie a livelli di dettaglio di AI_RIQA.
+La traiettoria densa viene integrata una sola volta (nell'executor) e tenuta in
+memoria; ogni richiesta successiva, per qualunque finestra temporale e numero
+di punti, è una fetta degli array già calcolati ridotta con LTTB o min/max.
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .cache import canonical_key
+from .decimation import lttb_indices, minmax_indices
+from .simulation import SimulationParameters, dense_trajectory
+
+# Configurazione dello store
+TRAJECTORY_DENSE_POINTS = int(os.getenv("RIQA_TRAJECTORY_DENSE_POINTS", "100000"))
+TRAJECTORY_MAX_DENSE_POINTS = int(os.getenv("RIQA_TRAJECTORY_MAX_DENSE_POINTS", "2000000"))
+TRAJECTORY_STORE_BYTES = int(os.getenv("RIQA_TRAJECTORY_STORE_BYTES", str(256 * 1024 * 1024)))
+TRAJECTORY_MAX_POINTS = int(os.getenv("RIQA_TRAJECTORY_MAX_POINTS", "20000"))  # Punti restituibili da una finestra
+TRAJECTORY_DEFAULT_POINTS = 1000
+DECIMATION_METHODS = ('lttb', 'minmax')
+
+
+class TrajectoryNotFound(KeyError):
+    """Sollevata per un id sconosciuto o già rimosso dallo store"""
+
+
+def trajectory_id(params, dense_points):
+    """Id deterministico: gli stessi parametri condividono la stessa traiettoria densa"""
+    return canonical_key('trajectory', {'params': params, 'dense_points': dense_points})[:32]
+
+
+class TrajectoryStore:
+    def __init__(self, max_bytes=None):
+        self.max_bytes = TRAJECTORY_STORE_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # id -> dict di array densi
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, arrays):
+        size = sum(a.nbytes for a in arrays.values())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= sum(a.nbytes for a in old.values())
+            self._entries[key] = arrays
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(a.nbytes for a in evicted.values())
+        return key
+
+    def get(self, key):
+        with self._lock:
+            arrays = self._entries.get(key)
+            if arrays is None:
+                raise TrajectoryNotFound(key)
+            self._entries.move_to_end(key)
+            return arrays
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def window(self, key, t0=None, t1=None, points=None, method='lttb', column='position'):
+        """
+        Finestra [t0, t1] ridotta a points punti (al più TRAJECTORY_MAX_POINTS); il primo
+        e l'ultimo campione della finestra restano. LTTB costa un passo Python per punto:
+        dal loop asincrono va chiamata in un thread.
+        """
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Metodo di decimazione '{method}' non supportato. Usa {DECIMATION_METHODS}.")
+        arrays = self.get(key)
+        time = arrays['time']
+        # Un campione in più per lato, così la curva arriva ai bordi della finestra
+        start = max(0, int(np.searchsorted(time, time[0] if t0 is None else t0, side='right')) - 1)
+        stop = min(len(time), int(np.searchsorted(time, time[-1] if t1 is None else t1, side='left')) + 1)
+        points = min(points or TRAJECTORY_DEFAULT_POINTS, TRAJECTORY_MAX_POINTS)
+        sliced = {name: values[start:stop] for name, values in arrays.items()}
+        if method == 'lttb':
+            keep = lttb_indices(sliced['time'], sliced[column], points)
+        else:
+            keep = minmax_indices(sliced[column], max(1, points // 4))
+        result = {name: values[keep] for name, values in sliced.items()}
+        result.update(
+            trajectory_id=key,
+            method=method,
+            window_points=stop - start,
+            dense_points=len(time)
+        )
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+trajectory_store = TrajectoryStore()
+
+
+class TrajectoryService:
+    """Collega lo store all'executor: l'integrazione densa gira nel pool, le finestre in un thread del processo principale"""
+
+    def __init__(self, executor, store=None):
+        self.executor = executor
+        self.store = store or trajectory_store
+
+    async def simulate(self, params, points=None, method='lttb'):
+        """Calcola (o riusa) la traiettoria densa e restituisce la vista iniziale"""
+        params = dict(params)
+        dense_points = min(int(params.pop('dense_points', TRAJECTORY_DENSE_POINTS)), TRAJECTORY_MAX_DENSE_POINTS)
+        points = int(params.pop('points', points or TRAJECTORY_DEFAULT_POINTS))
+        params = SimulationParameters(**params).dict()
+        key = trajectory_id(params, dense_points)
+        if key not in self.store:
+            self.store.put(key, await self.executor.run(dense_trajectory, params, dense_points))
+        return await asyncio.to_thread(self.store.window, key, points=points, method=method)
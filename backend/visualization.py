@@ -1,35 +1,188 @@
-import matplotlib.pyplot as plt
-from io import BytesIO
+"""
+Rendering dei grafici di AI_RIQA con l'API a oggetti di matplotlib (Figure + Agg).
+Niente pyplot né stato globale: ogni thread del pool di rendering ha i propri
+template di figura già costruiti, che vengono solo aggiornati con i nuovi dati.
+Le immagini sono in cache per hash dell'input.
+"""
+
+import asyncio
 import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+
+from .cache import ResultCache
+from .decimation import decimate
+from .subsystems import matplotlib
+from .trajectories import trajectory_store
+
+# Configurazione del rendering
+RENDER_WORKERS = int(os.getenv("RIQA_RENDER_WORKERS", "2"))
+RENDER_DPI = int(os.getenv("RIQA_RENDER_DPI", "100"))
+RENDER_CACHE_BYTES = int(os.getenv("RIQA_RENDER_CACHE_BYTES", str(32 * 1024 * 1024)))
+SERIES_FIGSIZE = (12, 4)
+SERIES_AXIS_FRACTION = 0.44  # Larghezza di ciascun asse rispetto alla figura
+
+
+def series_pixels(dpi=None):
+    """Larghezza in pixel di un asse del grafico di simulazione: oltre questo numero di punti si decima"""
+    return int(SERIES_FIGSIZE[0] * (dpi or RENDER_DPI) * SERIES_AXIS_FRACTION)
+
+
+class _CircuitTemplate:
+    def __init__(self, dpi):
+        self.figure = matplotlib.Figure(figsize=(10, 4), dpi=dpi)
+        matplotlib.FigureCanvasAgg(self.figure)
+        ax = self.figure.add_axes([0, 0, 1, 1])
+        ax.axis('off')
+        self.text = ax.text(0.5, 0.5, '', family='monospace', ha='center', va='center')
+
+    def draw(self, circuit_text):
+        self.text.set_text(circuit_text)
+
+
+class _SeriesTemplate:
+    """Andamento temporale e spazio delle fasi affiancati, con margini fissi (nessun bbox 'tight')"""
+
+    def __init__(self, dpi):
+        self.figure = matplotlib.Figure(figsize=SERIES_FIGSIZE, dpi=dpi)
+        matplotlib.FigureCanvasAgg(self.figure)
+        self.figure.subplots_adjust(left=0.06, right=0.98, bottom=0.1, top=0.9, wspace=0.2)
+        self.time_ax, self.phase_ax = self.figure.subplots(1, 2)
+        self.time_ax.set_title('Andamento Temporale')
+        self.phase_ax.set_title('Spazio delle Fasi')
+        self.time_line, = self.time_ax.plot([], [])
+        self.phase_line, = self.phase_ax.plot([], [])
+        self.pixels = series_pixels(dpi)
+
+    def draw(self, data):
+        time, values = decimate(data['time'], data['values'], self.pixels)
+        self.time_line.set_data(time, values)
+        has_phase = 'x' in data and 'y' in data
+        if has_phase:
+            x, y = np.asarray(data['x'], dtype=float), np.asarray(data['y'], dtype=float)
+            _, xy = decimate(np.arange(len(x)), np.column_stack([x, y]), self.pixels)
+            self.phase_line.set_data(xy[:, 0], xy[:, 1])
+        else:
+            self.phase_line.set_data([], [])
+        for ax in (self.time_ax, self.phase_ax):
+            ax.relim()
+            ax.autoscale_view()
+
+
+_TEMPLATES = {'circuit': _CircuitTemplate, 'series': _SeriesTemplate}
+
+
+def render_key(kind, data):
+    """Hash dell'input del grafico; le serie numeriche entrano come buffer float64, senza passare da JSON"""
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    items = sorted(data.items()) if isinstance(data, dict) else [('', data)]
+    for name, value in items:
+        digest.update(f"\0{name}\0".encode('utf-8'))
+        if isinstance(value, str):
+            digest.update(value.encode('utf-8'))
+        else:
+            digest.update(np.ascontiguousarray(value, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class RenderService:
+    def __init__(self, workers=None, dpi=None, cache=None):
+        self.workers = workers or RENDER_WORKERS
+        self.dpi = dpi or RENDER_DPI
+        self.cache = cache or ResultCache(max_bytes=RENDER_CACHE_BYTES, namespace="riqa:render")
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.renders = 0
+
+    def _template(self, kind):
+        templates = self._local.__dict__.setdefault('templates', {})
+        if kind not in templates:
+            templates[kind] = _TEMPLATES[kind](self.dpi)
+        return templates[kind]
+
+    def render(self, kind, data):
+        """PNG (bytes) del grafico; sicuro da chiamare da più thread"""
+        key = render_key(kind, data)
+        found, png = self.cache.get(key)
+        if found:
+            return png
+        template = self._template(kind)
+        template.draw(data)
+        buffer = BytesIO()
+        template.figure.savefig(buffer, format='png')
+        png = buffer.getvalue()
+        self.renders += 1
+        self.cache.set(key, png)
+        return png
+
+    def _prepare_and_render(self, kind, data, prepare):
+        return self.render(kind, prepare(data) if prepare else data)
+
+    async def render_async(self, kind, data, prepare=None):
+        """
+        Rendering nel pool dedicato, senza bloccare il loop. prepare (per esempio
+        series_payload, che decima le serie) gira nello stesso thread del rendering.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="riqa-render")
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, self._prepare_and_render, kind, data, prepare
+        )
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self):
+        return dict(self.cache.stats(), renders=self.renders, workers=self.workers)
+
+
+render_service = RenderService()
+
+
+def series_payload(data):
+    """
+    Dati del grafico di simulazione; accetta anche i risultati dell'oscillatore (position/velocity)
+    e {'trajectory_id', 't0', 't1'}: lo zoom è una fetta della traiettoria densa già calcolata.
+    """
+    if 'trajectory_id' in data:
+        data = trajectory_store.window(
+            data['trajectory_id'], data.get('t0'), data.get('t1'),
+            points=4 * series_pixels(), method='minmax'
+        )
+    payload = {
+        'time': data['time'],
+        'values': data['values'] if 'values' in data else data['position']
+    }
+    if 'x' in data and 'y' in data:
+        payload.update(x=data['x'], y=data['y'])
+    elif 'position' in data and 'velocity' in data:
+        payload.update(x=data['position'], y=data['velocity'])
+    return payload
+
 
 class VisualizationEngine:
     @staticmethod
-    def plot_quantum_circuit(circuit_text):
+    def plot_quantum_circuit(circuit_text, raw=False):
         """Genera immagine del circuito quantistico"""
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax.text(0.5, 0.5, circuit_text, family='monospace', ha='center', va='center')
-        ax.axis('off')
-        return VisualizationEngine._fig_to_base64(fig)
+        png = render_service.render('circuit', circuit_text)
+        return png if raw else VisualizationEngine._to_base64(png)
 
     @staticmethod
-    def plot_simulation_results(data):
+    def plot_simulation_results(data, raw=False):
         """Genera grafici per simulazioni"""
-        fig, axs = plt.subplots(1, 2, figsize=(12, 4))
-        
-        # Plot time series
-        axs[0].plot(data['time'], data['values'])
-        axs[0].set_title('Andamento Temporale')
-        
-        # Plot phase space
-        if 'x' in data and 'y' in data:
-            axs[1].plot(data['x'], data['y'])
-            axs[1].set_title('Spazio delle Fasi')
-        
-        return VisualizationEngine._fig_to_base64(fig)
+        png = render_service.render('series', series_payload(data))
+        return png if raw else VisualizationEngine._to_base64(png)
 
     @staticmethod
-    def _fig_to_base64(fig):
-        buf = BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight')
-        plt.close(fig)
-        return base64.b64encode(buf.getvalue()).decode('utf-8')
+    def _to_base64(png):
+        return base64.b64encode(png).decode('utf-8')
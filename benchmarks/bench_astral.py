@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motore N-corpi: somma diretta contro albero di Barnes-Hut.
+Per ogni N misura una valutazione delle forze con i due kernel (la somma diretta
+solo fino a --max-direct corpi, oltre è stimata scalando come N^2), l'errore
+relativo dell'albero su un campione di corpi e una chiamata simulate_nbody di
+un passo sul sistema più grande (tre valutazioni: diagnostica iniziale, passo,
+diagnostica finale).
+I corpi sono una sfera di Plummer generata da un seme fisso.
+
+Uso: python benchmarks/bench_astral.py --sizes 1000 4000 16000 100000 --output astral.json
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from backend.astral import (
+    ASTRAL_THETA, direct_accelerations, initial_state, simulate_nbody, tree_accelerations
+)
+
+from harness import add_report_arguments, environment, finish, measure
+
+SEED = 1234
+SOFTENING = 0.01
+ERROR_SAMPLE = 512
+
+
+def sampled_direct(positions, masses, targets):
+    """Somma diretta per i soli bersagli campionati, contro tutti i corpi, 32 bersagli alla volta"""
+    acc = np.empty((3, len(targets)))
+    for lo in range(0, len(targets), 32):
+        block = targets[lo:lo + 32]
+        d = positions[:, None, :] - positions[:, block, None]
+        r2 = (d ** 2).sum(axis=0) + SOFTENING ** 2
+        r2[np.arange(len(block)), block] = np.inf
+        acc[:, lo:lo + 32] = (d * (masses / r2 ** 1.5)).sum(axis=2)
+    return acc
+
+
+def bench_size(n, iterations, max_direct, theta):
+    positions, _, masses = initial_state({'preset': 'plummer', 'n': n, 'seed': SEED})
+    results, comparison = {}, {}
+    tree = measure(lambda i: tree_accelerations(positions, masses, softening=SOFTENING, theta=theta), iterations)
+    results[f"astral.tree_{n}"] = tree
+    if n <= max_direct:
+        direct = measure(lambda i: direct_accelerations(positions, masses, softening=SOFTENING), iterations)
+        results[f"astral.direct_{n}"] = direct
+        comparison["direct_ms"] = direct["p50_ms"]
+    comparison["tree_ms"] = tree["p50_ms"]
+
+    targets = np.random.default_rng(SEED).choice(n, size=min(n, ERROR_SAMPLE), replace=False)
+    exact = sampled_direct(positions, masses, targets)
+    approx = tree_accelerations(positions, masses, softening=SOFTENING, theta=theta)[:, targets]
+    error = np.linalg.norm(approx - exact, axis=0) / np.linalg.norm(exact, axis=0)
+    comparison["tree_error_median"] = float(np.median(error))
+    comparison["tree_error_p99"] = float(np.percentile(error, 99))
+    return results, comparison
+
+
+def run(sizes, iterations, max_direct, theta):
+    results, comparison = {}, {}
+    for n in sizes:
+        size_results, comparison[n] = bench_size(n, iterations, max_direct, theta)
+        results.update(size_results)
+    # Oltre max_direct la somma diretta è stimata dalla misura più grande, scalando come N^2
+    measured = [n for n in sizes if "direct_ms" in comparison[n]]
+    for n in sizes:
+        if "direct_ms" not in comparison[n] and measured:
+            reference = max(measured)
+            comparison[n]["direct_ms_estimated"] = comparison[reference]["direct_ms"] * (n / reference) ** 2
+        direct = comparison[n].get("direct_ms", comparison[n].get("direct_ms_estimated"))
+        if direct:
+            comparison[n]["speedup"] = direct / comparison[n]["tree_ms"]
+
+    # simulate_nbody di un passo sul sistema più grande, con il metodo scelto da 'auto'
+    step = {'preset': 'plummer', 'n': max(sizes), 'seed': SEED, 'softening': SOFTENING, 'theta': theta,
+            'dt': 1e-3, 'steps': 1}
+    results[f"astral.simulate_1step_{max(sizes)}"] = measure(lambda i: simulate_nbody(step), 1, warmup=0)
+    return {
+        "meta": environment(suite="astral", iterations=iterations, seed=SEED, theta=theta, softening=SOFTENING),
+        "results": results,
+        "comparison": {str(n): values for n, values in comparison.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000, 100000])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--max-direct", type=int, default=16000, help="Oltre, la somma diretta non viene eseguita")
+    parser.add_argument("--theta", type=float, default=ASTRAL_THETA)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(finish(run(sorted(args.sizes), args.iterations, args.max_direct, args.theta), args))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark del login sotto carico.
+Lancia N login concorrenti su /token e, nello stesso momento, richieste leggere
+su /users/me; riporta il throughput dei login e la latenza delle richieste leggere.
+Richiede httpx (in requirements.txt): pip install -r requirements.txt
+
+Uso: python benchmarks/bench_auth.py --logins 40 --light 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from backend.app import app
+from backend.auth import create_access_token
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def run(logins, light, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    token = create_access_token({"sub": "testuser"}, user_key="ak_bench_0_9999999999")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login_limit = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with login_limit:
+                response = await client.post("/token", data={"username": "testuser", "password": "testpass"})
+                return response.status_code
+
+        async def light_request():
+            start = time.perf_counter()
+            await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+            return time.perf_counter() - start
+
+        async def light_stream():
+            latencies = []
+            for _ in range(light):
+                latencies.append(await light_request())
+                await asyncio.sleep(0.001)
+            return latencies
+
+        start = time.perf_counter()
+        login_task = asyncio.gather(*(login() for _ in range(logins)))
+        latencies, codes = await asyncio.gather(light_stream(), login_task)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "logins": logins,
+        "login_status": {str(code): codes.count(code) for code in set(codes)},
+        "login_throughput_per_s": logins / elapsed,
+        "light_requests": len(latencies),
+        "light_p50_ms": statistics.median(latencies) * 1000,
+        "light_p99_ms": percentile(latencies, 99) * 1000,
+        "light_max_ms": max(latencies) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--light", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.logins, args.light, args.concurrency)), indent=2))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Generatore di carico in processo per l'app ASGI.
+Pilota /simulate, /analyze, /visualize (via httpx.ASGITransport) e /ws/simulate
+(con un client WebSocket ASGI minimale) con utenti virtuali concorrenti, modelli AI
+fittizi e un database SQLite temporaneo; riporta throughput e latenze p50/p95/p99
+per scenario. I parametri cambiano a ogni richiesta, così si misura il calcolo e
+non la cache dei risultati.
+Richiede httpx (in requirements.txt): pip install -r requirements.txt
+
+Uso: python benchmarks/bench_load.py --requests 200 --concurrency 16 --output load.json [--baseline base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from harness import add_report_arguments, environment, finish, summarize
+
+SEED = 1234
+SCENARIOS = ("simulate.oscillator", "simulate.quantum", "analyze.quantum", "analyze.timeseries",
+             "visualize.series", "ws.oscillator")
+
+
+class _StubPipeline:
+    """Modello fittizio: nessun download né caricamento di transformers durante il benchmark"""
+
+    def __call__(self, inputs, **kwargs):
+        if isinstance(inputs, list):
+            return [[{'generated_text': text}] for text in inputs]
+        return [{'generated_text': inputs}]
+
+
+class ASGIWebSocket:
+    """Client WebSocket che parla direttamente con l'app ASGI, senza rete"""
+
+    def __init__(self, app, path):
+        self.app, self.path = app, path
+        self._incoming = asyncio.Queue()
+        self._outgoing = asyncio.Queue()
+        self._task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": self.path,
+            "raw_path": self.path.encode(), "root_path": "", "query_string": b"", "headers": [],
+            "client": ("bench", 0), "server": ("bench", 80), "subprotocols": [],
+        }
+        self._task = asyncio.create_task(self.app(scope, self._incoming.get, self._outgoing.put))
+        await self._incoming.put({"type": "websocket.connect"})
+        message = await self._outgoing.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"Connessione WebSocket rifiutata: {message}")
+
+    async def send_json(self, data):
+        await self._incoming.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self):
+        message = await self._outgoing.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("WebSocket chiuso dal server")
+        return json.loads(message.get("text") or message["bytes"])
+
+    async def close(self):
+        await self._incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await self._task
+
+
+def _payloads(rng):
+    time_axis = np.linspace(0, 100, 20_000)
+    base_values = np.sin(time_axis) + 0.1 * rng.standard_normal(len(time_axis))
+    states = rng.integers(0, 2 ** 10, size=4096)
+    values, frequencies = np.unique(states, return_counts=True)
+    counts = {format(int(v), "010b"): int(c) for v, c in zip(values, frequencies)}
+
+    def simulate_oscillator(i):
+        return "/simulate", {"message": "", "section": "oscillator",
+                             "parameters": {"time_range": [0, 20], "k": 1.0 + i * 1e-6, "k3": 0.2}}
+
+    def simulate_quantum(i):
+        return "/simulate", {"message": "", "section": "quantum",
+                             "parameters": {"n_qubits": 4 + i % 3, "shots": 1000 + i, "gates": ["h", "cx"]}}
+
+    def analyze_quantum(i):
+        return "/analyze", {"type": "quantum", "data": {"counts": dict(counts, extra=i)}}
+
+    def analyze_timeseries(i):
+        return "/analyze", {"type": "timeseries",
+                            "data": {"time": time_axis[:4096].tolist(), "values": (base_values[:4096] + i).tolist()}}
+
+    def visualize_series(i):
+        return "/visualize", {"type": "series", "format": "png",
+                              "data": {"time": time_axis.tolist(), "values": (base_values + i).tolist()}}
+
+    return {
+        "simulate.oscillator": simulate_oscillator,
+        "simulate.quantum": simulate_quantum,
+        "analyze.quantum": analyze_quantum,
+        "analyze.timeseries": analyze_timeseries,
+        "visualize.series": visualize_series,
+    }
+
+
+async def _drive(requests, concurrency, call):
+    """Esegue call(i) per i in range(requests) con al più concurrency chiamate in volo"""
+    latencies, errors = [], 0
+    next_index = iter(range(requests))
+
+    async def user():
+        nonlocal errors
+        for i in next_index:
+            t0 = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run(requests, concurrency, scenarios):
+    import httpx
+
+    from backend import auth
+    from backend.app import app
+    from backend.ml_integration import model_registry
+    from backend.visualization import render_service
+
+    for name in ('quantum_opt', 'math_solver'):
+        model_registry.register(name, _StubPipeline, size_mb=0)
+
+    user_key = auth.generate_user_key("benchuser")
+    token = auth.create_access_token({"sub": "benchuser"}, user_key=user_key)
+    headers = {"Authorization": f"Bearer {token}", "X-User-Key": user_key}
+    payloads = _payloads(np.random.default_rng(SEED))
+    results = {}
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in scenarios:
+                if name == "ws.oscillator":
+                    continue
+                build = payloads[name]
+
+                async def call(i, build=build):
+                    path, body = build(i)
+                    response = await client.post(path, json=body, headers=headers)
+                    return response.status_code == 200
+
+                await call(-1)  # Warm-up: import pigri, template dei grafici, worker dell'executor
+                results[name] = await _drive(requests, concurrency, call)
+
+        if "ws.oscillator" in scenarios:
+            async def stream_job(i):
+                # Una connessione per job: misura apertura, streaming dei chunk e chiusura
+                websocket = ASGIWebSocket(app, "/ws/simulate")
+                await websocket.connect()
+                try:
+                    await websocket.send_json({
+                        "type": "start", "job_id": f"bench-{i}", "section": "oscillator",
+                        "parameters": {"time_range": [0, 20], "k": 1.0 + i * 1e-6, "n_points": 2000}
+                    })
+                    while True:
+                        message = await websocket.receive_json()
+                        if message["type"] in ("done", "error"):
+                            return message["type"] == "done"
+                finally:
+                    await websocket.close()
+
+            await stream_job(-1)
+            results["ws.oscillator"] = await _drive(requests, concurrency, stream_job)
+    finally:
+        await app.router.shutdown()
+        render_service.shutdown()
+    return results
+
+
+def main(args):
+    # Configurazione fissata prima di importare l'app
+    os.environ.setdefault("SQLITE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="riqa-bench-"), "bench.db"))
+    os.environ["RIQA_EXECUTOR_MODE"] = args.executor
+    os.environ["RIQA_CACHE_ENABLED"] = "0"
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Scenari sconosciuti: {sorted(unknown)}. Disponibili: {', '.join(SCENARIOS)}")
+    results = asyncio.run(run(args.requests, args.concurrency, scenarios))
+    meta = environment(
+        suite="load", requests=args.requests, concurrency=args.concurrency,
+        executor=args.executor, seed=SEED
+    )
+    return {"meta": meta, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100, help="Richieste per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Utenti virtuali concorrenti")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--scenarios", help=f"Sottoinsieme separato da virgole di: {', '.join(SCENARIOS)}")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(finish(main(args), args))
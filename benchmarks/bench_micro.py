@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark delle funzioni calde del backend.
+Misura simulate_complex_system, RIQA_Core.simulate_quantum_entanglement (motore
+nativo e Aer), DataAnalyzer.analyze_quantum_results, il rendering di
+VisualizationEngine, auth.verify_user_key, il motore math, il lotto balistico e
+le forze N-corpi con Barnes-Hut, con la cache dei risultati disattivata e input
+generati da un seme fisso.
+
+Uso: python benchmarks/bench_micro.py --iterations 50 --output micro.json [--baseline base.json]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Prima degli import del backend: ogni iterazione deve calcolare davvero
+os.environ["RIQA_CACHE_ENABLED"] = "0"
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="riqa-bench-"), "bench.db"))
+
+import numpy as np
+
+from backend import auth, statevector
+from backend.analysis import DataAnalyzer
+from backend.astral import initial_state, tree_accelerations
+from backend.ballistics import simulate_ballistic_batch
+from backend.core import RIQA_Core
+from backend.math_engine import evaluate
+from backend.simulation import SimulationParameters, simulate_complex_system
+from backend.visualization import VisualizationEngine, render_service
+
+from harness import add_report_arguments, environment, finish, measure
+
+SEED = 1234
+
+
+def bench_simulation(iterations):
+    params = SimulationParameters(time_range=(0, 20), k=2.0, k3=0.3, initial_conditions=(1.0, 0.0))
+    return measure(lambda i: simulate_complex_system(params), iterations)
+
+
+def bench_quantum(iterations):
+    core = RIQA_Core()
+    params = {'n_qubits': 5, 'shots': 1024, 'gates': ['h', 'cx']}
+    results = {"quantum.native_5q": measure(lambda i: core.simulate_quantum_entanglement(params), iterations)}
+    previous = statevector.QUANTUM_BACKEND
+    statevector.QUANTUM_BACKEND = "aer"
+    try:
+        # Il primo giro (warm-up) transpila; le iterazioni misurano il percorso con circuito in cache
+        results["quantum.aer_5q"] = measure(lambda i: core.simulate_quantum_entanglement(params), iterations)
+    finally:
+        statevector.QUANTUM_BACKEND = previous
+    return results
+
+
+def bench_analysis(iterations):
+    rng = np.random.default_rng(SEED)
+    n_bits = 12
+    states = rng.integers(0, 2 ** n_bits, size=8192)
+    values, frequencies = np.unique(states, return_counts=True)
+    counts = {format(int(v), f"0{n_bits}b"): int(c) for v, c in zip(values, frequencies)}
+    return measure(lambda i: DataAnalyzer.analyze_quantum_results(counts), iterations)
+
+
+def bench_rendering(iterations):
+    rng = np.random.default_rng(SEED)
+    time = np.linspace(0, 100, 50_000)
+    values = np.sin(time) + 0.1 * rng.standard_normal(len(time))
+    base = {'time': time, 'values': values, 'x': values, 'y': np.cos(time)}
+    # Dati diversi a ogni iterazione: misura il rendering, non la cache delle immagini
+    cold = measure(lambda i: VisualizationEngine.plot_simulation_results(dict(base, values=values + i)), iterations)
+    cached = measure(lambda i: VisualizationEngine.plot_simulation_results(base), iterations)
+    circuit = measure(lambda i: VisualizationEngine.plot_quantum_circuit(f"q_0: ─H─■─ {i}"), iterations)
+    return {"render.series_cold": cold, "render.series_cached": cached, "render.circuit_cold": circuit}
+
+
+def bench_auth(iterations):
+    user_key = auth.generate_user_key("benchuser")
+    token = auth.create_access_token({"sub": "benchuser"}, user_key=user_key)
+    loop = asyncio.new_event_loop()
+
+    def verify(clear_cache):
+        if clear_cache:
+            auth.token_cache.invalidate_user("benchuser")
+        loop.run_until_complete(auth.verify_user_key(token, user_key))
+
+    try:
+        return {
+            "auth.verify_user_key_cold": measure(lambda i: verify(True), iterations),
+            "auth.verify_user_key_cached": measure(lambda i: verify(False), iterations),
+        }
+    finally:
+        loop.close()
+
+
+def bench_math(iterations):
+    x = np.linspace(-10, 10, 1_000_000)
+    expression = "sin(x)^2 + cos(x)^2 - exp(-x^2 / 2)"
+    return {
+        "math.scalar": measure(lambda i: evaluate("2^10 + sqrt(16) * pi"), iterations * 10),
+        "math.vector_1e6": measure(lambda i: evaluate(expression, {"x": x}), iterations),
+    }
+
+
+def bench_ballistics(iterations):
+    params = {
+        'samples': 20_000, 'seed': SEED, 'speed': {'mean': 250, 'std': 5}, 'angle_deg': {'mean': 35, 'std': 1},
+        'drag': {'low': 0.0005, 'high': 0.002}, 'wind': [3, 1, 0], 'wind_std': [1, 1, 0]
+    }
+    return measure(lambda i: simulate_ballistic_batch(params), max(1, iterations // 5))
+
+
+def bench_astral(iterations):
+    positions, _, masses = initial_state({'preset': 'plummer', 'n': 10_000, 'seed': SEED})
+    return measure(lambda i: tree_accelerations(positions, masses, softening=0.01), max(1, iterations // 5))
+
+
+def run(iterations):
+    results = {"simulate_complex_system": bench_simulation(iterations)}
+    results.update(bench_quantum(iterations))
+    results["analyze_quantum_results_12q"] = bench_analysis(iterations)
+    results.update(bench_rendering(iterations))
+    results.update(bench_auth(iterations * 10))
+    results.update(bench_math(iterations))
+    results["ballistic.monte_carlo_20k"] = bench_ballistics(iterations)
+    results["astral.tree_forces_10k"] = bench_astral(iterations)
+    render_service.shutdown()
+    return {"meta": environment(suite="micro", iterations=iterations, seed=SEED), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=30)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(finish(run(args.iterations), args))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark dell'avvio a freddo.
+Importa backend.app in processi Python nuovi e riporta tempo di import, RSS e
+sottosistemi pesanti caricati, con import pigri (RIQA_PRELOAD vuoto) e con tutti
+i sottosistemi pre-caricati (RIQA_PRELOAD=all, equivalente agli import eager).
+
+Uso: python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("qiskit", "qiskit_aer", "scipy", "matplotlib", "pandas", "transformers", "torch")
+
+# Eseguito in un interprete nuovo: nessun modulo già in cache
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import backend.app
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "import_s": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def probe(preload):
+    env = dict(os.environ, RIQA_PRELOAD=preload, PYTHONPATH=str(ROOT))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    report = {}
+    for label, preload in (("lazy", ""), ("preload_all", "all")):
+        samples = [probe(preload) for _ in range(runs)]
+        report[label] = {
+            "import_s_median": statistics.median(s["import_s"] for s in samples),
+            "import_s_min": min(s["import_s"] for s in samples),
+            "max_rss_mb_median": statistics.median(s["max_rss_mb"] for s in samples),
+            "heavy_modules": samples[-1]["heavy_modules"],
+        }
+    lazy, eager = report["lazy"], report["preload_all"]
+    report["speedup"] = eager["import_s_median"] / lazy["import_s_median"]
+    report["rss_saved_mb"] = eager["max_rss_mb_median"] - lazy["max_rss_mb_median"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
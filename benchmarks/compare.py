@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Confronto tra due report dei benchmark (bench_micro.py, bench_load.py).
+Stampa, per ogni benchmark comune, p95 e throughput a confronto e termina con
+codice 1 se ci sono regressioni oltre la tolleranza.
+
+Uso: python benchmarks/compare.py baseline.json current.json --tolerance 0.2
+"""
+import argparse
+import json
+import sys
+
+from harness import DEFAULT_TOLERANCE, compare
+
+
+def main(baseline_path, current_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    print(f"{'benchmark':<32} {'p95 base':>10} {'p95 now':>10} {'thr base':>10} {'thr now':>10}")
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if not reference or not result.get("count") or not reference.get("count"):
+            continue
+        print(f"{name:<32} {reference['p95_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+              f"{reference['throughput_per_s']:>10.1f} {result['throughput_per_s']:>10.1f}")
+    regressions = compare(current, baseline, tolerance)
+    for regression in regressions:
+        print(f"REGRESSIONE {regression['benchmark']}: {regression['metric']} "
+              f"{regression['baseline']:.3f} -> {regression['current']:.3f}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+    sys.exit(main(args.baseline, args.current, args.tolerance))
@@ -0,0 +1,127 @@
+"""
+Utilità condivise dai benchmark di AI_RIQA: misura delle latenze, riepilogo
+con throughput e percentili, metadati dell'ambiente e confronto con un report
+di riferimento (baseline) per segnalare le regressioni.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Tolleranza predefinita: oltre +20% di latenza p95 o -20% di throughput è una regressione
+DEFAULT_TOLERANCE = 0.2
+# Differenze di latenza sotto questa soglia sono rumore di misura, non regressioni
+MIN_DELTA_MS = 0.05
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Riepilogo di una serie di misure (latenze in secondi, elapsed = durata totale della serie)"""
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def measure(fn, iterations, warmup=1):
+    """Esegue fn iterations volte (dopo warmup esecuzioni scartate) e riassume le latenze"""
+    for i in range(warmup):
+        fn(-1 - i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment(**extra):
+    """Metadati per rendere confrontabili due report"""
+    return dict(
+        timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        commit=_git_commit(),
+        python=sys.version.split()[0],
+        numpy=np.__version__,
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        **extra
+    )
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Confronta due report ({"results": {nome: riepilogo}}); restituisce le regressioni:
+    p95 più alto o throughput più basso della baseline oltre la tolleranza.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference or not result.get("count") or not reference.get("count"):
+            continue
+        if (result["p95_ms"] > reference["p95_ms"] * (1 + tolerance)
+                and result["p95_ms"] - reference["p95_ms"] > MIN_DELTA_MS):
+            regressions.append({
+                "benchmark": name, "metric": "p95_ms",
+                "baseline": reference["p95_ms"], "current": result["p95_ms"]
+            })
+        if result["throughput_per_s"] < reference["throughput_per_s"] * (1 - tolerance):
+            regressions.append({
+                "benchmark": name, "metric": "throughput_per_s",
+                "baseline": reference["throughput_per_s"], "current": result["throughput_per_s"]
+            })
+        if result.get("errors", 0) > reference.get("errors", 0):
+            regressions.append({
+                "benchmark": name, "metric": "errors",
+                "baseline": reference.get("errors", 0), "current": result["errors"]
+            })
+    return regressions
+
+
+def add_report_arguments(parser):
+    parser.add_argument("--output", help="File JSON in cui scrivere il report")
+    parser.add_argument("--baseline", help="Report di riferimento con cui confrontare i risultati")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+
+def finish(report, args):
+    """Scrive il report, lo confronta con la baseline; restituisce il codice di uscita (1 se ci sono regressioni)"""
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline"] = {"path": args.baseline, "commit": baseline.get("meta", {}).get("commit")}
+        report["regressions"] = compare(report, baseline, args.tolerance)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+    return 1 if report.get("regressions") else 0
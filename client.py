@@ -6,37 +6,97 @@ import requests
 import websocket
 import json
 import uuid
+import numpy as np
+import msgpack
 
 SERVER_URL = "http://[TUO_SERVER_IP]:8000"  # Sostituisci con l'IP del server
 CLIENT_ID = str(uuid.uuid4())
 
-def run_remote_simulation(sim_type, params):
-    """Esegue una simulazione remota."""
+def _ndarray_hook(value):
+    """Gli array inviati in MessagePack diventano ndarray senza passare da liste Python"""
+    if value.get("__ndarray__") is True:
+        return np.frombuffer(value["data"], dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+    return value
+
+def decode_response(response):
+    """Decodifica una risposta JSON o MessagePack del server"""
+    if response.headers.get("content-type", "").startswith("application/msgpack"):
+        return msgpack.unpackb(response.content, object_hook=_ndarray_hook, raw=False)
+    return response.json()
+
+def run_remote_simulation(sim_type, params, token=None, user_key=None, binary=True):
+    """Esegue una simulazione remota; con binary=True gli array arrivano come ndarray."""
+    headers = {"Accept": "application/msgpack, application/json;q=0.5" if binary else "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if user_key:
+        headers["X-User-Key"] = user_key
     response = requests.post(
         f"{SERVER_URL}/simulate",
-        json={"sim_type": sim_type, "params": params, "client_id": CLIENT_ID}
+        json={"section": sim_type, "message": "", "parameters": params},
+        headers=headers
     )
-    return response.json()
+    return decode_response(response)
 
-def stream_simulation(sim_type, params):
-    """Stream dei risultati in tempo reale."""
-    ws = websocket.WebSocket()
-    ws.connect(f"ws://{SERVER_URL.split('//')[1]}/ws/simulation")
-    ws.send(json.dumps({"type": sim_type, "params": params, "client_id": CLIENT_ID}))
-    
-    while True:
+class SimulationStream:
+    """
+    Connessione di streaming: più job sullo stesso socket.
+    Ogni job riceve i propri messaggi; quelli di altri job restano in attesa.
+    """
+    def __init__(self, url=None):
+        self.ws = websocket.WebSocket()
+        self.ws.connect(url or f"ws://{SERVER_URL.split('//')[1]}/ws/simulate")
+        self._pending = {}
+
+    def start(self, section, params, job_id=None):
+        job_id = job_id or str(uuid.uuid4())
+        self._pending[job_id] = []
+        self.ws.send(json.dumps({"type": "start", "job_id": job_id, "section": section, "parameters": params}))
+        return job_id
+
+    def cancel(self, job_id):
+        self.ws.send(json.dumps({"type": "cancel", "job_id": job_id}))
+
+    def _next(self, job_id):
+        queue = self._pending.setdefault(job_id, [])
+        while not queue:
+            message = json.loads(self.ws.recv())
+            self._pending.setdefault(message.get("job_id"), []).append(message)
+        return queue.pop(0)
+
+    def chunks(self, job_id):
+        """Genera i dati parziali del job fino a done/cancelled; solleva RuntimeError su error"""
         try:
-            message = ws.recv()
-            print(json.loads(message))
-        except:
-            break
-    ws.close()
+            while True:
+                message = self._next(job_id)
+                kind = message.get("type")
+                if kind == "chunk":
+                    yield message["data"]
+                elif kind in ("done", "cancelled"):
+                    return
+                elif kind == "error":
+                    raise RuntimeError(message.get("message"))
+        finally:
+            self._pending.pop(job_id, None)
+
+    def close(self):
+        self.ws.close()
+
+def stream_simulation(sim_type, params, on_chunk=print):
+    """Stream dei risultati in tempo reale: on_chunk riceve ogni risultato parziale."""
+    stream = SimulationStream()
+    try:
+        job_id = stream.start(sim_type, params)
+        for data in stream.chunks(job_id):
+            on_chunk(data)
+    finally:
+        stream.close()
 
 if __name__ == "__main__":
     # Test simulazione remota
-    result = run_remote_simulation("math", {"equation": "harmonic"})
+    result = run_remote_simulation("oscillator", {"time_range": (0, 10), "k": 2.0})
     print("Risultato Remoto:", result)
     
     # Test streaming
     print("Streaming simulazione quantistica:")
-    stream_simulation("quantum", {"n_qubits": 2})
\ No newline at end of file
+    stream_simulation("quantum", {"n_qubits": 2, "shots": 2048})
\ No newline at end of file
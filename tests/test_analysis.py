@@ -0,0 +1,94 @@
+# tests/test_analysis.py
+import numpy as np
+import pytest
+from scipy import stats
+
+from backend.analysis import DataAnalyzer, counts_to_array
+
+
+def _reference(counts):
+    states, values = list(counts), list(counts.values())
+    return {
+        'entropy': stats.entropy(values, base=2),
+        'uniformity': stats.chisquare(values).pvalue,
+        'dominant_state': states[np.argmax(values)],
+        'dominance_ratio': max(values) / sum(values)
+    }
+
+
+def test_batch_matches_scipy_reference():
+    rng = np.random.default_rng(0)
+    batch = [
+        {'00 00': 510, '11 00': 514},
+        {format(i, '010b'): int(c) for i, c in enumerate(rng.integers(1, 50, 1024))},
+        {},
+        {'1': 7},
+        {'01': 3, '10': 5, '11': 5},
+    ]
+    results = DataAnalyzer.analyze_quantum_batch(batch)
+    assert results[2]['dominant_state'] is None
+    for counts, result in zip(batch, results):
+        if not counts:
+            continue
+        expected = _reference(counts)
+        assert result['dominant_state'] == expected['dominant_state']
+        assert result['entropy'] == pytest.approx(expected['entropy'])
+        assert result['dominance_ratio'] == pytest.approx(expected['dominance_ratio'])
+        np.testing.assert_allclose(result['uniformity'], expected['uniformity'])
+
+
+def test_counts_to_array_dense_and_sparse():
+    counts = {'101 0': 4, '000 0': 1, '111 1': 2}
+    dense = counts_to_array(counts)
+    assert dense['n_bits'] == 4 and dense['values'].shape == (16,)
+    assert dense['values'][0b1010] == 4 and dense['values'][0b1111] == 2
+    sparse = counts_to_array(counts, dense=False)
+    np.testing.assert_array_equal(sparse['indices'], [0, 0b1010, 0b1111])
+    np.testing.assert_array_equal(sparse['values'], [1, 4, 2])
+    assert counts_to_array({'0x5': 3, '0x1': 1}, dense=False)['indices'].tolist() == [1, 5]
+    with pytest.raises(ValueError):
+        counts_to_array({'ab': 1})
+
+
+def test_statistics_are_indexed_by_bitstring():
+    # Stesso istogramma in ordine diverso: il pareggio va al bitstring più basso, non alla prima chiave
+    forward = DataAnalyzer.analyze_quantum_results({'11': 5, '01': 5, '10': 2})
+    backward = DataAnalyzer.analyze_quantum_results({'10': 2, '01': 5, '11': 5})
+    assert forward == backward and forward['dominant_state'] == '01'
+    labels = DataAnalyzer.analyze_quantum_results({'alto': 1, 'basso': 3})
+    assert labels['dominant_state'] == 'basso' and labels['dominance_ratio'] == 0.75
+
+
+def test_chunked_time_series_matches_in_memory():
+    t = np.linspace(0, 40, 500)
+    data = {'time': t, 'position': np.sin(1.3 * t) + 0.1 * np.cos(7 * t), 'velocity': np.cos(0.4 * t) ** 3}
+    full = DataAnalyzer.time_series_analysis(data, max_lag=40, nperseg=64)
+    chunks = ({k: v[i:i + 37] for k, v in data.items()} for i in range(0, len(t), 37))
+    streamed = DataAnalyzer.time_series_analysis_chunked(chunks, max_lag=40, nperseg=64)
+    np.testing.assert_allclose(streamed['spectrum']['frequency'], full['spectrum']['frequency'])
+    for column in ('position', 'velocity'):
+        np.testing.assert_allclose(streamed['autocorrelation'][column], full['autocorrelation'][column], atol=1e-10)
+        np.testing.assert_allclose(streamed['spectrum'][column], full['spectrum'][column], rtol=1e-8, atol=1e-12)
+        for name, value in full['moments'][column].items():
+            assert streamed['moments'][column][name] == pytest.approx(value)
+    assert full['moments']['position']['skewness'] == pytest.approx(stats.skew(data['position']))
+    assert full['fft_analysis'].shape == (500, 2)
+
+
+def test_chunked_time_series_from_memmapped_npy(tmp_path):
+    series = np.random.default_rng(3).normal(size=(20000, 2)).cumsum(axis=0)
+    path = tmp_path / "series.npy"
+    np.save(path, series)
+    streamed = DataAnalyzer.time_series_analysis_chunked(str(path), max_lag=10, chunk_size=999)
+    full = DataAnalyzer.time_series_analysis(series, max_lag=10)
+    assert streamed['columns'] == ['col_0', 'col_1']
+    np.testing.assert_allclose(streamed['autocorrelation']['col_1'], full['autocorrelation']['col_1'], atol=1e-9)
+    np.testing.assert_allclose(streamed['spectrum']['col_0'], full['spectrum']['col_0'], rtol=1e-8)
+
+
+def test_chunked_time_series_rejects_empty_input(tmp_path):
+    path = tmp_path / "empty.npy"
+    np.save(path, np.zeros((0, 2)))
+    for source in (iter([]), str(path)):
+        with pytest.raises(ValueError, match="vuota"):
+            DataAnalyzer.time_series_analysis_chunked(source)
@@ -0,0 +1,119 @@
+# tests/test_astral.py
+import time
+
+import numpy as np
+import pytest
+
+from backend import astral
+from backend.astral import (
+    AstralError, OctTree, SnapshotNotFound, cleanup_snapshots, direct_accelerations, initial_state,
+    load_snapshots, simulate_nbody, snapshot_path, tree_accelerations
+)
+from backend.core import RIQA_Core
+
+
+def test_tree_forces_match_direct_sum():
+    positions, _, masses = initial_state({'preset': 'plummer', 'n': 3000, 'seed': 5})
+    exact, exact_phi = direct_accelerations(positions, masses, softening=0.01, potential=True)
+    approx, approx_phi = tree_accelerations(positions, masses, softening=0.01, potential=True)
+    error = np.linalg.norm(approx - exact, axis=0) / np.linalg.norm(exact, axis=0)
+    assert np.median(error) < 2e-3 and np.percentile(error, 99) < 2e-2
+    np.testing.assert_allclose(approx_phi, exact_phi, rtol=5e-3)
+    # Con theta = 0 nessun nodo è approssimato: coincide con la somma diretta
+    np.testing.assert_allclose(tree_accelerations(positions, masses, softening=0.01, theta=0), exact,
+                               rtol=1e-9, atol=1e-12)
+
+
+def test_tree_handles_degenerate_configurations():
+    rng = np.random.default_rng(0)
+    positions = np.repeat(rng.normal(size=(3, 10)), 5, axis=1)  # Corpi coincidenti a cinque a cinque
+    masses = np.r_[np.zeros(5), np.ones(45)]
+    tree = OctTree(positions, masses, leaf_size=4)
+    assert tree.end[0] - tree.start[0] == 50 and np.isfinite(tree.com).all()
+    for softening in (0.0, 0.1):
+        exact = direct_accelerations(positions, masses, softening=softening)
+        np.testing.assert_allclose(tree_accelerations(positions, masses, softening=softening, leaf_size=4),
+                                   exact, rtol=1e-6, atol=1e-9)
+    assert np.all(tree_accelerations(np.zeros((3, 1)), np.ones(1)) == 0)
+
+
+def test_figure_eight_is_periodic_and_conservative():
+    result = simulate_nbody({'preset': 'figure_eight', 'dt': 1e-3, 'steps': 6326})
+    assert result['method'] == 'direct'
+    np.testing.assert_allclose(result['positions'][:, 0], [0.97000436, -0.24308753, 0.0], atol=1e-3)
+    assert result['energy']['relative_drift'] < 1e-8
+    np.testing.assert_allclose(result['momentum']['final'], 0.0, atol=1e-12)
+
+
+def test_kepler_orbit_elements_and_tree_integration():
+    result = simulate_nbody({'preset': 'two_body', 'eccentricity': 0.5, 'satellite_mass': 1e-3,
+                             'dt': 1e-3, 'steps': 3000, 'method': 'tree'})
+    elements = result['orbital_elements']
+    assert elements['central'] == 0
+    assert elements['semi_major_axis'][1] == pytest.approx(1.0, rel=1e-4)
+    assert elements['eccentricity'][1] == pytest.approx(0.5, rel=1e-4)
+    assert elements['period'][1] == pytest.approx(2 * np.pi / np.sqrt(1.001), rel=1e-4)
+
+
+def test_snapshots_are_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(astral, 'ASTRAL_SNAPSHOT_DIR', str(tmp_path))
+    result = simulate_nbody({'preset': 'plummer', 'n': 500, 'seed': 2, 'softening': 0.05, 'dt': 0.01,
+                             'steps': 20, 'snapshot_every': 5})
+    snapshots = result['snapshots']
+    assert snapshots['count'] == 5
+    np.testing.assert_allclose(snapshots['times'], [0, 0.05, 0.1, 0.15, 0.2])
+    assert 'path' not in snapshots and [p.name for p in tmp_path.iterdir()] == [f"astral_{snapshots['id']}.npy"]
+    stored = load_snapshots(snapshots['id'])
+    assert isinstance(stored, np.memmap) and stored.shape == (5, 6, 500)
+    np.testing.assert_allclose(stored[-1, :3], result['positions'])
+    np.testing.assert_allclose(stored[-1, 3:], result['velocities'])
+    assert result['energy']['relative_drift'] < 1e-3
+    monkeypatch.setattr(astral, 'ASTRAL_SNAPSHOT_MAX_MB', 1)
+    with pytest.raises(AstralError):
+        simulate_nbody({'preset': 'plummer', 'n': 500, 'steps': 100, 'snapshot_every': 1})
+
+
+def test_snapshots_expire_and_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(astral, 'ASTRAL_SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(astral, 'ASTRAL_SNAPSHOT_MAX_FILES', 2)
+    params = {'preset': 'figure_eight', 'steps': 4, 'snapshot_every': 2}
+    ids = [simulate_nbody(params)['snapshots']['id'] for _ in range(3)]
+    # Solo gli ultimi due file restano su disco
+    assert len(list(tmp_path.iterdir())) == 2
+    with pytest.raises(SnapshotNotFound):
+        snapshot_path(ids[0])
+    assert load_snapshots(ids[2]).shape == (3, 6, 3)
+    for bad in ('../etc/passwd', ids[2].upper(), ids[2][:12]):
+        with pytest.raises(SnapshotNotFound):
+            snapshot_path(bad)
+    monkeypatch.setattr(astral, 'ASTRAL_SNAPSHOT_TTL', 60)
+    assert cleanup_snapshots(now=time.time() + 120) == 2 and not list(tmp_path.iterdir())
+
+
+def test_requests_over_the_cost_budget_are_rejected(monkeypatch):
+    monkeypatch.setattr(astral, 'ASTRAL_MAX_COST', 1e9)
+    simulate_nbody({'preset': 'figure_eight', 'steps': 1000})
+    for params in ({'preset': 'plummer', 'n': 5000, 'steps': 100, 'method': 'direct'},
+                   {'preset': 'plummer', 'n': 200000, 'steps': 10},
+                   {'preset': 'plummer', 'n': 20000, 'steps': 10, 'method': 'tree', 'theta': 0}):
+        with pytest.raises(AstralError, match="troppo costosa"):
+            simulate_nbody(params)
+    # L'albero costa meno della somma diretta a parità di corpi e passi
+    assert astral.estimated_cost(100000, 10, 'tree') < astral.estimated_cost(100000, 10, 'direct') / 10
+
+
+def test_invalid_parameters_and_core_section():
+    with pytest.raises(AstralError):
+        initial_state({'preset': 'galassia'})
+    with pytest.raises(AstralError):
+        initial_state({'positions': [[0, 0, 0], [1, 0, 0]], 'masses': [1, 2, 3]})
+    with pytest.raises(AstralError):
+        simulate_nbody({'preset': 'figure_eight', 'dt': 0})
+    core = RIQA_Core()
+    response = core.process_message("figure_eight", 'astral', None)
+    assert response['status'] == 'success' and response['result']['n_bodies'] == 3
+    response = core.process_message({'positions': [[0, 0, 0], [1, 0, 0]], 'masses': [1, 1], 'steps': 10},
+                                    'astral', None)
+    assert response['status'] == 'success'
+    np.testing.assert_allclose(response['result']['momentum']['final'], 0.0, atol=1e-12)
+    assert core.process_message("pianeti", 'astral', None)['status'] == 'error'
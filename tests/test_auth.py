@@ -0,0 +1,80 @@
+# tests/test_auth.py
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from backend import auth, database
+
+
+def verify(token, key):
+    return asyncio.run(auth.verify_user_key(token=token, x_user_key=key))
+
+
+def test_verified_pairs_are_cached_and_invalidated_on_rotation():
+    key = auth.generate_user_key("carol")
+    token = auth.create_access_token({"sub": "carol"}, user_key=key)
+    assert auth.validate_user_key(key)
+    assert verify(token, key).username == "carol"
+    assert auth.token_cache.get(token, key) is not None
+
+    new_key = auth.generate_user_key("carol")
+    assert auth.token_cache.get(token, key) is None
+    assert not auth.validate_user_key(key)
+    with pytest.raises(HTTPException):
+        verify(token, key)
+    assert verify(token, new_key).username == "carol"
+
+
+def test_key_of_another_user_is_rejected():
+    mallory_key = auth.generate_user_key("mallory")
+    auth.generate_user_key("dave")
+    token = auth.create_access_token({"sub": "dave"}, user_key=mallory_key)
+    with pytest.raises(HTTPException):
+        verify(token, mallory_key)
+
+
+def test_database_persistence_survives_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "keys.db"))
+    first = auth.UserKeyStore(auth.DatabaseKeyPersistence())
+    first.set("erin", "ak_one_1_9999999999", 9999999999)
+    first.set("erin", "ak_two_1_9999999999", 9999999999)
+
+    restarted = auth.UserKeyStore(auth.DatabaseKeyPersistence())
+    assert restarted.get("erin") == "ak_two_1_9999999999"
+    assert restarted.lookup("ak_two_1_9999999999") == ("erin", 9999999999)
+    assert restarted.lookup("ak_one_1_9999999999") is None
+    database.close()
+
+
+def test_key_lookup_miss_reads_persistence_off_loop():
+    class Persistence:
+        threads = []
+
+        def find(self, key):
+            self.threads.append(threading.current_thread())
+            return ("frank", 9999999999) if key == "ak_frank" else None
+
+    store = auth.UserKeyStore(Persistence())
+    assert asyncio.run(store.lookup_async("ak_frank")) == ("frank", 9999999999)
+    assert asyncio.run(store.lookup_async("ak_nobody")) is None
+    assert Persistence.threads and threading.main_thread() not in Persistence.threads
+    # Chiave ormai in memoria: nessuna nuova lettura
+    assert asyncio.run(store.lookup_async("ak_frank")) == ("frank", 9999999999)
+    assert len(Persistence.threads) == 2
+
+
+def test_password_hasher_runs_off_loop_with_backpressure():
+    hasher = auth.PasswordHasher(workers=1, max_pending=1)
+
+    async def scenario():
+        hashed = await hasher.hash("secret")
+        assert await hasher.verify("secret", hashed)
+        first = asyncio.ensure_future(hasher.verify("secret", hashed))
+        await asyncio.sleep(0)
+        with pytest.raises(auth.PasswordHasherBusy):
+            await hasher.hash("other")
+        return await first
+
+    assert asyncio.run(scenario())
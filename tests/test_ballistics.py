@@ -0,0 +1,126 @@
+# tests/test_ballistics.py
+import asyncio
+
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+
+from backend.ballistics import (
+    GRAVITY, BallisticError, BallisticService, integrate_launches, sample_launches, simulate_ballistic_batch
+)
+from backend.core import RIQA_Core
+from backend.executor import SimulationExecutor
+
+
+def test_vacuum_batch_matches_closed_form():
+    angles = np.array([15.0, 30.0, 45.0, 60.0])
+    result = simulate_ballistic_batch({
+        'samples': 4, 'speed': 120.0, 'angle_deg': angles.tolist(), 'return_impacts': True
+    })
+    impacts = result['impacts']
+    elevation = np.radians(angles)
+    np.testing.assert_allclose(impacts['x'], 120.0 ** 2 * np.sin(2 * elevation) / GRAVITY, rtol=1e-9)
+    np.testing.assert_allclose(impacts['time'], 2 * 120.0 * np.sin(elevation) / GRAVITY, rtol=1e-9)
+    np.testing.assert_allclose(impacts['angle_deg'], angles, atol=1e-6)
+    assert result['statistics']['landed'] == 4
+
+
+def test_quadratic_drag_and_wind_match_reference_integrator():
+    k, wind = 0.002, np.array([5.0, -2.0, 0.0])
+    speed, elevation, azimuth, height = 200.0, np.radians(40), np.radians(10), 1.5
+
+    def rhs(t, s):
+        relative = s[3:] - wind
+        acceleration = -k * np.linalg.norm(relative) * relative
+        acceleration[2] -= GRAVITY
+        return np.r_[s[3:], acceleration]
+
+    def ground(t, s):
+        return s[2]
+    ground.terminal, ground.direction = True, -1
+    v0 = [speed * np.cos(elevation) * np.cos(azimuth), speed * np.cos(elevation) * np.sin(azimuth),
+          speed * np.sin(elevation)]
+    reference = solve_ivp(rhs, (0, 100), [0, 0, height, *v0], events=ground, rtol=1e-12, atol=1e-12)
+    expected = reference.y_events[0][0]
+
+    impacts = simulate_ballistic_batch({
+        'speed': speed, 'angle_deg': 40, 'azimuth_deg': 10, 'height': height, 'drag': k,
+        'wind': wind.tolist(), 'return_impacts': True
+    })['impacts']
+    assert np.hypot(impacts['x'][0] - expected[0], impacts['y'][0] - expected[1]) < 1e-3
+    assert abs(impacts['time'][0] - reference.t_events[0][0]) < 1e-5
+
+
+@pytest.mark.parametrize("speed, angle_deg, height, k", [
+    (300.0, 80.0, 0.0, 0.05),  # Resistenza forte: passo limitato dal tempo di smorzamento
+    (1.0, 45.0, 1000.0, 0.1),  # Caduta da quota a velocità limite: molto più lunga del volo nel vuoto
+])
+def test_strong_drag_matches_reference_integrator(speed, angle_deg, height, k):
+    elevation = np.radians(angle_deg)
+
+    def rhs(t, s):
+        acceleration = -k * np.linalg.norm(s[3:]) * s[3:]
+        acceleration[2] -= GRAVITY
+        return np.r_[s[3:], acceleration]
+
+    def ground(t, s):
+        return s[2]
+    ground.terminal, ground.direction = True, -1
+    start = [0, 0, height, speed * np.cos(elevation), 0, speed * np.sin(elevation)]
+    reference = solve_ivp(rhs, (0, 1000), start, events=ground, method='DOP853', rtol=1e-12, atol=1e-12)
+
+    impacts = simulate_ballistic_batch({
+        'speed': speed, 'angle_deg': angle_deg, 'height': height, 'drag': k, 'return_impacts': True
+    })['impacts']
+    assert impacts['landed'][0]
+    assert impacts['time'][0] == pytest.approx(reference.t_events[0][0], rel=1e-4)
+    assert impacts['x'][0] == pytest.approx(reference.y_events[0][0][0], rel=1e-4)
+    assert impacts['max_height'][0] == pytest.approx(reference.y[2].max(), rel=1e-3)
+
+
+def test_monte_carlo_statistics_and_kept_trajectories():
+    result = simulate_ballistic_batch({
+        'samples': 5000, 'seed': 7, 'speed': {'mean': 250, 'std': 5}, 'angle_deg': {'low': 30, 'high': 40},
+        'drag': 0.001, 'wind': [3, 1, 0], 'wind_std': [1, 1, 0], 'keep_trajectories': 3
+    })
+    stats = result['statistics']
+    assert stats['landed'] == 5000 and stats['airborne'] == 0
+    assert stats['range']['p05'] < stats['range']['p50'] < stats['range']['p95']
+    assert 0 < stats['cep50'] < stats['r95']
+    assert 'impacts' not in result
+    z = result['trajectories']['z']
+    assert z.shape[1] == 3
+    # Ogni traiettoria conservata termina al suolo e poi resta vuota
+    assert np.all(np.nanmin(z, axis=0) == 0.0)
+
+
+def test_split_batch_matches_single_process():
+    params = {'samples': 3000, 'seed': 3, 'speed': {'mean': 150, 'std': 10}, 'angle_deg': 45, 'drag': 0.0015,
+              'return_impacts': True}
+    single = simulate_ballistic_batch(params)
+    executor = SimulationExecutor(mode="thread", max_workers=3, max_queue=4)
+    try:
+        service = BallisticService(executor, split_samples=1000)
+        assert service.parts_for(3000) == 3 and service.handles(params) and not service.handles({'samples': 'x'})
+        response = asyncio.run(service.simulate(params))
+        # Stessa forma di errore del percorso ordinario (RIQA_Core.process_message)
+        invalid = asyncio.run(service.simulate(dict(params, speed=[100, 200])))
+    finally:
+        executor.shutdown()
+    assert response['status'] == 'success' and invalid['status'] == 'error'
+    assert invalid['result'] == "'speed' ha 2 valori, attesi 3000"
+    split = response['result']
+    np.testing.assert_allclose(split['impacts']['x'], single['impacts']['x'])
+    assert split['statistics']['cep50'] == pytest.approx(single['statistics']['cep50'])
+
+
+def test_invalid_parameters_and_core_section():
+    with pytest.raises(BallisticError):
+        sample_launches({'samples': 3, 'speed': [100, 200]})
+    with pytest.raises(BallisticError):
+        sample_launches({'speed': -1})
+    launches = sample_launches({'samples': 2, 'speed': 50, 'angle_deg': -10, 'height': 10})
+    assert integrate_launches(launches)['impacts']['landed'].all()
+    response = RIQA_Core().process_message({'samples': 100, 'seed': 1, 'speed': 80}, 'ballistic', None)
+    assert response['status'] == 'success'
+    assert response['result']['statistics']['landed'] == 100
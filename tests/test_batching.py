@@ -0,0 +1,82 @@
+# tests/test_batching.py
+import asyncio
+from types import SimpleNamespace
+
+from backend import ml_integration
+from backend.ml_integration import AIModelHub
+from backend.model_registry import ModelRegistry
+
+
+class BatchEchoPipeline:
+    """Pipeline locale che registra la dimensione di ogni batch ricevuto"""
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, prompts, batch_size=1, **kwargs):
+        self.batch_sizes.append(len(prompts))
+        return [[{'generated_text': p.upper()}] for p in prompts]
+
+
+def test_concurrent_prompts_share_one_batch():
+    pipeline = BatchEchoPipeline()
+    registry = ModelRegistry()
+    registry.register('math_solver', lambda: pipeline)
+    hub = AIModelHub(registry, batch_config={'math_solver': {'max_batch_size': 4, 'max_wait_ms': 50}})
+
+    async def scenario():
+        return await asyncio.gather(*(hub.solve_math_expression_async(f"x{i}") for i in range(6)))
+
+    results = asyncio.run(scenario())
+    assert [r['solution'] for r in results] == [f"X{i}" for i in range(6)]
+    assert pipeline.batch_sizes == [4, 2]
+    stats = hub.batch_stats()['math_solver']
+    assert stats['batches'] == 2
+    assert stats['fill_rate'] == 6 / 8
+
+
+class Tokenizer:
+    def __init__(self, pad_token=None):
+        self.eos_token = '</s>'
+        self.pad_token = pad_token
+        self.padding_side = 'right'
+
+    @property
+    def pad_token_id(self):
+        return None if self.pad_token is None else 0
+
+
+class UnpaddedPipeline(BatchEchoPipeline):
+    """Come le pipeline di transformers: niente batching senza pad_token"""
+    def __init__(self, tokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+
+    def __call__(self, prompts, batch_size=1, **kwargs):
+        if batch_size > 1 and self.tokenizer.pad_token_id is None:
+            raise ValueError("Pipeline with tokenizer without pad_token cannot do batching")
+        return super().__call__(prompts, batch_size, **kwargs)
+
+
+def _burst(hub, n=3):
+    async def scenario():
+        return await asyncio.gather(*(hub.optimize_quantum_circuit_async(f"c{i}") for i in range(n)))
+    return asyncio.run(scenario())
+
+
+def test_tokenizer_without_pad_token_falls_back_to_single_prompts():
+    pipeline = UnpaddedPipeline(Tokenizer())
+    registry = ModelRegistry()
+    registry.register('quantum_opt', lambda: pipeline)
+    hub = AIModelHub(registry, batch_config={'quantum_opt': {'max_batch_size': 4, 'max_wait_ms': 50}})
+    assert len(_burst(hub)) == 3
+
+
+def test_text_generation_factory_sets_pad_token(monkeypatch):
+    pipeline = UnpaddedPipeline(Tokenizer())
+    monkeypatch.setattr(ml_integration, 'transformers', SimpleNamespace(pipeline=lambda task, model: pipeline))
+    registry = ModelRegistry()
+    registry.register('quantum_opt', ml_integration._pipeline_factory('text-generation', 'stand-in'))
+    hub = AIModelHub(registry, batch_config={'quantum_opt': {'max_batch_size': 4, 'max_wait_ms': 50}})
+    assert len(_burst(hub)) == 3
+    assert pipeline.tokenizer.pad_token == '</s>' and pipeline.tokenizer.padding_side == 'left'
+    assert pipeline.batch_sizes == [3]
@@ -0,0 +1,45 @@
+# tests/test_cache.py
+from backend.cache import ResultCache, canonical_key
+from backend.simulation import SimulationParameters
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_canonical_key_normalizes_parameters():
+    a = canonical_key('oscillator', SimulationParameters(k=2, time_range=(0, 5)))
+    b = canonical_key('oscillator', {'m': 1.0, 'k': 2.0, 'k3': 0.0,
+                                     'initial_conditions': [1.0, 0.0], 'time_range': [0.0, 5.0]})
+    assert a == b
+    assert a != canonical_key('quantum', {'k': 2.0})
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=200)
+    cache.set('a', 'x' * 80)
+    cache.set('b', 'y' * 80)
+    cache.get('a')
+    cache.set('c', 'z' * 80)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a')[0] and cache.get('c')[0]
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+    assert stats['bytes'] <= 200
+
+
+def test_shared_tier_between_processes():
+    shared = FakeRedis()
+    worker_a = ResultCache(redis_client=shared)
+    worker_b = ResultCache(redis_client=shared)
+    worker_a.set('key', {'counts': {'00': 3}})
+    assert worker_b.get('key') == (True, {'counts': {'00': 3}})
+    assert worker_b.stats()['redis_hits'] == 1
@@ -0,0 +1,44 @@
+# tests/test_core.py
+import subprocess
+import sys
+
+from backend import quantum_interface, statevector
+from backend.core import RIQA_Core
+
+
+def test_default_warm_up_targets_the_aer_path(monkeypatch):
+    core = RIQA_Core()
+    assert core.warm_up() == [17, 18, 19, 20]
+    assert len(core._transpiled) == 4 and core._backend is not None
+    monkeypatch.setattr(statevector, "QUANTUM_BACKEND", "native")
+    assert RIQA_Core().warm_up() == []
+    monkeypatch.setattr(statevector, "QUANTUM_BACKEND", "aer")
+    assert RIQA_Core().warm_up() == [2, 3, 4, 5]
+
+
+def test_aer_path_reuses_backend_and_transpiled_circuits(monkeypatch):
+    monkeypatch.setattr(statevector, "QUANTUM_BACKEND", "aer")
+    core = RIQA_Core()
+    core.warm_up([(3, ['h', 'cx'])])
+    assert len(core._transpiled) == 1
+    backend = core.backend
+
+    first = core.sample_quantum_entanglement({'n_qubits': 3, 'shots': 64})
+    second = core.sample_quantum_entanglement({'n_qubits': 3, 'shots': 128})
+    assert len(core._transpiled) == 1
+    assert core.backend is backend
+    assert sum(first['counts'].values()) == 64
+    assert sum(second['counts'].values()) == 128
+    assert set(second['counts']) <= {'000 000', '011 000'}
+
+
+def test_quantum_interface_uses_core_backend_and_lazy_qiskit(monkeypatch):
+    probe = "import sys, backend.quantum_interface; print('qiskit' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True,
+                          check=True).stdout.strip() == "False"
+    monkeypatch.setattr(statevector, "QUANTUM_BACKEND", "aer")
+    counts = quantum_interface.run_advanced_quantum_sim.__wrapped__({'n_qubits': 3})
+    core = quantum_interface._shared_core()
+    assert sum(counts.values()) == 1024 and len(core._transpiled) == 1
+    quantum_interface.run_advanced_quantum_sim.__wrapped__({'n_qubits': 3})
+    assert len(core._transpiled) == 1 and quantum_interface._shared_core() is core
@@ -0,0 +1,107 @@
+# tests/test_database.py
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import pytest
+
+from backend import database
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "riqa.db"))
+    database.init_db()
+    yield
+    database.close()
+
+
+def count_experiments():
+    with database.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM experiments").fetchone()[0]
+
+
+def test_pool_reuses_one_wal_connection_per_thread(sqlite_db):
+    with database.connection() as first:
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    with database.connection() as second:
+        assert second is first
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_pool().acquire()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+    assert database.get_pool().stats()['opened'] == 2
+
+
+def test_buffered_writer_flushes_on_size_and_close(sqlite_db):
+    writer = database.ExperimentWriter(batch_size=3, flush_interval=60)
+    for i in range(4):
+        writer.add('oscillator', {'k': i}, {'ok': True})
+    assert count_experiments() == 3
+    assert writer.pending == 1
+    writer.close()
+    assert count_experiments() == 4
+
+
+def test_structured_storage_roundtrip(sqlite_db):
+    trajectory = {'time': np.linspace(0, 10, 100), 'position': list(np.cos(np.linspace(0, 10, 100))), 'label': 'ok'}
+    database.save_simulation('oscillator', {'message': {'n_qubits': 3}}, trajectory, user_id='alice')
+    with database.connection() as conn:
+        row_id, n_qubits = conn.execute("SELECT id, n_qubits FROM experiments").fetchone()
+    assert n_qubits == 3
+
+    record = database.load_experiment(row_id)
+    assert record['user_id'] == 'alice'
+    assert record['parameters'] == {'message': {'n_qubits': 3}}
+    assert record['result']['label'] == 'ok'
+    np.testing.assert_array_equal(record['result']['time'], trajectory['time'])
+    np.testing.assert_array_equal(record['result']['position'], trajectory['position'])
+    assert not record['result']['time'].flags.writeable
+
+
+def test_migrate_legacy_rows(sqlite_db):
+    with database.connection() as conn:
+        conn.execute(
+            "INSERT INTO experiments (type, parameters, result) VALUES (?, ?, ?)",
+            ('quantum', str({'n_qubits': 2}), str({'counts': {'00': 5}, 'energy': [0.5] * 20}))
+        )
+    assert database.migrate_experiments() == 1
+    assert database.migrate_experiments() == 0
+    record = database.load_experiment(1)
+    assert record['n_qubits'] == 2
+    assert record['result']['counts'] == {'00': 5}
+    np.testing.assert_array_equal(record['result']['energy'], [0.5] * 20)
+
+
+def test_buffered_writer_keeps_rows_when_insert_fails(sqlite_db, monkeypatch):
+    writer = database.ExperimentWriter(batch_size=100, flush_interval=0.05)
+    healthy = database.connection
+
+    @contextmanager
+    def broken():
+        raise sqlite3.OperationalError("database is locked")
+        yield
+    monkeypatch.setattr(database, "connection", broken)
+    writer.add('oscillator', {'k': 1}, {'ok': True})
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush()
+    assert writer.pending == 1 and writer.flushed == 0
+    time.sleep(0.2)
+    # Il thread del writer sopravvive ai fallimenti e continua a riprovare
+    assert writer._thread.is_alive() and writer.failures >= 2
+    writer.add('oscillator', {'k': 2}, {'ok': True})
+    monkeypatch.setattr(database, "connection", healthy)
+    deadline = time.monotonic() + 2
+    while writer.pending and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert writer.flushed == 2
+    with database.connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT params_json FROM experiments ORDER BY id")] == [
+            '{"k": 1}', '{"k": 2}'
+        ]
+    writer.close()
@@ -0,0 +1,35 @@
+# tests/test_encoding.py
+import numpy as np
+import pytest
+
+from backend.core import RIQA_Core
+from backend.encoding import JSON, MSGPACK, OCTET_STREAM, decode, encode, encoded_response, negotiate
+
+
+def test_negotiate_accept_header():
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("application/x-msgpack") == MSGPACK
+    assert negotiate("text/html, application/octet-stream;q=0.8, application/msgpack;q=0.9") == MSGPACK
+    assert negotiate("application/msgpack;q=0, text/plain") == JSON
+
+
+@pytest.mark.parametrize("media_type", [MSGPACK, OCTET_STREAM])
+def test_binary_formats_roundtrip_numpy_arrays(media_type):
+    result = RIQA_Core().run_simulation('oscillator', {'time_range': (0, 5), 'k': 2.0})
+    content = {'status': 'success', 'result': result, 'count': np.int64(3)}
+    decoded = decode(encode(content, media_type), media_type)
+    position = decoded['result']['result']['position']
+    assert isinstance(position, np.ndarray) and position.dtype == np.float64
+    np.testing.assert_array_equal(position, result['result']['position'])
+    assert decoded['count'] == 3
+
+
+def test_json_stays_default_and_sweeps_are_binary_friendly():
+    sweep = RIQA_Core().run_simulation('oscillator', {'sweep': [{'k': 1.0}, {'k': 2.0, 'k3': 0.3}], 'n_points': 20})
+    response = encoded_response(sweep, None)
+    assert response.media_type == JSON
+    assert len(decode(response.body)['result']['time'][1]) == 20
+    binary = encoded_response(sweep, "application/octet-stream")
+    assert binary.headers["vary"] == "Accept"
+    assert decode(binary.body, OCTET_STREAM)['result']['position'].shape == (2, 20)
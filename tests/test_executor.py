@@ -0,0 +1,67 @@
+# tests/test_executor.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.executor import SimulationExecutor, ExecutorSaturated, JobTimeout
+
+
+def test_run_simulation_in_pool():
+    executor = SimulationExecutor(mode="thread", max_workers=1, max_queue=0)
+
+    async def scenario():
+        return await executor.run_simulation('math', {'message': '2+3'})
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert result['status'] == 'success'
+    assert result['result'].endswith('5')
+
+
+def test_saturated_queue_rejects_jobs():
+    executor = SimulationExecutor(mode="thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+    executor.submit(release.wait)
+    executor.submit(release.wait)
+    try:
+        with pytest.raises(ExecutorSaturated):
+            executor.submit(release.wait)
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.inflight == 0
+
+
+def test_warm_up_goes_through_admission():
+    executor = SimulationExecutor(mode="thread", max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        return await executor.warm_up()
+
+    try:
+        assert len(asyncio.run(scenario())) == 1 and executor.inflight == 0
+        # Pool saturo di lavoro vero: il ping non viene accodato oltre la capacità
+        executor.submit(release.wait)
+        assert asyncio.run(scenario()) == [] and executor.inflight == 1
+    finally:
+        release.set()
+        executor.shutdown()
+    assert executor.inflight == 0
+
+
+def test_job_timeout():
+    executor = SimulationExecutor(mode="thread", max_workers=1, max_queue=0)
+
+    async def scenario():
+        await executor.run(time.sleep, 0.5, timeout=0.05)
+
+    try:
+        with pytest.raises(JobTimeout):
+            asyncio.run(scenario())
+    finally:
+        executor.shutdown()
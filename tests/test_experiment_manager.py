@@ -0,0 +1,62 @@
+# tests/test_experiment_manager.py
+import pytest
+
+from backend import database
+from backend.experiment_manager import ExperimentManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "riqa.db"))
+    database.init_db()
+    rows = []
+    for i in range(7):
+        sim_type = 'quantum' if i % 2 else 'oscillator'
+        rows.append((sim_type, 'alice', None, None, '{}', '{"i": %d}' % i, None, 2, f"2026-01-0{i + 1} 10:00:00"))
+    rows.append(('quantum', 'bob', None, None, '{}', '{}', None, 2, "2026-01-09 10:00:00"))
+    with database.connection() as conn:
+        conn.executemany(
+            "INSERT INTO experiments (type, user_id, session_id, n_qubits, params_json, result_json,"
+            " result_arrays, storage_format, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    yield ExperimentManager()
+    database.close()
+
+
+def test_cursor_pagination_walks_history(manager):
+    seen, cursor = [], None
+    while True:
+        page = manager.get_experiment_history('alice', limit=3, cursor=cursor)
+        seen.extend(item['id'] for item in page['items'])
+        assert all('result' not in item for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_history_filters_and_lazy_result(manager):
+    page = manager.get_experiment_history('alice', sim_type='quantum', since='2026-01-03', until='2026-01-07')
+    assert [item['id'] for item in page['items']] == [6, 4]
+    assert manager.get_experiment_result('alice', 4)['result'] == {'i': 3}
+    assert manager.get_experiment_result('bob', 4) is None
+
+
+def test_history_query_uses_index(manager):
+    with database.connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM experiments WHERE user_id = ? AND (created_at, id) < (?, ?)"
+            " ORDER BY created_at DESC, id DESC LIMIT 50",
+            ('alice', '2026-01-05', 5)
+        ).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert 'idx_experiments_user_created' in details
+    assert 'TEMP B-TREE' not in details
+
+
+def test_save_results_goes_through_the_buffered_writer(manager):
+    manager.save_results('s1', {'k': 1}, {'type': 'oscillator', 'user_id': 'carol', 'ok': True})
+    assert database.experiment_writer.pending == 1
+    database.experiment_writer.flush()
+    assert [item['session_id'] for item in manager.get_experiment_history('carol')['items']] == ['s1']
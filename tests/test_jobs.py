@@ -0,0 +1,120 @@
+# tests/test_jobs.py
+import asyncio
+
+import numpy as np
+
+from backend import database, jobs
+from backend.executor import SimulationExecutor
+from backend.jobs import JobManager, JobNotFound
+
+
+def test_job_lifecycle(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "jobs.db"))
+    executor = SimulationExecutor(mode="thread", max_workers=2, max_queue=4)
+    manager = JobManager(executor)
+
+    async def scenario():
+        await manager.start()
+        ok_id = await manager.submit('math', {'message': '6*7'}, owner='alice')
+        queued = await manager.status(ok_id, owner='alice')
+        await manager._queue.join()
+        await manager.stop()
+        try:
+            await manager.status(ok_id, owner='bob')
+            hidden = False
+        except JobNotFound:
+            hidden = True
+        return queued, await manager.result(ok_id, owner='alice'), hidden
+
+    try:
+        queued, done, hidden = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert queued['status'] in ('queued', 'running')
+    assert done['status'] == 'completed'
+    assert done['progress'] == 1.0
+    assert done['result']['result'].endswith('42')
+    assert hidden
+
+
+def test_jobs_are_claimed_once_and_leases_expire(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "jobs.db"))
+    database.init_db()
+    database.create_job("j1", "alice", "math", {'message': '1+1'})
+    assert database.claim_job("j1", "worker-a", 60)
+    assert not database.claim_job("j1", "worker-b", 60)
+    # In esecuzione con lease valido: nessun altro processo lo riaccoda
+    assert database.list_pending_jobs() == []
+    assert not database.update_job("j1", "completed", 1.0, {'x': 1}, None, "worker-b")
+    assert database.renew_job_lease("j1", "worker-a", -1)
+    # Lease scaduto: il job torna disponibile e passa al nuovo worker
+    assert [job_id for job_id, _, _ in database.list_pending_jobs()] == ["j1"]
+    assert database.claim_job("j1", "worker-b", 60)
+    assert not database.renew_job_lease("j1", "worker-a", 60)
+    assert database.update_job("j1", "completed", 1.0, {'x': 1}, None, "worker-b")
+    assert database.get_job("j1")['status'] == 'completed'
+
+
+class _CountingExecutor:
+    max_workers = 1
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run_simulation(self, section, params):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {'status': 'success', 'result': 42}
+
+
+def test_concurrent_managers_run_each_job_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "jobs.db"))
+    database.init_db()
+    for i in range(5):
+        database.create_job(f"j{i}", None, 'math', {'message': '1'})
+    executor = _CountingExecutor()
+    managers = [JobManager(executor), JobManager(executor)]
+
+    async def scenario():
+        # Entrambi i processi trovano gli stessi job in sospeso all'avvio
+        for manager in managers:
+            await manager.start()
+        for manager in managers:
+            await manager._queue.join()
+        for manager in managers:
+            await manager.stop()
+
+    asyncio.run(scenario())
+    assert executor.calls == 5
+    assert all(database.get_job(f"j{i}")['status'] == 'completed' for i in range(5))
+
+
+def test_long_sweeps_report_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(jobs, "JOB_SWEEP_CHUNK", 40)
+    progress = []
+    update_job = database.update_job
+
+    def record(job_id, status, value=None, *args):
+        if status == 'running':
+            progress.append(value)
+        return update_job(job_id, status, value, *args)
+    monkeypatch.setattr(database, "update_job", record)
+    executor = SimulationExecutor(mode="thread", max_workers=2, max_queue=4)
+    manager = JobManager(executor)
+    sweep = [{'k': 1.0 + i / 100, 'time_range': (0, 5)} for i in range(100)]
+
+    async def scenario():
+        await manager.start()
+        job_id = await manager.submit('oscillator', {'sweep': sweep, 'n_points': 20})
+        await manager._queue.join()
+        await manager.stop()
+        return await manager.result(job_id)
+
+    try:
+        done = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert progress == [0.4, 0.8, 1.0]
+    assert done['status'] == 'completed'
+    assert np.asarray(done['result']['result']['position']).shape == (100, 20)
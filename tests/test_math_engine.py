@@ -0,0 +1,97 @@
+# tests/test_math_engine.py
+import numpy as np
+import pytest
+
+from backend import math_engine
+from backend.core import RIQA_Core
+from backend.math_engine import (
+    ExpressionCache, MathEngineError, compile_expression, evaluate, evaluate_grid
+)
+
+
+def test_scalar_expressions_follow_math_notation():
+    assert evaluate("6*7") == 42
+    assert evaluate("2^3+1") == 9.0
+    assert evaluate("-2**2") == -4.0
+    assert evaluate("sin(pi/2) + ln(e)") == pytest.approx(2.0)
+    assert evaluate("x if x > 0 else -x", {"x": -3}) == 3
+    assert evaluate("1/0") == float("inf")
+
+
+def test_integer_arithmetic_does_not_wrap():
+    assert evaluate("10000000000*10000000000") == 1e20
+    assert evaluate("9223372036854775807+1") == 2.0 ** 63
+    assert evaluate("x*x", {"x": 10 ** 10}) == 1e20
+    np.testing.assert_array_equal(evaluate("x*x", {"x": np.array([3, 10 ** 10])}), [9.0, 1e20])
+    with pytest.raises(MathEngineError):
+        evaluate("1" + "0" * 400)
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "().__class__.__bases__",
+    "x.real",
+    "[x for x in (1, 2)]",
+    "lambda: 1",
+    "open('/etc/passwd')",
+    "'a' * 3",
+    "sin(x, x)",
+    "sin(x=1)",
+    "_f0(1)",
+])
+def test_disallowed_constructs_are_rejected(expression):
+    with pytest.raises(MathEngineError):
+        evaluate(expression, {"x": 1.0})
+
+
+def test_compiled_expressions_are_cached_by_normalized_text():
+    cache = ExpressionCache(max_size=8)
+    first = cache.compile("sin(x)+y^2")
+    assert cache.compile("sin( x ) + y**2") is first
+    assert cache.compile("sin(x)+y^2") is first
+    assert cache.stats()['misses'] == 1
+    assert first.variables == ('x', 'y')
+    assert compile_expression("x+1").expression == "x + 1"
+
+
+def test_vectorized_evaluation_matches_numpy():
+    x = np.linspace(-5, 5, 1_000_001)
+    result = evaluate("where(x > 0, sqrt(x), 0) + abs(x)^1.5 - hypot(x, 1)", {"x": x})
+    expected = np.where(x > 0, np.sqrt(np.abs(x)), 0) + np.abs(x) ** 1.5 - np.hypot(x, 1)
+    np.testing.assert_allclose(result, expected)
+    mask = evaluate("-1 < x <= 2", {"x": x})
+    np.testing.assert_array_equal(mask, (x > -1) & (x <= 2))
+
+
+def test_grid_evaluation_uses_one_axis_per_variable():
+    grid = evaluate_grid("sin(x) * exp(-y)", {
+        "x": {"start": 0, "stop": np.pi, "num": 50},
+        "y": {"start": 0, "stop": 1, "num": 40},
+    })
+    x, y = np.meshgrid(np.linspace(0, np.pi, 50), np.linspace(0, 1, 40), indexing='ij')
+    assert grid.shape == (50, 40)
+    np.testing.assert_allclose(grid, np.sin(x) * np.exp(-y))
+
+
+def test_core_math_section():
+    core = RIQA_Core()
+    assert core.process_message("2+3", "math", None)['result'] == "Risultato matematico: 5"
+    assert core.process_message("__import__('os')", "math", None)['result'].startswith("Impossibile valutare")
+    response = core.process_message(
+        {'expression': 't^2', 'variables': {'t': {'start': 0, 'stop': 1, 'num': 5}}}, "math", None
+    )
+    assert response['status'] == 'success'
+    np.testing.assert_allclose(response['result']['result'], np.linspace(0, 1, 5) ** 2)
+
+
+def test_broadcast_size_is_capped(monkeypatch):
+    monkeypatch.setattr(math_engine, 'MATH_MAX_POINTS', 1000)
+    assert evaluate("x + y", {"x": np.zeros((10, 1)), "y": np.zeros(100)}).shape == (10, 100)
+    with pytest.raises(MathEngineError):
+        evaluate("x + y", {"x": np.zeros((100, 1)), "y": np.zeros(100)})
+    with pytest.raises(MathEngineError):
+        evaluate("x + y", {"x": np.zeros(3), "y": np.zeros(4)})
+    response = RIQA_Core().process_message(
+        {'expression': 'x * y', 'variables': {'x': [[v] for v in range(100)], 'y': list(range(100))}}, "math", None
+    )
+    assert response['status'] == 'error'
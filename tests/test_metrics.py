@@ -0,0 +1,98 @@
+# tests/test_metrics.py
+import asyncio
+import threading
+import time
+
+from backend import metrics
+from backend.executor import SimulationExecutor
+from backend.metrics import MetricsRegistry, SamplingProfiler
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("riqa_test_requests", "Richieste", ("route",))
+    latency = registry.histogram("riqa_test_latency_seconds", "Latenza", ("route",), buckets=(0.1, 1.0))
+    registry.gauge_collector(lambda: [("riqa_test_queue", "Coda", {}, 3)])
+    requests.inc(route='/simulate')
+    requests.inc(2, route='/simulate')
+    latency.observe(0.05, route='/a"b')
+    latency.observe(0.5, route='/a"b')
+    latency.observe(5.0, route='/a"b')
+
+    text = registry.render()
+    assert "# TYPE riqa_test_requests counter" in text
+    assert 'riqa_test_requests_total{route="/simulate"} 3' in text
+    assert 'riqa_test_latency_seconds_bucket{route="/a\\"b",le="0.1"} 1' in text
+    assert 'riqa_test_latency_seconds_bucket{route="/a\\"b",le="1.0"} 2' in text
+    assert 'riqa_test_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in text
+    assert 'riqa_test_latency_seconds_count{route="/a\\"b"} 3' in text
+    assert "# TYPE riqa_test_queue gauge" in text and "riqa_test_queue 3" in text
+
+
+def test_drain_and_merge_do_not_double_count():
+    worker, main = MetricsRegistry(), MetricsRegistry()
+    for registry in (worker, main):
+        registry.histogram("riqa_test_phase_seconds", "Fase", ("phase",))
+    worker_phase = worker.histogram("riqa_test_phase_seconds", "Fase", ("phase",))
+    worker_phase.observe(0.2, phase='solve_ivp')
+
+    main.merge(worker.drain())
+    main.merge(worker.drain())  # Secondo drain vuoto
+    text = main.render()
+    assert 'riqa_test_phase_seconds_count{phase="solve_ivp"} 1' in text
+    assert 'riqa_test_phase_seconds_count{phase="solve_ivp"}' not in worker.render()
+
+
+def test_broken_gauge_collector_does_not_break_scrape():
+    registry = MetricsRegistry()
+    registry.gauge_collector(lambda: 1 / 0)
+    registry.gauge_collector(lambda: [("riqa_test_ok", "Ok", {"cache": "result"}, 1)])
+    assert 'riqa_test_ok{cache="result"} 1' in registry.render()
+
+
+def _count(text, sample):
+    """Valore di un campione nel testo Prometheus, 0 se assente"""
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_executor_merges_worker_metrics():
+    # Worker in un altro processo: le metriche arrivano solo attraverso drain() -> pickle -> merge()
+    sample = 'riqa_phase_duration_seconds_count{phase="solve_ivp"}'
+    before = _count(metrics.registry.render(), sample)
+    executor = SimulationExecutor(mode="process", max_workers=1, max_queue=2)
+    try:
+        for k in (1.2345, 2.3456):
+            result = asyncio.run(executor.run_simulation('oscillator', {'time_range': (0, 5), 'k': k}))
+            assert result['status'] == 'success'
+    finally:
+        executor.shutdown()
+    text = metrics.registry.render()
+    assert 'riqa_section_duration_seconds_count{section="oscillator",status="success"}' in text
+    # Due job, due osservazioni: il secondo drain del worker non riporta quelle del primo
+    assert _count(text, sample) == before + 2
+
+
+def test_sampling_profiler_collapsed_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    done = threading.Event()
+
+    def busy_loop():
+        while not done.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop)
+    worker.start()
+    profiler = SamplingProfiler(worker.ident, interval_ms=1).start()
+    time.sleep(0.1)
+    profiler.stop()
+    done.set()
+    worker.join()
+
+    assert profiler.samples > 0
+    assert "busy_loop (test_metrics.py:" in profiler.collapsed()
+    path = profiler.dump("slow_request")
+    assert path.endswith("slow_request.collapsed")
+    assert (tmp_path / "slow_request.collapsed").read_text().strip()
@@ -0,0 +1,38 @@
+# tests/test_model_registry.py
+from backend.ml_integration import AIModelHub
+from backend.model_registry import ModelRegistry
+
+
+class EchoPipeline:
+    """Modello locale minimale al posto delle pipeline transformers"""
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def __call__(self, prompt, **kwargs):
+        return [{'generated_text': f"{self.prefix}:{prompt}"}]
+
+
+def test_models_load_lazily_and_are_shared():
+    registry = ModelRegistry()
+    calls = []
+    registry.register('math_solver', lambda: calls.append(1) or EchoPipeline('math'), size_mb=10)
+    assert registry.stats()['loaded'] == {}
+
+    first, second = AIModelHub(registry), AIModelHub(registry)
+    assert first.solve_math_expression('1+1') == {'solution': 'math:1+1'}
+    assert second.solve_math_expression('2+2') == {'solution': 'math:2+2'}
+    assert len(calls) == 1
+
+
+def test_lru_unload_over_budget():
+    registry = ModelRegistry(ram_budget_mb=25)
+    for name in ('a', 'b', 'c'):
+        registry.register(name, lambda name=name: EchoPipeline(name), size_mb=10)
+    registry.get('a')
+    registry.get('b')
+    registry.get('a')
+    registry.get('c')
+    assert list(registry.stats()['loaded']) == ['a', 'c']
+    assert registry.stats()['used_mb'] <= 25
+    assert registry.prewarm(['b']) == ['b']
+    assert 'b' in registry.stats()['loaded']
@@ -1,6 +1,29 @@
 # tests/test_simulation.py
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from backend.simulation import SimulationParameters, simulate_complex_system, simulate_batch
+
 def test_simulation():
     params = SimulationParameters(time_range=(0, 5), k=2.0)
     result = simulate_complex_system(params)
     assert len(result['time']) == 100
     assert len(result['energy']) == 100
+
+def test_simulate_batch_matches_reference():
+    sweep = [
+        {'time_range': (0, 5), 'initial_conditions': (1.0, 0.5), 'k': 2.0, 'm': 0.5},
+        {'time_range': (1, 4), 'initial_conditions': (-0.3, 0.0), 'k': 1.0, 'm': 3.0, 'k3': 0.8},
+    ]
+    result = simulate_batch(sweep, n_points=50)
+    assert result['position'].shape == (2, 50)
+    for row, p in enumerate(sweep):
+        k, m, k3 = p['k'], p['m'], p.get('k3', 0.0)
+        ref = solve_ivp(
+            lambda t, y: [y[1], -(k * y[0] + k3 * y[0]**3) / m],
+            p['time_range'], p['initial_conditions'],
+            t_eval=result['time'][row], rtol=1e-10, atol=1e-12
+        )
+        np.testing.assert_allclose(result['position'][row], ref.y[0], atol=1e-5)
+        np.testing.assert_allclose(result['velocity'][row], ref.y[1], atol=1e-5)
+        assert np.ptp(result['energy'][row]) < 1e-5
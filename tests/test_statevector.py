@@ -0,0 +1,32 @@
+# tests/test_statevector.py
+import numpy as np
+from qiskit import QuantumCircuit, execute, Aer
+from qiskit.quantum_info import Statevector
+
+from backend.statevector import NativeCircuit
+
+
+def test_statevector_matches_qiskit():
+    ops = [('h', (0,)), ('cx', (0, 2)), ('s', (2,)), ('swap', (1, 2)), ('h', (3,)),
+           ('cz', (3, 1)), ('t', (0,)), ('y', (1,)), ('x', (3,))]
+    native = NativeCircuit(4)
+    qc = QuantumCircuit(4)
+    for gate, qubits in ops:
+        native.append(gate, *qubits)
+        getattr(qc, gate)(*qubits)
+    np.testing.assert_allclose(native.statevector(), Statevector(qc).data, atol=1e-12)
+
+
+def test_counts_have_qiskit_shape():
+    native = NativeCircuit(3, 3).h(0).cx(0, 1)
+    counts = native.sample_counts(2000, rng=np.random.default_rng(1))
+
+    qc = QuantumCircuit(3, 3)
+    qc.h(0)
+    qc.cx(0, 1)
+    qc.measure_all()
+    reference = execute(qc, Aer.get_backend('qasm_simulator'), shots=2000).result().get_counts(qc)
+
+    assert set(counts) == set(reference) == {'000 000', '011 000'}
+    assert sum(counts.values()) == 2000
+    assert abs(counts['011 000'] - 1000) < 150
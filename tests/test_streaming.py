@@ -0,0 +1,114 @@
+# tests/test_streaming.py
+import asyncio
+
+import numpy as np
+from fastapi import WebSocketDisconnect
+
+from backend import streaming
+from backend.executor import SimulationExecutor
+from backend.simulation import SimulationParameters, simulate_complex_system
+from backend.streaming import SimulationStream
+
+
+class FakeWebSocket:
+    def __init__(self, send_gate=None):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.send_gate = send_gate
+
+    async def receive_json(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        return message
+
+    async def send_json(self, message):
+        if self.send_gate is not None:
+            await self.send_gate.wait()
+        self.sent.append(message)
+
+    async def wait_for(self, kind, job_id):
+        while not any(m['type'] == kind and m['job_id'] == job_id for m in self.sent):
+            await asyncio.sleep(0.01)
+
+
+def _serve(scenario, **stream_kwargs):
+    executor = SimulationExecutor(mode="thread", max_workers=2, max_queue=8)
+
+    async def main():
+        ws = FakeWebSocket(stream_kwargs.pop('send_gate', None))
+        stream = SimulationStream(ws, executor, **stream_kwargs)
+        server = asyncio.create_task(stream.serve())
+        try:
+            await asyncio.wait_for(scenario(ws, stream), 10)
+        finally:
+            await ws.incoming.put(None)
+            await asyncio.gather(server, return_exceptions=True)
+        return ws.sent
+
+    try:
+        return asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_oscillator_chunks_match_full_solution():
+    params = {'time_range': (0, 10), 'k': 2.0, 'k3': 0.5, 'n_points': 100, 'chunk_points': 30}
+
+    async def scenario(ws, stream):
+        await ws.incoming.put({'type': 'start', 'job_id': 'osc', 'section': 'oscillator', 'parameters': params})
+        await ws.wait_for('done', 'osc')
+
+    sent = _serve(scenario)
+    chunks = [m for m in sent if m['type'] == 'chunk']
+    assert [m['seq'] for m in chunks] == [0, 1, 2, 3]
+    assert sent[-1] == {'type': 'done', 'job_id': 'osc', 'chunks': 4}
+    position = np.concatenate([m['data']['position'] for m in chunks])
+    full = simulate_complex_system(SimulationParameters(time_range=(0, 10), k=2.0, k3=0.5))
+    assert len(position) == 100
+    assert np.allclose(position, full['position'], atol=1e-2)
+
+
+def test_multiplexed_jobs_cancel_and_errors_keep_socket_open():
+    async def scenario(ws, stream):
+        await ws.incoming.put({'type': 'start', 'job_id': 'q', 'section': 'quantum',
+                               'parameters': {'n_qubits': 2, 'shots': 10 ** 6, 'batch_shots': 1}})
+        await ws.incoming.put({'type': 'start', 'job_id': 'bad', 'section': 'oscillator', 'parameters': {'k': -1}})
+        await ws.incoming.put({'type': 'start', 'job_id': 'ok', 'section': 'math', 'parameters': {'message': '2+3'}})
+        await ws.wait_for('chunk', 'q')
+        await ws.incoming.put({'type': 'cancel', 'job_id': 'q'})
+        await ws.wait_for('cancelled', 'q')
+        await ws.wait_for('done', 'ok')
+        await ws.wait_for('error', 'bad')
+
+    sent = _serve(scenario)
+    quantum = [m['data'] for m in sent if m['type'] == 'chunk' and m['job_id'] == 'q']
+    assert quantum and quantum[-1]['shots_done'] < 10 ** 6
+    assert all(sum(c['counts'].values()) == 1 for c in quantum)
+    ok = [m['data'] for m in sent if m['type'] == 'chunk' and m['job_id'] == 'ok']
+    assert ok[0]['result'].endswith('5')
+
+
+def test_slow_client_bounds_computed_chunks(monkeypatch):
+    computed = []
+    segment = streaming._oscillator_segment
+
+    def counting_segment(*args):
+        computed.append(1)
+        return segment(*args)
+
+    monkeypatch.setattr(streaming, '_oscillator_segment', counting_segment)
+    gate = asyncio.Event()
+
+    async def scenario(ws, stream):
+        await ws.incoming.put({'type': 'start', 'job_id': 'osc', 'section': 'oscillator',
+                               'parameters': {'n_points': 200, 'chunk_points': 1}})
+        await asyncio.sleep(0.5)
+        # Coda di uscita da 2 messaggi + uno in invio + uno in attesa di spazio
+        assert len(computed) <= 4
+        gate.set()
+        await ws.wait_for('done', 'osc')
+
+    sent = _serve(scenario, outbox_size=2, send_gate=gate)
+    assert len(computed) == 200
+    assert sent[-1]['chunks'] == 200
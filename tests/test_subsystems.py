@@ -0,0 +1,56 @@
+# tests/test_subsystems.py
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from backend.subsystems import SubsystemNotRegistered, SubsystemRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_subsystem_is_loaded_once_on_first_use():
+    registry = SubsystemRegistry()
+    loads = []
+
+    def loader():
+        loads.append(threading.get_ident())
+        return {'value': 42}
+
+    proxy = registry.register('heavy', loader)
+    assert not registry.is_loaded('heavy') and loads == []
+    threads = [threading.Thread(target=lambda: proxy.get('value')) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert proxy.get('value') == 42
+    assert 'heavy' in registry.stats()['loaded']
+
+
+def test_preload_list_and_unknown_names():
+    registry = SubsystemRegistry()
+    registry.module('json')
+    registry.module('csv')
+    assert registry.preload('json') == ['json']
+    assert registry.is_loaded('json') and not registry.is_loaded('csv')
+    registry.preload('all')
+    assert registry.is_loaded('csv')
+    with pytest.raises(SubsystemNotRegistered):
+        registry.preload('qiskit_ml')
+
+
+def test_app_import_does_not_load_heavy_subsystems():
+    probe = (
+        "import json, sys; import backend.app; "
+        "print(json.dumps([m for m in ('qiskit', 'scipy', 'matplotlib', 'transformers') if m in sys.modules]))"
+    )
+    env = dict(os.environ, RIQA_PRELOAD="", PYTHONPATH=str(ROOT))
+    output = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
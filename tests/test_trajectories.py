@@ -0,0 +1,76 @@
+# tests/test_trajectories.py
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend import trajectories
+from backend.decimation import lttb_indices
+from backend.executor import SimulationExecutor
+from backend.simulation import dense_trajectory
+from backend.trajectories import TrajectoryNotFound, TrajectoryService, TrajectoryStore
+from backend.visualization import series_payload
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.linspace(0, 10, 10_000)
+    y = np.sin(x)
+    y[4_321] = 8.0
+    keep = lttb_indices(x, y, 200)
+    assert len(keep) == 200 and keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert 4_321 in keep
+
+
+def test_dense_trajectory_is_computed_once_and_sliced(monkeypatch):
+    executor = SimulationExecutor(mode="thread", max_workers=1, max_queue=4)
+    store = TrajectoryStore()
+    service = TrajectoryService(executor, store)
+    runs = []
+    original_run = executor.run
+
+    async def counting_run(fn, *args, **kwargs):
+        runs.append(fn)
+        return await original_run(fn, *args, **kwargs)
+
+    monkeypatch.setattr(executor, "run", counting_run)
+    params = {'time_range': (0, 100), 'k': 2.0, 'k3': 0.2, 'dense_points': 50_000, 'points': 500}
+
+    async def scenario():
+        first = await service.simulate(params)
+        again = await service.simulate(dict(params, points=200))
+        return first, again
+
+    try:
+        first, again = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert len(runs) == 1
+    assert first['trajectory_id'] == again['trajectory_id']
+    assert len(first['time']) == 500 and len(again['time']) == 200
+    assert first['dense_points'] == 50_000
+
+    zoom = store.window(first['trajectory_id'], 40.0, 41.0, points=300, method='minmax')
+    assert zoom['time'][0] <= 40.0 < zoom['time'][1] and zoom['time'][-2] < 41.0 <= zoom['time'][-1]
+    assert zoom['window_points'] < 600 and len(zoom['time']) <= 300
+    reference = dense_trajectory(dict(params, dense_points=None), 50_000)
+    mask = (reference['time'] >= zoom['time'][0]) & (reference['time'] <= zoom['time'][-1])
+    assert zoom['position'].max() == pytest.approx(reference['position'][mask].max(), abs=1e-6)
+    assert zoom['position'].min() == pytest.approx(reference['position'][mask].min(), abs=1e-6)
+
+
+def test_visualization_zoom_uses_store():
+    store = trajectories.trajectory_store
+    key = store.put('t-test', dense_trajectory({'time_range': (0, 10)}, 20_000))
+    payload = series_payload({'trajectory_id': key, 't0': 2.0, 't1': 3.0})
+    assert 2.0 >= payload['time'][0] and payload['time'][-1] >= 3.0
+    assert len(payload['time']) < 20_000 and 'x' in payload and 'y' in payload
+    with pytest.raises(TrajectoryNotFound):
+        series_payload({'trajectory_id': 'missing'})
+
+
+def test_window_points_are_capped(monkeypatch):
+    monkeypatch.setattr(trajectories, 'TRAJECTORY_MAX_POINTS', 100)
+    store = TrajectoryStore()
+    key = store.put('t-cap', dense_trajectory({'time_range': (0, 10)}, 5_000))
+    assert len(store.window(key, points=1_000_000)['time']) == 100
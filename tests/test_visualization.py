@@ -0,0 +1,65 @@
+# tests/test_visualization.py
+import asyncio
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.cache import ResultCache
+from backend.decimation import decimate, minmax_indices
+from backend.visualization import RenderService, VisualizationEngine
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def test_minmax_decimation_keeps_extremes():
+    t = np.linspace(0, 1, 100_000)
+    y = np.sin(40 * t)
+    y[12_345] = 5.0
+    y[67_890] = -5.0
+    keep = minmax_indices(y, 500)
+    assert len(keep) <= 2000
+    assert {0, 12_345, 67_890, len(y) - 1} <= set(keep.tolist())
+    small_t, small_y = decimate(t, y, 500)
+    assert small_y.max() == y.max() and small_y.min() == y.min()
+    assert np.all(np.diff(small_t) > 0)
+
+
+def test_render_service_caches_and_is_thread_safe():
+    service = RenderService(workers=4, cache=ResultCache(max_bytes=16 * 1024 * 1024))
+    t = np.linspace(0, 10, 50_000)
+    payloads = [{'time': t.tolist(), 'values': np.sin(k * t).tolist()} for k in range(1, 5)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        images = list(pool.map(lambda p: service.render('series', p), payloads * 2))
+    assert all(image.startswith(PNG_MAGIC) for image in images)
+    assert images[:4] == images[4:]
+    assert len(set(images[:4])) == 4
+    assert service.renders <= 8 and service.stats()['entries'] == 4
+
+    async def scenario():
+        return await service.render_async('circuit', 'q_0: ─H─')
+
+    threads = []
+
+    def prepare(data):
+        threads.append(threading.current_thread().name)
+        return data
+
+    async def prepared():
+        # La preparazione dei dati gira nel pool, non nel loop
+        return await service.render_async('series', payloads[0], prepare=prepare)
+
+    try:
+        assert asyncio.run(scenario()).startswith(PNG_MAGIC)
+        assert asyncio.run(prepared()) == images[0] and threads[0].startswith('riqa-render')
+    finally:
+        service.shutdown()
+
+
+def test_engine_keeps_base64_api_and_raw_option():
+    data = {'time': [0, 1, 2], 'position': [1.0, 0.0, -1.0], 'velocity': [0.0, -1.0, 0.0]}
+    encoded = VisualizationEngine.plot_simulation_results(data)
+    raw = VisualizationEngine.plot_simulation_results(data, raw=True)
+    assert base64.b64decode(encoded) == raw
+    assert len(raw) < len(encoded)